@@ -0,0 +1,198 @@
+"""
+Read endpoints under concurrent load: sync DRF views versus the native async views.
+
+    python -m benchmarks.bench_async_views --requests 3000 --concurrency 64
+
+Three stacks are driven in-process, without sockets, so the numbers isolate the
+request handling and ORM path rather than the HTTP server:
+
+  wsgi        sync views through Django's WSGI handler, one worker thread per
+              concurrent request (gunicorn --threads style)
+  asgi-sync   sync views through the ASGI handler, the way uvicorn runs
+              credit_approval.asgi with ASYNC_VIEWS_ENABLED off
+  asgi-async  the async views through the ASGI handler (ASYNC_VIEWS_ENABLED on)
+
+For socket-level numbers run `uvicorn credit_approval.asgi:application` with each
+setting of ASYNC_VIEWS_ENABLED behind a load generator.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from benchmarks.common import setup_django, benchmark_database
+
+STACKS = ['wsgi', 'asgi-sync', 'asgi-async']
+
+
+def create_data(customers, loans_per_customer, seed=0):
+    from loans.models import Customer, Loan
+    from loans.profiles import rebuild_profiles
+
+    rng = random.Random(seed)
+    Customer.objects.bulk_create([
+        Customer(
+            first_name='Bench',
+            last_name=str(index),
+            age=30,
+            phone_number=str(9200000000 + index),
+            monthly_salary=Decimal(rng.randrange(30, 300) * 1000),
+            approved_limit=Decimal(rng.randrange(10, 100) * 100000),
+            current_debt=Decimal('0'),
+        )
+        for index in range(customers)
+    ])
+    customer_ids = list(Customer.objects.order_by('customer_id').values_list('customer_id', flat=True))
+    Loan.objects.bulk_create([
+        Loan(
+            customer_id=customer_id,
+            loan_amount=Decimal(rng.randrange(1, 20) * 50000),
+            tenure=rng.choice([12, 24, 36, 60]),
+            interest_rate=Decimal(rng.randrange(800, 1800)) / 100,
+            monthly_repayment=Decimal(rng.randrange(2000, 40000)),
+            emis_paid_on_time=rng.randrange(0, 12),
+            start_date=date(rng.randrange(2015, 2025), rng.randrange(1, 13), 1),
+            end_date=date(2030, 1, 1),
+            is_active=rng.random() < 0.5,
+        )
+        for customer_id in customer_ids
+        for _ in range(loans_per_customer)
+    ])
+    rebuild_profiles(customer_ids)
+    loan_ids = list(Loan.objects.values_list('loan_id', flat=True))
+    return customer_ids, loan_ids
+
+
+def request_mix(count, customer_ids, loan_ids, seed=1):
+    """
+    (method, path, body) tuples spread evenly over the three read endpoints
+    """
+    rng = random.Random(seed)
+    requests = []
+    for index in range(count):
+        kind = index % 3
+        if kind == 0:
+            body = json.dumps({
+                'customer_id': rng.choice(customer_ids),
+                'loan_amount': rng.randrange(1, 20) * 50000,
+                'interest_rate': rng.randrange(8, 18),
+                'tenure': rng.choice([12, 24, 36]),
+            })
+            requests.append(('post', '/check-eligibility/', body))
+        elif kind == 1:
+            requests.append(('get', f'/view-loan/{rng.choice(loan_ids)}/', None))
+        else:
+            requests.append(('get', f'/view-loans/{rng.choice(customer_ids)}/', None))
+    return requests
+
+
+def route_async_views(enabled):
+    """
+    Re-import the URLconf with ASYNC_VIEWS_ENABLED set as given
+    """
+    from django.conf import settings
+    from django.urls import clear_url_caches
+    import loans.urls
+    import credit_approval.urls
+
+    settings.ASYNC_VIEWS_ENABLED = enabled
+    importlib.reload(loans.urls)
+    importlib.reload(credit_approval.urls)
+    clear_url_caches()
+
+
+def _send(client, method, path, body):
+    if method == 'post':
+        return client.post(path, body, content_type='application/json')
+    return client.get(path)
+
+
+def run_wsgi(requests, concurrency):
+    from django.db import connection
+    from django.test import Client
+    import threading
+
+    local = threading.local()
+
+    def call(request):
+        if not hasattr(local, 'client'):
+            local.client = Client()
+        start = time.perf_counter()
+        response = _send(local.client, *request)
+        assert response.status_code == 200, response.content
+        return time.perf_counter() - start
+
+    def close_connection(_):
+        connection.close()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(call, requests))
+        list(pool.map(close_connection, range(concurrency)))
+    return latencies
+
+
+async def _run_asgi(requests, concurrency):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def call(request):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await _send(client, *request)
+            assert response.status_code == 200, response.content
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(call(request) for request in requests))
+
+
+def run_asgi(requests, concurrency):
+    return asyncio.run(_run_asgi(requests, concurrency))
+
+
+def report(stack, latencies, elapsed):
+    ordered = sorted(latencies)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    print(
+        f'{stack:<11} {len(latencies) / elapsed:>8,.0f} req/s   '
+        f'p50 {statistics.median(ordered) * 1000:7.2f} ms   p99 {p99 * 1000:7.2f} ms'
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--requests', type=int, default=3000)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--customers', type=int, default=2000)
+    parser.add_argument('--loans-per-customer', type=int, default=5)
+    parser.add_argument('--stacks', nargs='+', choices=STACKS, default=STACKS)
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    # Measure the ORM path, not the Redis result cache
+    settings.ELIGIBILITY_CACHE_ENABLED = False
+
+    with benchmark_database():
+        customer_ids, loan_ids = create_data(args.customers, args.loans_per_customer)
+        requests = request_mix(args.requests, customer_ids, loan_ids)
+        print(f'{args.requests} requests, concurrency {args.concurrency}')
+        for stack in args.stacks:
+            route_async_views(stack == 'asgi-async')
+            runner = run_wsgi if stack == 'wsgi' else run_asgi
+            runner(requests[:min(100, len(requests))], args.concurrency)  # warm up
+            start = time.perf_counter()
+            latencies = runner(requests, args.concurrency)
+            report(stack, latencies, time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Customer ingest throughput: batched upsert versus the old per-row update_or_create.
+
+    python -m benchmarks.bench_customer_ingest --rows 1000000 --legacy-rows 20000
+"""
+import argparse
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.common import setup_django, benchmark_database, timed
+
+
+def synthetic_customers(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    salaries = rng.integers(15, 300, rows) * 1000
+    return pd.DataFrame({
+        'Customer ID': np.arange(1, rows + 1),
+        'First Name': rng.choice(['Aarav', 'Diya', 'Kabir', 'Meera', 'Rohan', 'Sara'], rows),
+        'Last Name': rng.choice(['Sharma', 'Iyer', 'Khan', 'Patel', 'Das', 'Rao'], rows),
+        'Age': rng.integers(21, 65, rows),
+        'Phone Number': 9000000000 + np.arange(rows),
+        'Monthly Salary': salaries,
+        'Approved Limit': np.round(36 * salaries / 100000) * 100000,
+    })
+
+
+def legacy_ingest(df):
+    """The pre-bulk ingest loop, kept here as the comparison baseline"""
+    from loans.models import Customer
+
+    for _, row in df.iterrows():
+        Customer.objects.update_or_create(
+            customer_id=int(row['Customer ID']),
+            defaults={
+                'first_name': str(row['First Name']),
+                'last_name': str(row['Last Name']),
+                'phone_number': str(row['Phone Number']),
+                'monthly_salary': Decimal(str(row['Monthly Salary'])),
+                'approved_limit': Decimal(str(row['Approved Limit'])),
+                'current_debt': Decimal('0'),
+                'age': int(row['Age']),
+            }
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--batch-size', type=int, default=None)
+    parser.add_argument('--legacy-rows', type=int, default=0,
+                        help='Also time the per-row path on this many rows (0 to skip)')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from loans.models import Customer
+    from loans.tasks import upsert_customers
+
+    settings.ELIGIBILITY_CACHE_ENABLED = False
+    df = synthetic_customers(args.rows)
+
+    with benchmark_database():
+        if args.legacy_rows:
+            legacy_df = df.head(args.legacy_rows)
+            with timed('legacy insert', len(legacy_df)):
+                legacy_ingest(legacy_df)
+            Customer.objects.all().delete()
+
+        with timed(f'bulk insert (batch size {args.batch_size or settings.INGEST_BATCH_SIZE})', len(df)):
+            created, updated = upsert_customers(df, args.batch_size)
+        print(f'  created={created} updated={updated}')
+
+        with timed('bulk update of the same rows', len(df)):
+            created, updated = upsert_customers(df, args.batch_size)
+        print(f'  created={created} updated={updated}')
+
+
+if __name__ == '__main__':
+    main()
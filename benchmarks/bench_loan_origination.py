@@ -0,0 +1,201 @@
+"""
+Loan origination under contention: many threads creating loans for a handful of customers.
+
+    python -m benchmarks.bench_loan_origination --threads 8 --customers 4 --loans 400
+    python -m benchmarks.bench_loan_origination --legacy   # the old read-modify-write view flow
+
+After the run every customer's current_debt must equal its starting debt plus the
+amounts of the loans created for it, and every credit profile must match the loans
+table; the benchmark reports any customer for which that does not hold.
+
+SQLite serializes writers and fails (rather than waits) when two transactions try
+to upgrade their locks, so on SQLite the benchmark runs against a temporary file
+database and retries transactions that hit "database is locked". Use PostgreSQL
+(DATABASE_URL) for meaningful throughput numbers.
+"""
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from benchmarks.common import setup_django, benchmark_database, timed
+
+LOAN_AMOUNT = Decimal('10000')
+INTEREST_RATE = Decimal('18')
+TENURE = 12
+
+
+def legacy_origination(customer_id, loan_amount, interest_rate, tenure):
+    """The pre-transaction create_loan flow, kept here as the comparison baseline"""
+    from django.db import transaction
+    from loans.models import Customer, Loan
+    from loans.profiles import record_loan
+    from loans.utils import check_loan_eligibility
+
+    eligibility_result = check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+    if not eligibility_result['approval']:
+        return eligibility_result, None
+
+    customer = Customer.objects.get(customer_id=customer_id)
+    with transaction.atomic():
+        loan = Loan.objects.create(
+            customer=customer,
+            loan_amount=loan_amount,
+            tenure=tenure,
+            interest_rate=eligibility_result['corrected_interest_rate'],
+            monthly_repayment=eligibility_result['monthly_installment'],
+            start_date=date.today(),
+            end_date=date.today() + timedelta(days=tenure * 30)
+        )
+        record_loan(loan)
+        customer.current_debt += loan_amount
+        customer.save()
+    return eligibility_result, loan
+
+
+def create_customers(count):
+    from loans.models import Customer
+    from loans.profiles import rebuild_profiles
+
+    Customer.objects.bulk_create([
+        Customer(
+            first_name='Bench',
+            last_name=str(index),
+            age=30,
+            phone_number=str(9100000000 + index),
+            monthly_salary=Decimal('10000000'),
+            approved_limit=Decimal('1000000000'),
+            current_debt=Decimal('0'),
+        )
+        for index in range(count)
+    ])
+    customer_ids = list(Customer.objects.order_by('customer_id').values_list('customer_id', flat=True))
+    rebuild_profiles(customer_ids)
+    return customer_ids
+
+
+def worker(originate, customer_ids, loans, seed, stats, lock):
+    from django.db import connection, OperationalError
+
+    rng = random.Random(seed)
+    created = rejected = retries = 0
+    try:
+        for _ in range(loans):
+            customer_id = rng.choice(customer_ids)
+            while True:
+                try:
+                    _, loan = originate(customer_id, LOAN_AMOUNT, INTEREST_RATE, TENURE)
+                    break
+                except OperationalError as e:
+                    if 'locked' not in str(e):
+                        raise
+                    retries += 1
+                    time.sleep(rng.uniform(0, 0.002))
+            if loan is None:
+                rejected += 1
+            else:
+                created += 1
+    finally:
+        connection.close()
+        with lock:
+            stats['created'] += created
+            stats['rejected'] += rejected
+            stats['retries'] += retries
+
+
+def _to_paisa(inputs):
+    # SQLite sums decimals as floats, so compare amounts at the precision they are stored with
+    return {
+        key: value.quantize(Decimal('0.01')) if isinstance(value, Decimal) else value
+        for key, value in inputs.items()
+    }
+
+
+def verify(customer_ids):
+    """
+    Return the customers whose debt or credit profile disagrees with the loans table
+    """
+    from django.db.models import Sum
+    from loans.models import Customer, Loan, CustomerCreditProfile
+    from loans.utils import get_credit_score_inputs
+
+    loan_totals = dict(
+        Loan.objects.filter(customer_id__in=customer_ids).order_by().values('customer_id')
+        .annotate(total=Sum('loan_amount')).values_list('customer_id', 'total')
+    )
+    year = date.today().year
+    mismatched = []
+    for customer in Customer.objects.filter(customer_id__in=customer_ids).select_related('credit_profile'):
+        expected_debt = loan_totals.get(customer.customer_id, Decimal('0'))
+        try:
+            profile_inputs = _to_paisa(customer.credit_profile.score_inputs(year))
+        except CustomerCreditProfile.DoesNotExist:
+            profile_inputs = None
+        if customer.current_debt != expected_debt:
+            mismatched.append((customer.customer_id, f'current_debt={customer.current_debt} expected={expected_debt}'))
+        elif profile_inputs != _to_paisa(get_credit_score_inputs(customer)):
+            mismatched.append((customer.customer_id, 'credit profile out of step with loans'))
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--customers', type=int, default=4,
+                        help='Fewer customers means more threads contending for the same rows')
+    parser.add_argument('--loans', type=int, default=400, help='Loans attempted per run, split across threads')
+    parser.add_argument('--legacy', action='store_true', help='Time the old create_loan flow instead')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+    from django.db import connection
+    from loans.origination import originate_loan
+
+    settings.ELIGIBILITY_CACHE_ENABLED = False
+    tempdir = None
+    if connection.vendor == 'sqlite':
+        # Threads cannot share the default in-memory test database
+        tempdir = tempfile.TemporaryDirectory()
+        settings.DATABASES['default']['TEST']['NAME'] = os.path.join(tempdir.name, 'bench.sqlite3')
+        settings.DATABASES['default'].setdefault('OPTIONS', {})['timeout'] = 30
+
+    originate = legacy_origination if args.legacy else originate_loan
+    label = 'legacy create_loan flow' if args.legacy else 'locked origination'
+    per_thread = max(1, args.loans // args.threads)
+    stats = {'created': 0, 'rejected': 0, 'retries': 0}
+    lock = threading.Lock()
+
+    try:
+        with benchmark_database():
+            customer_ids = create_customers(args.customers)
+            connection.close()
+            threads = [
+                threading.Thread(target=worker, args=(originate, customer_ids, per_thread, seed, stats, lock))
+                for seed in range(args.threads)
+            ]
+            with timed(f'{label}, {args.threads} threads, {args.customers} customers', per_thread * args.threads):
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+            print(f"  created={stats['created']} rejected={stats['rejected']} lock retries={stats['retries']}")
+            mismatched = verify(customer_ids)
+            if mismatched:
+                print(f'  INCONSISTENT: {len(mismatched)} customers disagree with their loans')
+                for customer_id, problem in mismatched[:10]:
+                    print(f'    customer {customer_id}: {problem}')
+            else:
+                print('  consistent: every current_debt and credit profile matches the loans table')
+    finally:
+        if tempdir is not None:
+            tempdir.cleanup()
+
+
+if __name__ == '__main__':
+    main()
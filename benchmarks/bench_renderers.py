@@ -0,0 +1,82 @@
+"""
+JSON rendering and parsing: REST framework's stock JSONRenderer/JSONParser versus
+the orjson pair in loans/renderers.py, over the API's real response shapes.
+
+    python -m benchmarks.bench_renderers --iterations 20000
+
+No database is needed; the payloads are built from unsaved model instances.
+"""
+import argparse
+import time
+from datetime import date
+from decimal import Decimal
+from io import BytesIO
+
+from benchmarks.common import setup_django
+
+
+def payloads():
+    from loans.models import Customer, Loan
+    from loans.serializers import LoanEligibilityResponseSerializer, LoanDetailSerializer, LoanListSerializer
+
+    customer = Customer(
+        customer_id=1, first_name='Aarav', last_name='Sharma', age=34, phone_number='9876543210',
+        monthly_salary=Decimal('85000'), approved_limit=Decimal('3100000'),
+    )
+    loans = [
+        Loan(
+            loan_id=index, customer=customer, loan_amount=Decimal('250000') + index,
+            tenure=36, interest_rate=Decimal('11.75'), monthly_repayment=Decimal('8272.16'),
+            emis_paid_on_time=index % 36, start_date=date(2023, 1, 1), end_date=date(2026, 1, 1),
+        )
+        for index in range(1, 101)
+    ]
+    eligibility = LoanEligibilityResponseSerializer({
+        'customer_id': 1, 'approval': True, 'interest_rate': Decimal('10.5'),
+        'corrected_interest_rate': Decimal('12.00'), 'tenure': 36,
+        'monthly_installment': Decimal('8302.93'),
+    }).data
+    return {
+        'eligibility response': eligibility,
+        'loan detail': LoanDetailSerializer(loans[0]).data,
+        'loan list (100)': LoanListSerializer(loans, many=True).data,
+    }
+
+
+def per_second(iterations, func):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return iterations / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=20000)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.parsers import JSONParser
+    from rest_framework.renderers import JSONRenderer
+    from loans.renderers import ORJSONRenderer, ORJSONParser
+
+    stock_renderer, fast_renderer = JSONRenderer(), ORJSONRenderer()
+    stock_parser, fast_parser = JSONParser(), ORJSONParser()
+
+    print(f"{'(operations/s)':<30}{'stock':>12}{'orjson':>12}{'speedup':>10}")
+    for label, data in payloads().items():
+        body = stock_renderer.render(data)
+        assert fast_renderer.render(data) == body
+        assert fast_parser.parse(BytesIO(body)) == stock_parser.parse(BytesIO(body))
+
+        for operation, stock, fast in [
+            ('render', lambda: stock_renderer.render(data), lambda: fast_renderer.render(data)),
+            ('parse', lambda: stock_parser.parse(BytesIO(body)), lambda: fast_parser.parse(BytesIO(body))),
+        ]:
+            stock_rate = per_second(args.iterations, stock)
+            fast_rate = per_second(args.iterations, fast)
+            print(f'{label + " " + operation:<30}{stock_rate:>12,.0f}{fast_rate:>12,.0f}{fast_rate / stock_rate:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Loan read serialization: DRF ModelSerializers versus the compiled .values() fast path.
+
+    python -m benchmarks.bench_serializers --loans 10000
+
+Each path is timed twice, once for serialization alone over rows already in memory
+and once end to end (query, serialization and JSON rendering). Both paths render
+to the same bytes, which is checked before timing.
+"""
+import argparse
+import random
+import time
+from datetime import date
+from decimal import Decimal
+
+from benchmarks.common import setup_django, benchmark_database
+
+
+def create_loans(count, seed=0):
+    from loans.models import Customer, Loan
+
+    rng = random.Random(seed)
+    customer = Customer.objects.create(
+        first_name='Bench', last_name='Reader', age=40, phone_number='9300000000',
+        monthly_salary=Decimal('500000'), approved_limit=Decimal('18000000'),
+    )
+    Loan.objects.bulk_create([
+        Loan(
+            customer=customer,
+            loan_amount=Decimal(rng.randrange(1000000, 100000000)) / 100,
+            tenure=rng.choice([12, 24, 36, 60]),
+            interest_rate=Decimal(rng.randrange(800, 1800)) / 100,
+            monthly_repayment=Decimal(rng.randrange(100000, 5000000)) / 100,
+            emis_paid_on_time=rng.randrange(0, 24),
+            start_date=date(2020, 1, 1),
+            end_date=date(2030, 1, 1),
+        )
+        for _ in range(count)
+    ], batch_size=5000)
+    return customer
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--loans', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from loans.models import Loan
+    from loans.serializers import LoanDetailSerializer, LoanListSerializer
+    from loans.pagination import with_remaining_repayments
+    from loans.fast_serializers import (
+        LOAN_DETAIL_COLUMNS, LOAN_LIST_COLUMNS, build_loan_detail, build_loan_list_item
+    )
+
+    renderer = JSONRenderer()
+    with benchmark_database():
+        customer = create_loans(args.loans)
+        loans = Loan.objects.filter(customer=customer).order_by('loan_id')
+
+        def drf_list():
+            return LoanListSerializer(list(loans), many=True).data
+
+        def fast_list():
+            return [build_loan_list_item(row) for row in with_remaining_repayments(loans).values(*LOAN_LIST_COLUMNS)]
+
+        def drf_detail():
+            return [LoanDetailSerializer(loan).data for loan in loans.select_related('customer')]
+
+        def fast_detail():
+            return [build_loan_detail(row) for row in with_remaining_repayments(loans).values(*LOAN_DETAIL_COLUMNS)]
+
+        assert renderer.render(drf_list()) == renderer.render(fast_list())
+        assert renderer.render(drf_detail()) == renderer.render(fast_detail())
+
+        model_rows = list(loans.select_related('customer'))
+        list_rows = list(with_remaining_repayments(loans).values(*LOAN_LIST_COLUMNS))
+        detail_rows = list(with_remaining_repayments(loans).values(*LOAN_DETAIL_COLUMNS))
+        cases = [
+            ('list, serialize only', (
+                lambda: LoanListSerializer(model_rows, many=True).data,
+                lambda: [build_loan_list_item(row) for row in list_rows],
+            )),
+            ('detail, serialize only', (
+                lambda: [LoanDetailSerializer(loan).data for loan in model_rows],
+                lambda: [build_loan_detail(row) for row in detail_rows],
+            )),
+            ('list, query + render', (
+                lambda: renderer.render(drf_list()),
+                lambda: renderer.render(fast_list()),
+            )),
+            ('detail, query + render', (
+                lambda: renderer.render(drf_detail()),
+                lambda: renderer.render(fast_detail()),
+            )),
+        ]
+
+        print(f'{args.loans} loans, best of {args.repeat} (objects/s)')
+        print(f"{'':<24}{'DRF':>12}{'fast path':>12}{'speedup':>10}")
+        for label, (drf, fast) in cases:
+            drf_time = best_of(args.repeat, drf)
+            fast_time = best_of(args.repeat, fast)
+            print(
+                f'{label:<24}{args.loans / drf_time:>12,.0f}{args.loans / fast_time:>12,.0f}'
+                f'{drf_time / fast_time:>9.1f}x'
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Helpers shared by the benchmark scripts.
+
+Benchmarks run against a throwaway test database created from DATABASE_URL
+(an in-memory database for SQLite, test_<name> for PostgreSQL), so they never
+touch real data. Run them from the project root, e.g.:
+
+    python -m benchmarks.bench_customer_ingest --rows 1000000
+"""
+import contextlib
+import os
+import sys
+import time
+
+import django
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'credit_approval.settings')
+    django.setup()
+
+
+@contextlib.contextmanager
+def benchmark_database():
+    """
+    Create the test database for the duration of the block
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    old_config = setup_databases(verbosity=0, interactive=False)
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0)
+
+
+@contextlib.contextmanager
+def timed(label, items=None):
+    """
+    Print the wall time of the block, and the throughput when items is given
+    """
+    start = time.perf_counter()
+    yield
+    elapsed = time.perf_counter() - start
+    if items:
+        print(f'{label}: {elapsed:.2f}s ({items / elapsed:,.0f} rows/s)')
+    else:
+        print(f'{label}: {elapsed:.2f}s')
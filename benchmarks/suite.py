@@ -0,0 +1,338 @@
+"""
+Benchmark suite with a JSON baseline and regression thresholds.
+
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --save benchmarks/baseline.json
+    python -m benchmarks.suite --sizes 1000 100000 1000000 --baseline benchmarks/baseline.json
+
+Each size is a number of loans (LOANS_PER_CUSTOMER per customer) generated with
+generate_synthetic_data into a throwaway database. Sizes run smallest first, and the
+database is grown between them. At each size, every case runs in-process: the
+scoring functions, the ingest tasks, and one request to every URL in loans/urls.py.
+Latency percentiles and the number of queries per call are recorded for each case.
+
+With --baseline, a case regresses when its p50 or p95 latency exceeds the baseline
+by more than --threshold (a fraction, overridable per case through the baseline's
+"thresholds" map) plus --min-delta-ms, or when it runs more queries than the
+baseline. Any regression is listed and the suite exits with status 1.
+Baselines are only comparable on the same machine and database.
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from io import StringIO
+
+from benchmarks.common import setup_django, benchmark_database
+
+LOANS_PER_CUSTOMER = 10
+DEFAULT_SIZES = [1000, 100000, 1000000]
+METRICS = ['p50_ms', 'p95_ms']
+# Rows in the files the ingest cases upsert, whatever the database size
+INGEST_CUSTOMERS = 500
+# Phone numbers for /register/, outside the ranges synthetic data uses
+PHONE_NUMBERS = itertools.count(5_000_000_000)
+
+
+def percentile(ordered, fraction):
+    """
+    Nearest-rank percentile of an ascending list
+    """
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+class Case:
+    def __init__(self, name, call, iterations=None):
+        self.name = name
+        self.call = call
+        self.iterations = iterations
+
+    def run(self, iterations):
+        from django.db import connection
+
+        # Counted with an execute wrapper; the test client's request_started resets connection.queries
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(sql)
+            return execute(sql, params, many, context)
+
+        iterations = self.iterations or iterations
+        counter = itertools.count()
+        self.call(next(counter))  # warm up
+        with connection.execute_wrapper(count):
+            self.call(next(counter))
+
+        timings = []
+        for _ in range(iterations):
+            index = next(counter)
+            start = time.perf_counter()
+            self.call(index)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        return {
+            'iterations': iterations,
+            'mean_ms': round(sum(timings) / len(timings), 4),
+            'p50_ms': round(percentile(timings, 0.50), 4),
+            'p95_ms': round(percentile(timings, 0.95), 4),
+            'p99_ms': round(percentile(timings, 0.99), 4),
+            'queries': len(queries),
+        }
+
+
+def grow_database(loans):
+    """
+    Add synthetic customers until the loans table holds at least `loans` rows
+    """
+    from django.core.management import call_command
+    from loans.models import Loan
+
+    missing = loans - Loan.objects.count()
+    if missing > 0:
+        customers = -(-missing // LOANS_PER_CUSTOMER)
+        call_command(
+            'generate_synthetic_data', customers=customers, loans_per_customer=LOANS_PER_CUSTOMER,
+            seed=loans, stdout=StringIO()
+        )
+
+
+def write_ingest_files(directory):
+    """
+    customer_data/loan_data xlsx files with IDs far above the generated data
+    """
+    from django.core.management import call_command
+
+    call_command(
+        'generate_synthetic_data', customers=INGEST_CUSTOMERS, loans_per_customer=3, format='xlsx',
+        output_dir=directory, start_customer_id=10 ** 9, start_loan_id=10 ** 9, stdout=StringIO()
+    )
+    return os.path.join(directory, 'customer_data.xlsx'), os.path.join(directory, 'loan_data.xlsx')
+
+
+def _expect(response, *statuses):
+    assert response.status_code in statuses, (response.status_code, response.content[:200])
+    return response
+
+
+def scoring_cases(rng, customer_ids):
+    from loans.models import Customer
+    from loans.utils import calculate_credit_score, calculate_monthly_installment, check_loan_eligibility
+
+    def credit_score(index):
+        # A freshly loaded customer, as the views have, so the profile read is included
+        customer = Customer.objects.get(customer_id=rng.randint(*customer_ids))
+        calculate_credit_score(customer)
+
+    def eligibility(index):
+        check_loan_eligibility(
+            rng.randint(*customer_ids), Decimal(rng.randrange(1, 40) * 50000),
+            Decimal(rng.randrange(800, 1800)) / 100, rng.choice([12, 24, 36, 60])
+        )
+
+    def installment(index):
+        calculate_monthly_installment(Decimal(rng.randrange(1, 40) * 50000), Decimal(rng.randrange(800, 1800)) / 100, 36)
+
+    return [
+        Case('calculate_credit_score', credit_score),
+        Case('check_loan_eligibility', eligibility),
+        Case('calculate_monthly_installment', installment),
+    ]
+
+
+def ingest_cases(customer_file, loan_file):
+    from loans.tasks import ingest_customer_data, ingest_loan_data
+
+    def ingest_customers(index):
+        assert ingest_customer_data(customer_file)['status'] == 'success'
+
+    def ingest_loans(index):
+        result = ingest_loan_data(loan_file)
+        assert result['status'] == 'success' and not result['rejects'], result
+
+    return [
+        Case(f'ingest_customer_data ({INGEST_CUSTOMERS} rows)', ingest_customers, iterations=5),
+        Case(f'ingest_loan_data ({INGEST_CUSTOMERS * 3} rows)', ingest_loans, iterations=5),
+    ]
+
+
+def endpoint_cases(rng, customer_ids, loan_ids):
+    """
+    One case per named URL in loans/urls.py
+    """
+    from django.test import Client
+    from django.urls import reverse
+    import loans.urls
+
+    client = Client()
+
+    def quote():
+        return {
+            'customer_id': rng.randint(*customer_ids),
+            'loan_amount': rng.randrange(1, 40) * 50000,
+            'interest_rate': rng.randrange(800, 1800) / 100,
+            'tenure': rng.choice([12, 24, 36, 60]),
+        }
+
+    def post(name, body):
+        return client.post(reverse(name), json.dumps(body), content_type='application/json')
+
+    calls = {
+        # Redis is optional here; the health check reports 503 without it
+        'health_check': lambda index: _expect(client.get(reverse('health_check')), 200, 503),
+        'health_check_alt': lambda index: _expect(client.get(reverse('health_check_alt')), 200, 503),
+        'register_customer': lambda index: _expect(post('register_customer', {
+            'first_name': 'Bench', 'last_name': 'Suite', 'age': 35,
+            'monthly_income': rng.randrange(30, 300) * 1000, 'phone_number': str(next(PHONE_NUMBERS)),
+        }), 201),
+        'check_eligibility': lambda index: _expect(post('check_eligibility', quote()), 200),
+        'check_eligibility_batch': lambda index: _expect(
+            post('check_eligibility_batch', [quote() for _ in range(100)]), 200
+        ),
+        'create_loan': lambda index: _expect(post('create_loan', quote()), 200, 201),
+        'view_loan': lambda index: _expect(
+            client.get(reverse('view_loan', kwargs={'loan_id': rng.randint(*loan_ids)})), 200
+        ),
+        'loan_schedule': lambda index: _expect(
+            client.get(reverse('loan_schedule', kwargs={'loan_id': rng.randint(*loan_ids)})), 200
+        ),
+        'view_loans_by_customer': lambda index: _expect(
+            client.get(reverse('view_loans_by_customer', kwargs={'customer_id': rng.randint(*customer_ids)})), 200
+        ),
+        'metrics': lambda index: _expect(client.get(reverse('metrics')), 200, 404),
+    }
+    labels = {'check_eligibility_batch': 'POST check_eligibility_batch (100)'}
+
+    cases = []
+    for pattern in loans.urls.urlpatterns:
+        if pattern.name not in calls:
+            raise SystemExit(f'No benchmark case for URL {pattern.name!r} ({pattern.pattern}); add one to benchmarks/suite.py')
+        method = 'GET' if pattern.name.startswith(('health', 'view', 'loan_schedule', 'metrics')) else 'POST'
+        cases.append(Case(labels.get(pattern.name, f'{method} {pattern.name}'), calls[pattern.name]))
+    return cases
+
+
+def run_size(size, iterations, ingest_files, seed):
+    from django.db.models import Max, Min
+    from loans.models import Customer, Loan
+
+    grow_database(size)
+    rng = random.Random(seed)
+    # Generated IDs are contiguous; ingest rows sit far above them
+    customer_range = Customer.objects.filter(customer_id__lt=10 ** 9).aggregate(low=Min('customer_id'), high=Max('customer_id'))
+    loan_range = Loan.objects.filter(loan_id__lt=10 ** 9).aggregate(low=Min('loan_id'), high=Max('loan_id'))
+    customer_ids = (customer_range['low'], customer_range['high'])
+    loan_ids = (loan_range['low'], loan_range['high'])
+
+    cases = scoring_cases(rng, customer_ids) + ingest_cases(*ingest_files) + endpoint_cases(rng, customer_ids, loan_ids)
+    results = {}
+    print(f'\n{size:,} loans')
+    print(f"{'':<42}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+    for case in cases:
+        result = case.run(iterations)
+        results[case.name] = result
+        print(f"{case.name:<42}{result['p50_ms']:>10.3f}{result['p95_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['queries']:>9}")
+    return results
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    """
+    Regression messages for results against a baseline document
+    """
+    thresholds = baseline.get('thresholds', {})
+    regressions = []
+    for size, cases in results.items():
+        for name, current in cases.items():
+            previous = baseline['results'].get(size, {}).get(name)
+            if previous is None:
+                continue
+            allowed = thresholds.get(name, threshold)
+            for metric in METRICS:
+                limit = previous[metric] * (1 + allowed) + min_delta_ms
+                if current[metric] > limit:
+                    regressions.append(
+                        f'{size} loans, {name}: {metric} {previous[metric]:.3f} -> {current[metric]:.3f} '
+                        f'(limit {limit:.3f})'
+                    )
+            if current['queries'] > previous['queries']:
+                regressions.append(
+                    f"{size} loans, {name}: queries {previous['queries']} -> {current['queries']}"
+                )
+    return regressions
+
+
+def environment():
+    import django
+    from django.db import connection
+
+    return {
+        'recorded_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'machine': platform.node(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Loan counts to benchmark at')
+    parser.add_argument('--iterations', type=int, default=200, help='Timed calls per case')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--baseline', help='Baseline JSON to compare against')
+    parser.add_argument('--save', help='Write the results as a baseline JSON')
+    parser.add_argument('--threshold', type=float, default=0.5, help='Allowed latency growth as a fraction')
+    parser.add_argument('--min-delta-ms', type=float, default=0.05, help='Latency growth always allowed, in ms')
+    args = parser.parse_args()
+
+    setup_django()
+    from django.conf import settings
+
+    # Measure the database path, not the Redis result cache
+    settings.ELIGIBILITY_CACHE_ENABLED = False
+    settings.DEBUG = False
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    results = {}
+    with benchmark_database(), tempfile.TemporaryDirectory() as directory:
+        ingest_files = write_ingest_files(directory)
+        for size in sorted(args.sizes):
+            results[str(size)] = run_size(size, args.iterations, ingest_files, args.seed)
+        meta = environment()
+
+    if args.save:
+        document = {'environment': meta, 'iterations': args.iterations, 'results': results}
+        if baseline is not None or os.path.exists(args.save):
+            # Keep hand-tuned per-case thresholds when re-recording
+            with open(args.baseline or args.save) as previous_file:
+                document['thresholds'] = json.load(previous_file).get('thresholds', {})
+        with open(args.save, 'w') as baseline_file:
+            json.dump(document, baseline_file, indent=2, sort_keys=True)
+            baseline_file.write('\n')
+        print(f'\nBaseline written to {args.save}')
+
+    if baseline is not None:
+        previous = baseline.get('environment', {})
+        if previous.get('database') != meta['database'] or previous.get('machine') != meta['machine']:
+            print(f"\nWarning: baseline was recorded on {previous.get('machine')} ({previous.get('database')})")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) against {args.baseline}:')
+            for regression in regressions:
+                print(f'  {regression}')
+            sys.exit(1)
+        print(f'\nNo regressions against {args.baseline}')
+
+
+if __name__ == '__main__':
+    main()
@@ -6,6 +6,7 @@ from pathlib import Path
 import os
 from decouple import config
 import dj_database_url
+from celery.schedules import crontab
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -32,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'loans.metrics.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -65,8 +67,17 @@ WSGI_APPLICATION = 'credit_approval.wsgi.application'
 # Database
 DATABASE_URL = config('DATABASE_URL', default='sqlite:///db.sqlite3')
 DATABASES = {
-    'default': dj_database_url.parse(DATABASE_URL)
+    'default': dj_database_url.parse(
+        DATABASE_URL,
+        # Seconds a connection is kept open for reuse by later requests (0 closes it after
+        # every request; use 0 under ASGI and pool with PgBouncer instead)
+        conn_max_age=config('DB_CONN_MAX_AGE', default=60, cast=int),
+        # Check a reused connection is still alive before the first query of a request
+        conn_health_checks=config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+    )
 }
+# Required behind PgBouncer in transaction pooling mode
+DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = config('DB_DISABLE_SERVER_SIDE_CURSORS', default=False, cast=bool)
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -93,28 +104,110 @@ USE_TZ = True
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 
+# Covering-index INCLUDE columns only apply on PostgreSQL; other backends create the plain index
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # REST Framework configuration
+# Render and parse JSON with orjson (optional dependency, see loans/renderers.py)
+FAST_JSON_ENABLED = config('FAST_JSON_ENABLED', default=False, cast=bool)
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'loans.renderers.ORJSONRenderer' if FAST_JSON_ENABLED else 'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_PARSER_CLASSES': [
-        'rest_framework.parsers.JSONParser',
+        'loans.renderers.ORJSONParser' if FAST_JSON_ENABLED else 'rest_framework.parsers.JSONParser',
     ],
 }
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
 
+REDIS_URL = config('REDIS_URL', default='redis://localhost:6379/0')
+
+# Shared Redis connection pools (loans.pools), one per Redis URL per process
+REDIS_POOL_MAX_CONNECTIONS = config('REDIS_POOL_MAX_CONNECTIONS', default=50, cast=int)
+# Seconds to wait for a free pooled connection before failing
+REDIS_POOL_TIMEOUT = config('REDIS_POOL_TIMEOUT', default=2, cast=float)
+# Seconds a pooled connection may sit idle before it is pinged on checkout
+REDIS_HEALTH_CHECK_INTERVAL = config('REDIS_HEALTH_CHECK_INTERVAL', default=30, cast=int)
+REDIS_SOCKET_TIMEOUT = config('REDIS_SOCKET_TIMEOUT', default=0.5, cast=float)
+
 # Celery Configuration
-CELERY_BROKER_URL = config('REDIS_URL', default='redis://localhost:6379/0')
-CELERY_RESULT_BACKEND = config('REDIS_URL', default='redis://localhost:6379/0')
+CELERY_BROKER_URL = REDIS_URL
+CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_BROKER_POOL_LIMIT = config('CELERY_BROKER_POOL_LIMIT', default=10, cast=int)
+CELERY_REDIS_MAX_CONNECTIONS = REDIS_POOL_MAX_CONNECTIONS
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 # Fix for Celery 6.0+ broker connection retry warning
-CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
\ No newline at end of file
+CELERY_BROKER_CONNECTION_RETRY_ON_STARTUP = True
+# Run tasks in-process (useful for local parallel ingest runs without a worker)
+CELERY_TASK_ALWAYS_EAGER = config('CELERY_TASK_ALWAYS_EAGER', default=False, cast=bool)
+# Nightly expiry of finished loans and recomputation of current debt (celery beat)
+LOAN_STATE_REFRESH_HOUR = config('LOAN_STATE_REFRESH_HOUR', default=2, cast=int)
+LOAN_STATE_BATCH_SIZE = config('LOAN_STATE_BATCH_SIZE', default=10000, cast=int)
+CELERY_BEAT_SCHEDULE = {
+    'refresh-loan-state': {
+        'task': 'loans.tasks.refresh_loan_state',
+        'schedule': crontab(hour=LOAN_STATE_REFRESH_HOUR, minute=0),
+    },
+    'purge-idempotency-records': {
+        'task': 'loans.tasks.purge_idempotency_records',
+        'schedule': crontab(hour=LOAN_STATE_REFRESH_HOUR, minute=30),
+    },
+}
+
+# Rows written per INSERT ... ON CONFLICT statement by the ingest tasks
+INGEST_BATCH_SIZE = config('INGEST_BATCH_SIZE', default=5000, cast=int)
+# Parquet conversions of xlsx ingest sources, reused while the workbook is unchanged (needs pyarrow).
+# Kept in INGEST_CACHE_DIR, or in an .ingest_cache directory next to each source when unset
+INGEST_PARQUET_CACHE = config('INGEST_PARQUET_CACHE', default=True, cast=bool)
+INGEST_CACHE_DIR = config('INGEST_CACHE_DIR', default='')
+
+# Cache configuration (shares the Redis instance used by Celery)
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': config('CACHE_URL', default=REDIS_URL),
+        'OPTIONS': {
+            # Every thread shares the process-wide pool instead of building its own
+            'pool_class': 'loans.pools.SharedConnectionPool',
+        },
+    }
+}
+
+# Eligibility result cache
+ELIGIBILITY_CACHE_ENABLED = config('ELIGIBILITY_CACHE_ENABLED', default=True, cast=bool)
+ELIGIBILITY_CACHE_TTL = config('ELIGIBILITY_CACHE_TTL', default=300, cast=int)
+# Seconds to bypass the cache after Redis fails, so an outage does not add latency to every request
+ELIGIBILITY_CACHE_RETRY_AFTER = config('ELIGIBILITY_CACHE_RETRY_AFTER', default=30, cast=int)
+
+# /view-loans/<customer_id>/ page size when none is requested, and the largest page served
+VIEW_LOANS_PAGE_SIZE = config('VIEW_LOANS_PAGE_SIZE', default=100, cast=int)
+VIEW_LOANS_MAX_PAGE_SIZE = config('VIEW_LOANS_MAX_PAGE_SIZE', default=1000, cast=int)
+
+# Route /check-eligibility/, /view-loan/ and /view-loans/ to the native async views in
+# loans.async_views; only worthwhile when serving through credit_approval.asgi
+ASYNC_VIEWS_ENABLED = config('ASYNC_VIEWS_ENABLED', default=False, cast=bool)
+
+# Maximum number of applications accepted by /check-eligibility/batch/
+ELIGIBILITY_BATCH_MAX_SIZE = config('ELIGIBILITY_BATCH_MAX_SIZE', default=5000, cast=int)
+
+# Idempotency-Key handling for /create-loan/
+# Seconds a stored response is replayed for
+IDEMPOTENCY_TTL = config('IDEMPOTENCY_TTL', default=86400, cast=int)
+# Seconds a request holds its key before another request may take it over
+IDEMPOTENCY_LOCK_TIMEOUT = config('IDEMPOTENCY_LOCK_TIMEOUT', default=30, cast=int)
+# Seconds a duplicate request waits for the in-flight one before getting 409
+IDEMPOTENCY_WAIT = config('IDEMPOTENCY_WAIT', default=5, cast=float)
+
+# Per-request query count and SQL, scoring and serialization time, served on /metrics
+# for Prometheus and, with SERVER_TIMING_ENABLED, in a Server-Timing response header
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+SERVER_TIMING_ENABLED = config('SERVER_TIMING_ENABLED', default=True, cast=bool)
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Customer, Loan
+from .models import Customer, Loan, CustomerCreditProfile
 
 
 @admin.register(Customer)
@@ -15,4 +15,11 @@ class LoanAdmin(admin.ModelAdmin):
     list_display = ['loan_id', 'customer', 'loan_amount', 'interest_rate', 'tenure', 'monthly_repayment', 'is_active']
     list_filter = ['is_active', 'start_date', 'interest_rate']
     search_fields = ['customer__first_name', 'customer__last_name', 'loan_id']
-    readonly_fields = ['loan_id', 'created_at', 'updated_at']
\ No newline at end of file
+    readonly_fields = ['loan_id', 'created_at', 'updated_at']
+
+
+@admin.register(CustomerCreditProfile)
+class CustomerCreditProfileAdmin(admin.ModelAdmin):
+    list_display = ['customer', 'loan_count', 'active_principal', 'active_emi_total', 'emis_paid_on_time', 'updated_at']
+    search_fields = ['customer__first_name', 'customer__last_name', 'customer__customer_id']
+    readonly_fields = ['updated_at']
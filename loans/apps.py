@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class LoansConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'loans'
\ No newline at end of file
+    name = 'loans'
+
+    def ready(self):
+        # Registers the connection_created receivers behind the health check's pool stats
+        # and the per-request query counts
+        from . import metrics, pools  # noqa: F401
@@ -0,0 +1,151 @@
+"""
+Native async variants of the read endpoints.
+
+loans.urls routes these instead of the DRF views in loans.views when
+ASYNC_VIEWS_ENABLED is set, which only pays off when the project is served
+through credit_approval.asgi. Request handling and response bodies match the
+DRF views, which DRF 3.14 cannot run natively under ASGI. Methods a view does not
+implement (OPTIONS, and the 405 for anything else) are answered by the DRF view
+itself on a worker thread.
+"""
+from functools import wraps
+from asgiref.sync import sync_to_async
+from io import BytesIO
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.exceptions import ParseError
+from rest_framework.settings import api_settings
+
+from . import views
+from .models import Customer, Loan
+from .serializers import (
+    LoanEligibilitySerializer,
+    LoanEligibilityResponseSerializer,
+    LoanListQuerySerializer
+)
+from .cache import acached_check_loan_eligibility
+from .conditional import conditional, aloan_validators, aloan_list_validators
+from .pagination import page_queryset, split_page, next_page_headers, with_remaining_repayments
+from .fast_serializers import LOAN_DETAIL_COLUMNS, LOAN_LIST_COLUMNS, build_loan_detail, build_loan_list_item
+from .metrics import timed
+
+
+def _csrf_exempt(view):
+    """
+    csrf_exempt for async views, which Django 4.2's decorator turns into sync ones.
+    The API authenticates no sessions, and DRF exempts its views the same way.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        return await view(request, *args, **kwargs)
+    wrapper.csrf_exempt = True
+    return wrapper
+
+
+@timed('serialize')
+def _json_response(data, status_code=status.HTTP_200_OK):
+    # Rendered with the configured DRF renderer so the bytes match the sync views
+    renderer = api_settings.DEFAULT_RENDERER_CLASSES[0]()
+    return HttpResponse(renderer.render(data), status=status_code, content_type='application/json')
+
+
+async def _drf_response(view, request, *args, **kwargs):
+    """
+    Response of the DRF view for a method the async view does not implement
+    """
+    def respond():
+        return view(request, *args, **kwargs).render()
+    return await sync_to_async(respond)()
+
+
+def _parse_json(request):
+    """
+    Body parsed with the configured DRF parser, or the error response DRF would give
+    """
+    if request.content_type != 'application/json':
+        return None, _json_response(
+            {'detail': f'Unsupported media type "{request.content_type}" in request.'},
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE
+        )
+    parser = api_settings.DEFAULT_PARSER_CLASSES[0]()
+    try:
+        return parser.parse(BytesIO(request.body), request.content_type, {'encoding': request.encoding or settings.DEFAULT_CHARSET}), None
+    except ParseError as exc:
+        return None, _json_response({'detail': exc.detail}, status.HTTP_400_BAD_REQUEST)
+
+
+@_csrf_exempt
+async def check_eligibility(request):
+    """
+    Check loan eligibility for a customer
+    """
+    if request.method != 'POST':
+        return await _drf_response(views.check_eligibility, request)
+
+    data, error_response = _parse_json(request)
+    if error_response is not None:
+        return error_response
+    serializer = LoanEligibilitySerializer(data=data)
+    if not serializer.is_valid():
+        return _json_response(serializer.errors, status.HTTP_400_BAD_REQUEST)
+
+    data = serializer.validated_data
+    eligibility_result = await acached_check_loan_eligibility(
+        data['customer_id'],
+        data['loan_amount'],
+        data['interest_rate'],
+        data['tenure']
+    )
+
+    response_data = {
+        'customer_id': data['customer_id'],
+        'approval': eligibility_result['approval'],
+        'interest_rate': eligibility_result['interest_rate'],
+        'corrected_interest_rate': eligibility_result['corrected_interest_rate'],
+        'tenure': data['tenure'],
+        'monthly_installment': eligibility_result['monthly_installment']
+    }
+    return _json_response(LoanEligibilityResponseSerializer(response_data).data)
+
+
+@_csrf_exempt
+@conditional(aloan_validators)
+async def view_loan(request, loan_id):
+    """
+    View loan details by loan ID
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return await _drf_response(views.view_loan, request, loan_id=loan_id)
+
+    try:
+        loan = await with_remaining_repayments(Loan.objects.filter(loan_id=loan_id)).values(*LOAN_DETAIL_COLUMNS).aget()
+    except Loan.DoesNotExist:
+        return _json_response({'error': 'Loan not found'}, status.HTTP_404_NOT_FOUND)
+    return _json_response(build_loan_detail(loan))
+
+
+@_csrf_exempt
+@conditional(aloan_list_validators)
+async def view_loans_by_customer(request, customer_id):
+    """
+    View active loans for a specific customer, a page at a time
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return await _drf_response(views.view_loans_by_customer, request, customer_id=customer_id)
+
+    if not await Customer.objects.filter(customer_id=customer_id).aexists():
+        return _json_response({'error': 'Customer not found'}, status.HTTP_404_NOT_FOUND)
+
+    query = LoanListQuerySerializer(data=request.GET)
+    if not query.is_valid():
+        return _json_response(query.errors, status.HTTP_400_BAD_REQUEST)
+
+    rows = [loan async for loan in page_queryset(
+        Loan.objects.filter(customer_id=customer_id, is_active=True), query.validated_data, LOAN_LIST_COLUMNS
+    )]
+    page, next_cursor = split_page(rows, query.validated_data)
+    response = _json_response([build_loan_list_item(loan) for loan in page])
+    for header, value in next_page_headers(request, next_cursor).items():
+        response[header] = value
+    return response
@@ -0,0 +1,186 @@
+import logging
+import time
+from decimal import Decimal
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import CUSTOMER_NOT_FOUND, check_loan_eligibility, acheck_loan_eligibility
+from .metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'eligibility:version:{customer_id}'
+RESULT_KEY = 'eligibility:result:{customer_id}:{loan_amount}:{interest_rate}:{tenure}'
+HITS_KEY = 'eligibility:stats:hits'
+MISSES_KEY = 'eligibility:stats:misses'
+
+# Monotonic deadline before which the cache is bypassed after a Redis failure
+_bypass_until = 0.0
+
+
+def _normalize(value):
+    return f'{Decimal(value).normalize():f}'
+
+
+def _result_key(customer_id, loan_amount, interest_rate, tenure):
+    return RESULT_KEY.format(
+        customer_id=customer_id,
+        loan_amount=_normalize(loan_amount),
+        interest_rate=_normalize(interest_rate),
+        tenure=int(tenure),
+    )
+
+
+def _new_version():
+    return time.time_ns()
+
+
+def cache_reachable():
+    """
+    False while the cache is being bypassed after a Redis failure
+    """
+    return time.monotonic() >= _bypass_until
+
+
+def mark_cache_unavailable(exc):
+    """
+    Bypass the cache for ELIGIBILITY_CACHE_RETRY_AFTER seconds after a Redis failure
+    """
+    global _bypass_until
+    now = time.monotonic()
+    if now >= _bypass_until:
+        logger.warning('Cache unavailable, bypassing for %ss: %s', settings.ELIGIBILITY_CACHE_RETRY_AFTER, exc)
+    _bypass_until = now + settings.ELIGIBILITY_CACHE_RETRY_AFTER
+
+
+def _cache_available():
+    return settings.ELIGIBILITY_CACHE_ENABLED and cache_reachable()
+
+
+def _cacheable(result):
+    # Nothing bumps the version of a customer that does not exist yet, so a cached
+    # "not found" would outlive the customer's registration or ingest
+    return result['message'] != CUSTOMER_NOT_FOUND
+
+
+def _increment(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, None)
+        cache.incr(key)
+
+
+def cached_check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
+    """
+    check_loan_eligibility behind a Redis cache.
+    Entries are stored together with the customer's version token and only
+    served while that token is current, so bumping the version invalidates
+    every cached quote for the customer without having to find the keys.
+    """
+    if not _cache_available():
+        return check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+
+    version_key = VERSION_KEY.format(customer_id=customer_id)
+    result_key = _result_key(customer_id, loan_amount, interest_rate, tenure)
+    try:
+        cached = cache.get_many([version_key, result_key])
+        version = cached.get(version_key)
+        if version is None:
+            cache.add(version_key, _new_version(), None)
+            version = cache.get(version_key)
+
+        entry = cached.get(result_key)
+        if entry is not None and entry[0] == version:
+            _increment(HITS_KEY)
+            record_cache_lookup(True)
+            return entry[1]
+        _increment(MISSES_KEY)
+        record_cache_lookup(False)
+    except Exception as e:
+        mark_cache_unavailable(e)
+        return check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+
+    result = check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+    if not _cacheable(result):
+        return result
+    try:
+        cache.set(result_key, (version, result), settings.ELIGIBILITY_CACHE_TTL)
+    except Exception as e:
+        mark_cache_unavailable(e)
+    return result
+
+
+async def _aincrement(key):
+    try:
+        await cache.aincr(key)
+    except ValueError:
+        await cache.aadd(key, 0, None)
+        await cache.aincr(key)
+
+
+async def acached_check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
+    """
+    Async cached_check_loan_eligibility, using the cache's async API
+    """
+    if not _cache_available():
+        return await acheck_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+
+    version_key = VERSION_KEY.format(customer_id=customer_id)
+    result_key = _result_key(customer_id, loan_amount, interest_rate, tenure)
+    try:
+        cached = await cache.aget_many([version_key, result_key])
+        version = cached.get(version_key)
+        if version is None:
+            await cache.aadd(version_key, _new_version(), None)
+            version = await cache.aget(version_key)
+
+        entry = cached.get(result_key)
+        if entry is not None and entry[0] == version:
+            await _aincrement(HITS_KEY)
+            record_cache_lookup(True)
+            return entry[1]
+        await _aincrement(MISSES_KEY)
+        record_cache_lookup(False)
+    except Exception as e:
+        mark_cache_unavailable(e)
+        return await acheck_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+
+    result = await acheck_loan_eligibility(customer_id, loan_amount, interest_rate, tenure)
+    if not _cacheable(result):
+        return result
+    try:
+        await cache.aset(result_key, (version, result), settings.ELIGIBILITY_CACHE_TTL)
+    except Exception as e:
+        mark_cache_unavailable(e)
+    return result
+
+
+def invalidate_eligibility(customer_ids):
+    """
+    Bump the version token of each customer so their cached results are no longer served
+    """
+    if not settings.ELIGIBILITY_CACHE_ENABLED:
+        return
+    versions = {VERSION_KEY.format(customer_id=customer_id): _new_version() for customer_id in customer_ids}
+    if not versions:
+        return
+    try:
+        cache.set_many(versions, None)
+    except Exception as e:
+        # Entries written under the old token expire through their TTL
+        mark_cache_unavailable(e)
+
+
+def eligibility_cache_stats():
+    """
+    Hit and miss counters shared by every process using the cache
+    """
+    try:
+        stats = cache.get_many([HITS_KEY, MISSES_KEY])
+    except Exception:
+        return {'hits': None, 'misses': None}
+    return {
+        'hits': stats.get(HITS_KEY, 0),
+        'misses': stats.get(MISSES_KEY, 0),
+    }
@@ -0,0 +1,137 @@
+"""
+Conditional GET (ETag / Last-Modified) for the loan read endpoints.
+
+Before the view runs, a validators function probes the rows the response is built
+from with a single cheap query (updated_at values, or MAX(updated_at) and a row
+count for a loan list). When the client's If-None-Match or If-Modified-Since still
+matches, the request is answered with 304 Not Modified and the response is never
+queried, serialized or rendered.
+
+A loan list only has an ETag: its MAX(updated_at) goes backwards when the most
+recently updated loan expires or is deleted, so it cannot serve as Last-Modified.
+"""
+import asyncio
+import hashlib
+from datetime import timezone as dt_timezone
+from functools import wraps
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import Loan
+
+
+def _etag(*parts):
+    digest = hashlib.blake2b('|'.join(str(part) for part in parts).encode(), digest_size=16)
+    return quote_etag(digest.hexdigest())
+
+
+def _timestamp(dt):
+    if not timezone.is_aware(dt):
+        dt = timezone.make_aware(dt, dt_timezone.utc)
+    return int(dt.timestamp())
+
+
+def _loan_validators(loan_id, row):
+    if row is None:
+        return None
+    loan_updated_at, customer_updated_at = row
+    # The detail response includes the customer's name and phone number
+    return _etag('loan', loan_id, loan_updated_at.isoformat(), customer_updated_at.isoformat()), max(
+        loan_updated_at, customer_updated_at
+    )
+
+
+def _loan_list_validators(request, customer_id, state):
+    if not state['count']:
+        # Nothing to validate against; the response is an empty page or a 404
+        return None
+    # Each page, filter and ordering is a different representation. A loan leaving the
+    # active set or deleted changes the count, a loan updated in place MAX(updated_at).
+    query = sorted(request.GET.lists())
+    return _etag('loans', customer_id, state['last_modified'].isoformat(), state['count'], query), None
+
+
+def _loan_query(loan_id):
+    return Loan.objects.filter(loan_id=loan_id).values_list('updated_at', 'customer__updated_at')
+
+
+def _loan_list_query(customer_id):
+    # Answered from loans_customer_active_idx alone, which includes updated_at
+    return Loan.objects.filter(customer_id=customer_id, is_active=True)
+
+
+def loan_validators(request, loan_id):
+    """
+    (etag, last_modified) of /view-loan/<loan_id>/ and /loan-schedule/<loan_id>/,
+    or None when the loan does not exist
+    """
+    return _loan_validators(loan_id, _loan_query(loan_id).first())
+
+
+async def aloan_validators(request, loan_id):
+    return _loan_validators(loan_id, await _loan_query(loan_id).afirst())
+
+
+def loan_list_validators(request, customer_id):
+    """
+    (etag, None) of /view-loans/<customer_id>/, or None when the customer has no active loans
+    """
+    state = _loan_list_query(customer_id).aggregate(last_modified=Max('updated_at'), count=Count('loan_id'))
+    return _loan_list_validators(request, customer_id, state)
+
+
+async def aloan_list_validators(request, customer_id):
+    state = await _loan_list_query(customer_id).aaggregate(last_modified=Max('updated_at'), count=Count('loan_id'))
+    return _loan_list_validators(request, customer_id, state)
+
+
+def _not_modified(request, validators):
+    if validators is None:
+        return None
+    etag, last_modified = validators
+    if last_modified is not None:
+        last_modified = _timestamp(last_modified)
+    return get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def _finalize(response, validators):
+    if validators is not None and response.status_code in (200, 304):
+        etag, last_modified = validators
+        if not response.has_header('ETag'):
+            response['ETag'] = etag
+        if last_modified is not None and not response.has_header('Last-Modified'):
+            response['Last-Modified'] = http_date(_timestamp(last_modified))
+    # Clients may keep the response but must revalidate it before every use
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional(validators):
+    """
+    Answer GET and HEAD requests with 304 Not Modified when the client's copy is current.
+    validators(request, *args, **kwargs) returns (etag, last_modified) or None, with
+    last_modified None for a resource validated by its ETag alone. Apply it below
+    @api_view on DRF views; on async views pass the async validators function.
+    """
+    def decorator(view):
+        if asyncio.iscoroutinefunction(view):
+            @wraps(view)
+            async def async_wrapper(request, *args, **kwargs):
+                if request.method not in ('GET', 'HEAD'):
+                    return await view(request, *args, **kwargs)
+                current = await validators(request, *args, **kwargs)
+                response = _not_modified(request, current) or await view(request, *args, **kwargs)
+                return _finalize(response, current)
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            current = validators(request, *args, **kwargs)
+            response = _not_modified(request, current) or view(request, *args, **kwargs)
+            return _finalize(response, current)
+        return wrapper
+    return decorator
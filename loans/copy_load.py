@@ -0,0 +1,244 @@
+"""
+Bulk load of the customer and loan files through PostgreSQL COPY.
+
+Each file is streamed chunk by chunk into a temporary staging table with
+COPY FROM STDIN, then merged into its table with one INSERT ... ON CONFLICT.
+Customers, loans, credit profiles and the ID sequences are all written in one
+transaction. Other databases fall back to the batched upserts of the ingest
+tasks, one chunk at a time.
+"""
+import io
+import logging
+from datetime import datetime
+
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+
+from .profiles import rebuild_profiles
+from .cache import invalidate_eligibility
+from .tasks import _default_source, prepare_loan_frame, upsert_customers, upsert_loans
+from . import delta, sources
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_STAGING_COLUMNS = [
+    ('row_no', 'bigint'),
+    ('customer_id', 'integer'),
+    ('first_name', 'text'),
+    ('last_name', 'text'),
+    ('age', 'integer'),
+    ('phone_number', 'text'),
+    ('monthly_salary', 'numeric'),
+    ('approved_limit', 'numeric'),
+]
+LOAN_STAGING_COLUMNS = [
+    ('row_no', 'bigint'),
+    ('loan_id', 'integer'),
+    ('customer_id', 'integer'),
+    ('loan_amount', 'numeric'),
+    ('tenure', 'integer'),
+    ('interest_rate', 'numeric'),
+    ('monthly_repayment', 'numeric'),
+    ('emis_paid_on_time', 'integer'),
+    ('start_date', 'date'),
+    ('end_date', 'date'),
+    ('is_active', 'boolean'),
+]
+
+
+def _source_chunks(file_path, dataset, chunk_size):
+    return sources.iter_source(sources.cached_source(file_path, dataset), dataset, chunk_size=chunk_size)
+
+
+def fix_sequences(cursor):
+    """
+    Point the customer and loan ID sequences past the largest IDs in use.
+    Returns the next (customer_id, loan_id).
+    """
+    next_ids = []
+    for table, column in (('customers', 'customer_id'), ('loans', 'loan_id')):
+        cursor.execute(
+            f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), COALESCE(MAX({column}), 0) + 1, false) "
+            f"FROM {table}"
+        )
+        next_ids.append(cursor.fetchone()[0])
+    return tuple(next_ids)
+
+
+def _create_staging(cursor, name, columns):
+    definitions = ', '.join(f'{column} {sql_type}' for column, sql_type in columns)
+    cursor.execute(f'CREATE TEMPORARY TABLE {name} ({definitions}) ON COMMIT DROP')
+
+
+def _copy(cursor, name, columns, frame):
+    buffer = io.StringIO()
+    frame.to_csv(buffer, header=False, index=False)
+    buffer.seek(0)
+    column_list = ', '.join(column for column, _ in columns)
+    cursor.cursor.copy_expert(f'COPY {name} ({column_list}) FROM STDIN WITH (FORMAT csv)', buffer)
+
+
+def _customer_rows(df):
+    return pd.DataFrame({
+        'row_no': df.index,
+        'customer_id': df['Customer ID'].astype('int64'),
+        'first_name': df['First Name'].astype(str),
+        'last_name': df['Last Name'].astype(str),
+        'age': df['Age'].fillna(25).astype('int64') if 'Age' in df.columns else 25,
+        'phone_number': df['Phone Number'].astype(str),
+        'monthly_salary': df['Monthly Salary'].astype(str),
+        'approved_limit': df['Approved Limit'].astype(str),
+    })
+
+
+def _loan_rows(loans):
+    today = pd.Timestamp(datetime.now().date())
+    return pd.DataFrame({
+        'row_no': loans.index,
+        'loan_id': loans['Loan ID'].astype('int64'),
+        'customer_id': loans['Customer ID'].astype('int64'),
+        'loan_amount': loans['Loan Amount'].astype(str),
+        'tenure': loans['Tenure'].astype('int64'),
+        'interest_rate': loans['Interest Rate'].astype(str),
+        'monthly_repayment': loans['Monthly payment'].astype(str),
+        'emis_paid_on_time': loans['EMIs paid on Time'].astype('int64'),
+        'start_date': loans['Date of Approval'].dt.strftime('%Y-%m-%d'),
+        'end_date': loans['End Date'].dt.strftime('%Y-%m-%d'),
+        'is_active': loans['End Date'].dt.normalize() > today,
+    })
+
+
+def _merge(cursor, table, key, staging, columns, constants=None):
+    """
+    Upsert the staging rows into the table, the last row of the file winning for
+    each key. constants maps further columns to the SQL value they are written with.
+    Returns the number of rows inserted.
+    """
+    names = [column for column, _ in columns if column != 'row_no']
+    constants = {**(constants or {}), 'updated_at': 'now()'}
+    updates = ', '.join(f'{column} = EXCLUDED.{column}' for column in names + list(constants) if column != key)
+    cursor.execute(
+        f'WITH merged AS ('
+        f'INSERT INTO {table} ({", ".join(names + list(constants))}, created_at) '
+        f'SELECT DISTINCT ON ({key}) {", ".join(names + list(constants.values()))}, now() FROM {staging} '
+        f'ORDER BY {key}, row_no DESC '
+        f'ON CONFLICT ({key}) DO UPDATE SET {updates} '
+        f'RETURNING (xmax = 0) AS inserted'
+        f') SELECT COUNT(*) FILTER (WHERE inserted) FROM merged'
+    )
+    return cursor.fetchone()[0]
+
+
+def _copy_customers(cursor, file_path, chunk_size):
+    _create_staging(cursor, 'customer_staging', CUSTOMER_STAGING_COLUMNS)
+    total_rows = 0
+    for df in _source_chunks(file_path, delta.CUSTOMERS, chunk_size):
+        _copy(cursor, 'customer_staging', CUSTOMER_STAGING_COLUMNS, _customer_rows(df))
+        total_rows += len(df)
+
+    # current_debt is not in the file and is reset like the upsert path resets it
+    created = _merge(
+        cursor, 'customers', 'customer_id', 'customer_staging', CUSTOMER_STAGING_COLUMNS, {'current_debt': '0'}
+    )
+    return {
+        'status': 'success',
+        'customers_created': created,
+        'customers_updated': total_rows - created,
+        'total_processed': total_rows
+    }
+
+
+def _copy_loans(cursor, file_path, chunk_size):
+    """
+    Validate each chunk like the ingest task, COPY the valid rows and merge them.
+    Returns the result and the customers whose profiles changed.
+    """
+    _create_staging(cursor, 'loan_staging', LOAN_STAGING_COLUMNS)
+    total_rows = valid_rows = 0
+    rejects = []
+    for df in _source_chunks(file_path, delta.LOANS, chunk_size):
+        loans, chunk_rejects = prepare_loan_frame(df)
+        _copy(cursor, 'loan_staging', LOAN_STAGING_COLUMNS, _loan_rows(loans))
+        total_rows += len(df)
+        valid_rows += len(loans)
+        rejects += chunk_rejects
+
+    # Every customer named in the file plus the current owners of overwritten loans
+    cursor.execute(
+        'SELECT customer_id FROM loan_staging '
+        'UNION SELECT loans.customer_id FROM loans JOIN loan_staging USING (loan_id)'
+    )
+    affected_customers = sorted(row[0] for row in cursor.fetchall())
+    created = _merge(cursor, 'loans', 'loan_id', 'loan_staging', LOAN_STAGING_COLUMNS)
+    return {
+        'status': 'success',
+        'loans_created': created,
+        'loans_updated': valid_rows - created,
+        'loans_rejected': len(rejects),
+        'total_processed': total_rows,
+        'rejects': rejects
+    }, affected_customers
+
+
+def _copy_load(customer_file, loan_file, chunk_size):
+    with transaction.atomic(), connection.cursor() as cursor:
+        customer_result = _copy_customers(cursor, customer_file, chunk_size)
+        loan_result, affected_customers = _copy_loans(cursor, loan_file, chunk_size)
+        rebuild_profiles(affected_customers)
+        fix_sequences(cursor)
+        cursor.execute('SELECT DISTINCT customer_id FROM customer_staging')
+        changed_customers = {row[0] for row in cursor.fetchall()}.union(affected_customers)
+        transaction.on_commit(lambda: invalidate_eligibility(changed_customers))
+    return customer_result, loan_result
+
+
+def _batched_load(customer_file, loan_file, chunk_size):
+    customer_result = {'status': 'success', 'customers_created': 0, 'customers_updated': 0, 'total_processed': 0}
+    loan_result = {
+        'status': 'success', 'loans_created': 0, 'loans_updated': 0,
+        'loans_rejected': 0, 'total_processed': 0, 'rejects': []
+    }
+    with transaction.atomic():
+        for df in _source_chunks(customer_file, delta.CUSTOMERS, chunk_size):
+            created, updated = upsert_customers(df)
+            customer_result['customers_created'] += created
+            customer_result['customers_updated'] += updated
+            customer_result['total_processed'] += len(df)
+
+        for df in _source_chunks(loan_file, delta.LOANS, chunk_size):
+            loans, rejects = prepare_loan_frame(df)
+            created, updated = upsert_loans(loans)
+            loan_result['loans_created'] += created
+            loan_result['loans_updated'] += updated
+            loan_result['total_processed'] += len(df)
+            loan_result['rejects'] += rejects
+        loan_result['loans_rejected'] = len(loan_result['rejects'])
+    return customer_result, loan_result
+
+
+def copy_load(customer_file=None, loan_file=None, chunk_size=None):
+    """
+    Load both files in one transaction: with COPY and a staging table on PostgreSQL,
+    with the ingest tasks' batched upserts elsewhere.
+    Returns the same shape as ingest_all_data.
+    """
+    customer_file = customer_file or _default_source('customer_data.xlsx')
+    loan_file = loan_file or _default_source('loan_data.xlsx')
+    chunk_size = chunk_size or settings.INGEST_BATCH_SIZE * 20
+    if connection.vendor == 'postgresql':
+        customer_result, loan_result = _copy_load(customer_file, loan_file, chunk_size)
+    else:
+        customer_result, loan_result = _batched_load(customer_file, loan_file, chunk_size)
+    delta.forget(delta.CUSTOMERS)
+    delta.forget(delta.LOANS)
+
+    if loan_result['rejects']:
+        logger.warning(
+            'Skipped %d of %d loan rows from %s',
+            len(loan_result['rejects']), loan_result['total_processed'], loan_file
+        )
+    return {
+        'customer_ingestion': customer_result,
+        'loan_ingestion': loan_result
+    }
@@ -0,0 +1,97 @@
+"""
+Lean read path for the loan endpoints.
+
+compile_serializer turns a read-only serializer into the list of .values() columns
+it needs and a function that builds the serializer's output dict straight from one
+.values() row. The field converters are worked out once from the serializer's own
+fields, so the output is identical to serializer.data without DRF's per-object
+attribute lookup and field dispatch, and without instantiating model objects.
+"""
+import decimal
+from rest_framework import serializers
+from rest_framework.settings import api_settings
+
+from .serializers import LoanDetailSerializer, LoanListSerializer
+
+
+def _decimal_converter(field):
+    """
+    DecimalField.to_representation with the quantize context built once
+    """
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.decimal_places is None:
+        return field.to_representation
+
+    quantum = decimal.Decimal('.1') ** field.decimal_places
+    context = decimal.getcontext().copy()
+    if field.max_digits is not None:
+        context.prec = field.max_digits
+    rounding = field.rounding
+
+    def convert(value):
+        if not isinstance(value, decimal.Decimal):
+            value = decimal.Decimal(str(value).strip())
+        return '{:f}'.format(value.quantize(quantum, rounding=rounding, context=context))
+    return convert
+
+
+def _converter(field):
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.CharField:
+        return str
+    if type(field) is serializers.ReadOnlyField:
+        return None
+    return field.to_representation
+
+
+def compile_serializer(serializer, sources=None, prefix=''):
+    """
+    (columns, build) for a read-only serializer instance.
+    build(row) returns what serializer.data would for the object the .values(*columns)
+    row was read from. sources maps field sources that are not model columns, such as
+    properties, to the annotation providing them. Nested serializers become
+    related-field lookups (customer__first_name).
+    """
+    sources = sources or {}
+    columns = []
+    steps = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if '.' in field.source or field.source == '*':
+            raise ValueError(f'Field {field.field_name!r} has a source the fast path cannot read')
+
+        if isinstance(field, serializers.BaseSerializer):
+            nested_columns, nested_build = compile_serializer(field, sources, f'{prefix}{field.source}__')
+            columns.extend(nested_columns)
+            steps.append((field.field_name, None, nested_build))
+            continue
+
+        column = sources.get(f'{prefix}{field.source}', f'{prefix}{field.source}')
+        columns.append(column)
+        steps.append((field.field_name, column, _converter(field)))
+
+    def build(row):
+        data = {}
+        for name, column, convert in steps:
+            if column is None:
+                data[name] = convert(row)
+                continue
+            value = row[column]
+            if value is None or convert is None:
+                data[name] = value
+            else:
+                data[name] = convert(value)
+        return data
+
+    return columns, build
+
+
+# repayments_left is a Loan property; the pagination module annotates it as remaining_repayments
+LOAN_SOURCES = {'repayments_left': 'remaining_repayments'}
+
+LOAN_DETAIL_COLUMNS, build_loan_detail = compile_serializer(LoanDetailSerializer(), LOAN_SOURCES)
+LOAN_LIST_COLUMNS, build_loan_list_item = compile_serializer(LoanListSerializer(), LOAN_SOURCES)
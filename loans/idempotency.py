@@ -0,0 +1,200 @@
+"""
+Idempotency-Key support for POST endpoints.
+
+The first response for a key is stored in Redis and in the database, and requests
+that repeat the key get that response back without running the view again. A
+request that arrives while the first one is still running waits for its response
+instead of running the view a second time.
+"""
+import hashlib
+import json
+import time
+from datetime import timedelta
+from functools import wraps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .cache import cache_reachable, mark_cache_unavailable
+from .models import IdempotencyRecord
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+RESPONSE_KEY = 'idempotency:response:{scope}:{key}'
+LOCK_KEY = 'idempotency:lock:{scope}:{key}'
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def _request_hash(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def _cache_response(scope, key, stored, timeout):
+    if not cache_reachable():
+        return
+    try:
+        cache.set(RESPONSE_KEY.format(scope=scope, key=key), stored, timeout)
+    except Exception as e:
+        mark_cache_unavailable(e)
+
+
+def _load(scope, key):
+    """
+    Stored (request_hash, status_code, body) for the key, or None
+    """
+    if cache_reachable():
+        try:
+            stored = cache.get(RESPONSE_KEY.format(scope=scope, key=key))
+        except Exception as e:
+            mark_cache_unavailable(e)
+        else:
+            if stored is not None:
+                return stored
+
+    # Redis is down or evicted the entry
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_TTL)
+    record = IdempotencyRecord.objects.filter(
+        scope=scope, key=key, status_code__isnull=False, created_at__gte=cutoff
+    ).first()
+    if record is None:
+        return None
+    stored = (record.request_hash, record.status_code, record.response_body)
+    remaining = settings.IDEMPOTENCY_TTL - (timezone.now() - record.created_at).total_seconds()
+    _cache_response(scope, key, stored, max(1, int(remaining)))
+    return stored
+
+
+def _expired(now):
+    """
+    Records whose response is past IDEMPOTENCY_TTL, or whose request gave up its
+    claim without storing a response
+    """
+    return Q(created_at__lt=now - timedelta(seconds=settings.IDEMPOTENCY_TTL)) | Q(
+        status_code__isnull=True, created_at__lt=now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT)
+    )
+
+
+def purge_expired_records():
+    """
+    Delete every expired record in one statement. Returns the number deleted.
+    """
+    deleted, _ = IdempotencyRecord.objects.filter(_expired(timezone.now())).delete()
+    return deleted
+
+
+def _claim(scope, key, request_hash):
+    """
+    Take the key for this request. Returns False when another request holds it.
+    """
+    if cache_reachable():
+        try:
+            return cache.add(LOCK_KEY.format(scope=scope, key=key), request_hash, settings.IDEMPOTENCY_LOCK_TIMEOUT)
+        except Exception as e:
+            mark_cache_unavailable(e)
+
+    # Without Redis the unique record row is the lock; clear abandoned claims and expired responses first
+    IdempotencyRecord.objects.filter(scope=scope, key=key).filter(_expired(timezone.now())).delete()
+    try:
+        with transaction.atomic():
+            IdempotencyRecord.objects.create(scope=scope, key=key, request_hash=request_hash)
+    except IntegrityError:
+        return False
+    return True
+
+
+def _store(scope, key, request_hash, response):
+    IdempotencyRecord.objects.update_or_create(
+        scope=scope,
+        key=key,
+        defaults={
+            'request_hash': request_hash,
+            'status_code': response.status_code,
+            'response_body': response.data,
+            'created_at': timezone.now(),
+        }
+    )
+    # The lock is left to expire so a request that missed the stored response
+    # cannot claim the key again in the meantime
+    _cache_response(scope, key, (request_hash, response.status_code, response.data), settings.IDEMPOTENCY_TTL)
+
+
+def _release(scope, key):
+    if cache_reachable():
+        try:
+            cache.delete(LOCK_KEY.format(scope=scope, key=key))
+        except Exception as e:
+            mark_cache_unavailable(e)
+    IdempotencyRecord.objects.filter(scope=scope, key=key, status_code__isnull=True).delete()
+
+
+def _wait_for_response(scope, key):
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while True:
+        stored = _load(scope, key)
+        if stored is not None or time.monotonic() >= deadline:
+            return stored
+        time.sleep(POLL_INTERVAL)
+
+
+def _replay(stored, request_hash):
+    stored_hash, status_code, body = stored
+    if stored_hash != request_hash:
+        return Response(
+            {'error': f'{IDEMPOTENCY_HEADER} was already used with a different request body'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    response = Response(body, status=status_code)
+    response[REPLAYED_HEADER] = 'true'
+    return response
+
+
+def idempotent(scope):
+    """
+    Make a DRF view function honour the Idempotency-Key header.
+    Apply it below @api_view. Responses with a 5xx status, and requests that raise,
+    are not stored, so the client can retry them with the same key.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request.headers.get(IDEMPOTENCY_HEADER)
+            if not key:
+                return view(request, *args, **kwargs)
+            if len(key) > MAX_KEY_LENGTH:
+                return Response(
+                    {'error': f'{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            request_hash = _request_hash(request)
+            stored = _load(scope, key)
+            if stored is None:
+                if _claim(scope, key, request_hash):
+                    try:
+                        response = view(request, *args, **kwargs)
+                    except Exception:
+                        _release(scope, key)
+                        raise
+                    if response.status_code >= 500:
+                        _release(scope, key)
+                    else:
+                        _store(scope, key, request_hash, response)
+                    return response
+
+                stored = _wait_for_response(scope, key)
+                if stored is None:
+                    response = Response(
+                        {'error': f'A request with this {IDEMPOTENCY_HEADER} is still being processed'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                    response['Retry-After'] = '1'
+                    return response
+            return _replay(stored, request_hash)
+        return wrapper
+    return decorator
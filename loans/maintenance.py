@@ -0,0 +1,124 @@
+"""
+Nightly repair of loan state that drifts with the calendar.
+
+Loan.is_active is set at ingest and origination time only, and
+Customer.current_debt is only ever incremented. refresh_loan_state walks the
+customers in customer_id ranges of a fixed number of customers and, for each
+range, runs three set-based statements in one transaction:
+
+1. loans past their end date are marked inactive,
+2. current_debt is recomputed as the principal of the customer's active loans,
+3. the active totals of the credit profiles are recomputed.
+
+Only rows whose values change are written, and each write bumps updated_at so
+conditional GETs see the change. Nothing but the IDs of the customers that
+changed comes back to Python; their cached eligibility results are invalidated.
+"""
+import logging
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import Customer
+from .cache import invalidate_eligibility
+
+logger = logging.getLogger(__name__)
+
+EXPIRE_LOANS = """
+    UPDATE loans SET is_active = %(inactive)s, updated_at = %(now)s
+    WHERE customer_id >= %(low)s AND customer_id < %(high)s
+      AND is_active = %(active)s AND end_date <= %(today)s
+"""
+
+REFRESH_CURRENT_DEBT = """
+    UPDATE customers SET current_debt = totals.debt, updated_at = %(now)s
+    FROM (
+        SELECT customers.customer_id, COALESCE(SUM(loans.loan_amount), 0) AS debt
+        FROM customers
+        LEFT JOIN loans ON loans.customer_id = customers.customer_id AND loans.is_active = %(active)s
+        WHERE customers.customer_id >= %(low)s AND customers.customer_id < %(high)s
+        GROUP BY customers.customer_id
+    ) AS totals
+    WHERE customers.customer_id = totals.customer_id AND customers.current_debt <> totals.debt
+    RETURNING customers.customer_id
+"""
+
+REFRESH_PROFILE_TOTALS = """
+    UPDATE customer_credit_profiles
+    SET active_principal = totals.principal, active_emi_total = totals.emi, updated_at = %(now)s
+    FROM (
+        SELECT profiles.customer_id,
+               COALESCE(SUM(loans.loan_amount), 0) AS principal,
+               COALESCE(SUM(loans.monthly_repayment), 0) AS emi
+        FROM customer_credit_profiles AS profiles
+        LEFT JOIN loans ON loans.customer_id = profiles.customer_id AND loans.is_active = %(active)s
+        WHERE profiles.customer_id >= %(low)s AND profiles.customer_id < %(high)s
+        GROUP BY profiles.customer_id
+    ) AS totals
+    WHERE customer_credit_profiles.customer_id = totals.customer_id
+      AND (customer_credit_profiles.active_principal <> totals.principal
+           OR customer_credit_profiles.active_emi_total <> totals.emi)
+    RETURNING customer_credit_profiles.customer_id
+"""
+
+
+def _refresh_range(low, high, today):
+    params = {
+        'low': low,
+        'high': high,
+        'today': connection.ops.adapt_datefield_value(today),
+        'now': connection.ops.adapt_datetimefield_value(timezone.now()),
+        'active': True,
+        'inactive': False,
+    }
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(EXPIRE_LOANS, params)
+        expired_loans = cursor.rowcount
+        cursor.execute(REFRESH_CURRENT_DEBT, params)
+        debt_changed = {row[0] for row in cursor.fetchall()}
+        cursor.execute(REFRESH_PROFILE_TOTALS, params)
+        profiles_changed = {row[0] for row in cursor.fetchall()}
+        changed = debt_changed | profiles_changed
+        transaction.on_commit(lambda: invalidate_eligibility(changed))
+    return expired_loans, len(debt_changed), len(profiles_changed)
+
+
+def _batch_end(low, batch_size):
+    """
+    First customer_id of the batch after the one starting at low, or None at the end
+    """
+    return Customer.objects.filter(customer_id__gte=low).order_by('customer_id').values_list(
+        'customer_id', flat=True
+    )[batch_size:batch_size + 1].first()
+
+
+def refresh_loan_state(today=None, batch_size=None):
+    """
+    Expire finished loans and recompute current_debt and the profiles' active totals
+    for every customer, batch_size customers per transaction.
+    Returns the number of loans expired and of customers and profiles updated.
+    """
+    today = today or date.today()
+    batch_size = batch_size or settings.LOAN_STATE_BATCH_SIZE
+    bounds = Customer.objects.aggregate(low=Min('customer_id'), high=Max('customer_id'))
+    result = {'loans_expired': 0, 'customers_updated': 0, 'profiles_updated': 0}
+
+    low = bounds['low']
+    while low is not None:
+        high = _batch_end(low, batch_size)
+        expired_loans, customers_updated, profiles_updated = _refresh_range(
+            low, bounds['high'] + 1 if high is None else high, today
+        )
+        result['loans_expired'] += expired_loans
+        result['customers_updated'] += customers_updated
+        result['profiles_updated'] += profiles_updated
+        low = high
+
+    logger.info(
+        'Loan state refreshed: %(loans_expired)d loans expired, %(customers_updated)d customers '
+        'and %(profiles_updated)d profiles updated', result
+    )
+    return result
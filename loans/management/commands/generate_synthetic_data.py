@@ -0,0 +1,238 @@
+import os
+import time
+from datetime import date
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models, transaction
+from django.utils import timezone
+from openpyxl import Workbook
+
+from loans.models import Customer, Loan, CustomerCreditProfile
+from loans.synthetic import generate_batches, active_loans, credit_profiles
+
+FORMATS = ['db', 'xlsx', 'csv', 'parquet']
+# Data rows that fit on one worksheet below the header
+XLSX_MAX_ROWS = 1_048_575
+
+CUSTOMER_FIELDS = [
+    'customer_id', 'first_name', 'last_name', 'age', 'phone_number', 'monthly_salary',
+    'approved_limit', 'current_debt', 'created_at', 'updated_at',
+]
+LOAN_FIELDS = [
+    'loan_id', 'customer', 'loan_amount', 'tenure', 'interest_rate', 'monthly_repayment',
+    'emis_paid_on_time', 'start_date', 'end_date', 'is_active', 'created_at', 'updated_at',
+]
+PROFILE_FIELDS = [
+    'customer_id', 'loan_count', 'total_tenure', 'emis_paid_on_time', 'active_principal',
+    'active_emi_total', 'loans_per_year', 'updated_at',
+]
+
+
+class DatabaseWriter:
+    """
+    Inserts each chunk's customers, loans and credit profiles in one transaction.
+    The rows are new, so they skip the ingest task's upserts and go in as plain
+    multi-row INSERTs of values prepared column-wise.
+    """
+    def __init__(self, today=None):
+        self.today = today or date.today()
+
+    def _insert(self, model, fields, rows):
+        table = connection.ops.quote_name(model._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(model._meta.get_field(field).column) for field in fields)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                from psycopg2.extras import execute_values
+                execute_values(cursor.cursor, f'INSERT INTO {table} ({columns}) VALUES %s', rows, page_size=5000)
+            else:
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany(f'INSERT INTO {table} ({columns}) VALUES ({placeholders})', rows)
+
+    def write(self, customers, loans):
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        profiles = credit_profiles(customers, loans, self.today)
+        customer_count, loan_count = len(customers), len(loans)
+        with transaction.atomic():
+            self._insert(Customer, CUSTOMER_FIELDS, zip(
+                customers['Customer ID'].tolist(),
+                customers['First Name'].tolist(),
+                customers['Last Name'].tolist(),
+                customers['Age'].tolist(),
+                customers['Phone Number'].astype(str).tolist(),
+                customers['Monthly Salary'].tolist(),
+                customers['Approved Limit'].tolist(),
+                [0] * customer_count,
+                [now] * customer_count,
+                [now] * customer_count,
+            ))
+            self._insert(Loan, LOAN_FIELDS, zip(
+                loans['Loan ID'].tolist(),
+                loans['Customer ID'].tolist(),
+                loans['Loan Amount'].tolist(),
+                loans['Tenure'].tolist(),
+                loans['Interest Rate'].tolist(),
+                loans['Monthly payment'].tolist(),
+                loans['EMIs paid on Time'].tolist(),
+                np.datetime_as_string(loans['Date of Approval'].to_numpy(), unit='D').tolist(),
+                np.datetime_as_string(loans['End Date'].to_numpy(), unit='D').tolist(),
+                active_loans(loans, self.today).tolist(),
+                [now] * loan_count,
+                [now] * loan_count,
+            ))
+            self._insert(CustomerCreditProfile, PROFILE_FIELDS, zip(
+                *(profiles[field].tolist() for field in PROFILE_FIELDS[:-1]),
+                [now] * customer_count,
+            ))
+
+    def close(self):
+        if connection.vendor == 'postgresql':
+            # Rows were written with explicit IDs
+            call_command('fix_sequences')
+
+
+class CSVWriter:
+    def __init__(self, customer_path, loan_path):
+        self.paths = (customer_path, loan_path)
+        self.header = True
+
+    def write(self, customers, loans):
+        mode = 'w' if self.header else 'a'
+        for frame, path in zip((customers, loans), self.paths):
+            frame.to_csv(path, mode=mode, header=self.header, index=False, date_format='%Y-%m-%d')
+        self.header = False
+
+    def close(self):
+        pass
+
+
+class ExcelWriter:
+    """
+    Streams rows into write-only workbooks, which are kept on disk rather than in memory
+    """
+    def __init__(self, customer_path, loan_path):
+        self.paths = (customer_path, loan_path)
+        self.workbooks = []
+        for _ in self.paths:
+            workbook = Workbook(write_only=True)
+            workbook.create_sheet()
+            self.workbooks.append(workbook)
+        self.header = True
+
+    def write(self, customers, loans):
+        for frame, workbook in zip((customers, loans), self.workbooks):
+            sheet = workbook.worksheets[0]
+            if self.header:
+                sheet.append(list(frame.columns))
+            for row in frame.astype(object).itertuples(index=False, name=None):
+                sheet.append(row)
+        self.header = False
+
+    def close(self):
+        for workbook, path in zip(self.workbooks, self.paths):
+            workbook.save(path)
+
+
+class ParquetWriter:
+    def __init__(self, customer_path, loan_path):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise CommandError('Parquet output requires pyarrow (pip install pyarrow)')
+        self.pyarrow = pyarrow
+        self.paths = (customer_path, loan_path)
+        self.writers = [None, None]
+
+    def write(self, customers, loans):
+        for index, frame in enumerate((customers, loans)):
+            table = self.pyarrow.Table.from_pandas(frame, preserve_index=False)
+            if self.writers[index] is None:
+                self.writers[index] = self.pyarrow.parquet.ParquetWriter(self.paths[index], table.schema)
+            self.writers[index].write_table(table)
+
+    def close(self):
+        for writer in self.writers:
+            if writer is not None:
+                writer.close()
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic customers and loans into the database or into ingestable files'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--customers', type=int, required=True, help='Number of customers to generate')
+        parser.add_argument('--loans-per-customer', type=int, default=3, help='Loans generated for each customer')
+        parser.add_argument(
+            '--format', choices=FORMATS, default='db',
+            help='Write to the database (default), or to customer_data/loan_data files in --output-dir'
+        )
+        parser.add_argument('--output-dir', default='synthetic_data', help='Directory for file output')
+        parser.add_argument(
+            '--chunk-size', type=int, default=50000,
+            help='Customers generated and written per chunk; bounds memory use'
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Random seed; the same seed gives the same data')
+        parser.add_argument(
+            '--start-customer-id', type=int,
+            help='First Customer ID (default: after the largest existing ID for db, otherwise 1)'
+        )
+        parser.add_argument(
+            '--start-loan-id', type=int,
+            help='First Loan ID (default: after the largest existing ID for db, otherwise 1)'
+        )
+
+    def _first_ids(self, options):
+        first_customer_id, first_loan_id = options['start_customer_id'], options['start_loan_id']
+        if options['format'] == 'db':
+            if first_customer_id is None:
+                first_customer_id = (Customer.objects.aggregate(max_id=models.Max('customer_id'))['max_id'] or 0) + 1
+            if first_loan_id is None:
+                first_loan_id = (Loan.objects.aggregate(max_id=models.Max('loan_id'))['max_id'] or 0) + 1
+        return first_customer_id or 1, first_loan_id or 1
+
+    def _writer(self, options):
+        file_format = options['format']
+        if file_format == 'db':
+            return DatabaseWriter()
+
+        loan_rows = options['customers'] * options['loans_per_customer']
+        if file_format == 'xlsx' and max(options['customers'], loan_rows) > XLSX_MAX_ROWS:
+            raise CommandError(f'xlsx holds at most {XLSX_MAX_ROWS} rows per file; use csv or parquet')
+        os.makedirs(options['output_dir'], exist_ok=True)
+        paths = [os.path.join(options['output_dir'], f'{name}.{file_format}') for name in ('customer_data', 'loan_data')]
+        writer_class = {'xlsx': ExcelWriter, 'csv': CSVWriter, 'parquet': ParquetWriter}[file_format]
+        return writer_class(*paths)
+
+    def handle(self, *args, **options):
+        if options['customers'] < 1 or options['loans_per_customer'] < 0 or options['chunk_size'] < 1:
+            raise CommandError('--customers and --chunk-size must be positive and --loans-per-customer not negative')
+
+        writer = self._writer(options)
+        first_customer_id, first_loan_id = self._first_ids(options)
+        total_customers = options['customers']
+        customers_written = loans_written = 0
+        started = time.perf_counter()
+        for customers, loans in generate_batches(
+            total_customers,
+            options['loans_per_customer'],
+            options['chunk_size'],
+            seed=options['seed'],
+            first_customer_id=first_customer_id,
+            first_loan_id=first_loan_id,
+        ):
+            writer.write(customers, loans)
+            customers_written += len(customers)
+            loans_written += len(loans)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'  {customers_written}/{total_customers} customers, {loans_written} loans '
+                f'({loans_written / elapsed:,.0f} loans/s)'
+            )
+        writer.close()
+
+        target = 'the database' if options['format'] == 'db' else options['output_dir']
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated {customers_written} customers and {loans_written} loans into {target} '
+            f'in {time.perf_counter() - started:.1f}s'
+        ))
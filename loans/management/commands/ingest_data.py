@@ -1,15 +1,67 @@
-from django.core.management.base import BaseCommand
-from loans.tasks import ingest_all_data
+from django.core.management.base import BaseCommand, CommandError
+from loans.copy_load import copy_load
+from loans.tasks import ingest_all_data, ingest_all_data_parallel
 
 
 class Command(BaseCommand):
-    help = 'Ingest customer and loan data from Excel files'
+    help = 'Ingest customer and loan data from Excel or CSV files'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int,
+            help='Split each file into this many chunks and ingest them in parallel on Celery workers'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int,
+            help='Rows per parallel chunk (overrides --workers for chunk sizing)'
+        )
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Skip unchanged files and only write rows that changed since the last incremental run'
+        )
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Bulk load both files in one transaction with COPY on PostgreSQL (batched upserts elsewhere)'
+        )
+        parser.add_argument('--customer-file', help='Customer source (default: customer_data.xlsx)')
+        parser.add_argument('--loan-file', help='Loan source (default: loan_data.xlsx)')
 
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Starting data ingestion...'))
         
-        result = ingest_all_data()
+        parallel = options['workers'] or options['chunk_size']
+        if parallel and options['incremental']:
+            raise CommandError('--incremental cannot be combined with --workers/--chunk-size')
+        if options['copy'] and (parallel or options['incremental']):
+            raise CommandError('--copy cannot be combined with --workers/--chunk-size or --incremental')
+        
+        customer_file, loan_file = options['customer_file'], options['loan_file']
+        if options['copy']:
+            result = copy_load(customer_file, loan_file)
+        elif parallel:
+            result = ingest_all_data_parallel(
+                workers=options['workers'],
+                chunk_size=options['chunk_size'],
+                customer_file=customer_file,
+                loan_file=loan_file
+            )
+        else:
+            result = ingest_all_data(
+                incremental=options['incremental'],
+                customer_file=customer_file,
+                loan_file=loan_file
+            )
         
         self.stdout.write(self.style.SUCCESS('Data ingestion completed!'))
         self.stdout.write(f"Customer ingestion: {result['customer_ingestion']}")
-        self.stdout.write(f"Loan ingestion: {result['loan_ingestion']}")
\ No newline at end of file
+        
+        loan_result = dict(result['loan_ingestion'])
+        rejects = loan_result.pop('rejects', [])
+        self.stdout.write(f"Loan ingestion: {loan_result}")
+        for reject in rejects[:20]:
+            self.stdout.write(self.style.WARNING(
+                f"  Rejected row {reject['row']} (loan {reject['loan_id']}, "
+                f"customer {reject['customer_id']}): {reject['reason']}"
+            ))
+        if len(rejects) > 20:
+            self.stdout.write(self.style.WARNING(f"  ... and {len(rejects) - 20} more rejected rows"))
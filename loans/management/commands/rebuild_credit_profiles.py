@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from loans.profiles import rebuild_profiles
+
+
+class Command(BaseCommand):
+    help = 'Recompute customer credit profiles from the loans table to repair drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'customer_ids', nargs='*', type=int,
+            help='Only rebuild these customers (default: all customers)'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of customers recomputed per batch'
+        )
+
+    def handle(self, *args, **options):
+        customer_ids = options['customer_ids'] or None
+        rebuilt = rebuild_profiles(customer_ids, batch_size=options['batch_size'])
+        self.stdout.write(
+            self.style.SUCCESS(f'Rebuilt {rebuilt} credit profiles')
+        )
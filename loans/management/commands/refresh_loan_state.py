@@ -0,0 +1,26 @@
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from loans.maintenance import refresh_loan_state
+
+
+class Command(BaseCommand):
+    help = 'Expire finished loans and recompute current debt and credit profile totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int,
+            help='Customer IDs refreshed per transaction (default: LOAN_STATE_BATCH_SIZE)'
+        )
+        parser.add_argument(
+            '--date', type=date.fromisoformat,
+            help='Expire loans ending on or before this date, YYYY-MM-DD (default: today)'
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        result = refresh_loan_state(today=options['date'], batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Expired {result['loans_expired']} loans; updated {result['customers_updated']} customers "
+            f"and {result['profiles_updated']} credit profiles"
+        ))
@@ -0,0 +1,279 @@
+"""
+Per-request performance metrics: Server-Timing headers and /metrics.
+
+RequestMetricsMiddleware opens a RequestMetrics for each request in a context
+variable. While it is open, the execute wrapper installed on every database
+connection counts queries and SQL time, functions decorated with timed() in
+loans.utils add scoring time, rendering the response body adds serialization
+time and the eligibility cache records its hits and misses. Outside a request
+each hook costs one context variable lookup.
+
+When the response is ready the values are sent back in a Server-Timing header
+and added to the per-endpoint counters and latency histograms of this process,
+which /metrics serves in the Prometheus text format. Like the pool stats of the
+health check the counters are per process, so every worker has to be scraped.
+"""
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+# Phase recorded on a request -> histogram it is reported in
+HISTOGRAMS = {
+    'total': ('loans_request_duration_seconds', 'Time to produce the response'),
+    'db': ('loans_sql_duration_seconds', 'Time spent in SQL queries per request'),
+    'score': ('loans_scoring_duration_seconds', 'Time spent applying the eligibility rules per request'),
+    'serialize': ('loans_serialization_duration_seconds', 'Time spent rendering the response body per request'),
+}
+
+_current = ContextVar('request_metrics', default=None)
+
+_lock = threading.Lock()
+_requests = Counter()
+_queries = Counter()
+_cache_lookups = Counter()
+_histograms = {}
+
+
+class RequestMetrics:
+    """
+    Query count, phase timings and cache lookups of one request
+    """
+    __slots__ = ('started', 'queries', 'timings', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.timings = {}
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def add(self, phase, seconds):
+        self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+
+class _Histogram:
+    __slots__ = ('counts', 'total')
+
+    def __init__(self):
+        # One count per bucket plus +Inf, not cumulative
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.total += seconds
+
+
+def timed(phase):
+    """
+    Decorator adding the time spent in the function to a phase of the current request
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            metrics = _current.get()
+            if metrics is None:
+                return func(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                metrics.add(phase, time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def record_cache_lookup(hit):
+    metrics = _current.get()
+    if metrics is None:
+        return
+    if hit:
+        metrics.cache_hits += 1
+    else:
+        metrics.cache_misses += 1
+
+
+def _record_query(execute, sql, params, many, context):
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.add('db', time.perf_counter() - started)
+
+
+@receiver(connection_created)
+def _install_query_recorder(sender, connection, **kwargs):
+    # First in the list, so the push/pop of connection.execute_wrapper() leaves it alone
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _record_query)
+
+
+def record(endpoint, method, status_code, metrics, total):
+    """
+    Add a finished request to this process's counters and histograms
+    """
+    method = method if method in HTTP_METHODS else 'OTHER'
+    phases = {'total': total, 'db': metrics.timings.get('db', 0.0)}
+    phases.update((phase, seconds) for phase, seconds in metrics.timings.items() if phase in HISTOGRAMS)
+    with _lock:
+        _requests[endpoint, method, status_code] += 1
+        _queries[endpoint] += metrics.queries
+        if metrics.cache_hits:
+            _cache_lookups[endpoint, 'hit'] += metrics.cache_hits
+        if metrics.cache_misses:
+            _cache_lookups[endpoint, 'miss'] += metrics.cache_misses
+        for phase, seconds in phases.items():
+            histogram = _histograms.get((phase, endpoint))
+            if histogram is None:
+                histogram = _histograms[phase, endpoint] = _Histogram()
+            histogram.observe(seconds)
+
+
+def reset():
+    with _lock:
+        _requests.clear()
+        _queries.clear()
+        _cache_lookups.clear()
+        _histograms.clear()
+
+
+def server_timing(metrics, total):
+    """
+    Server-Timing header value for a request, durations in milliseconds
+    """
+    entries = [f'db;dur={metrics.timings.get("db", 0.0) * 1000:.3f};desc="{metrics.queries} queries"']
+    for phase in ('score', 'serialize'):
+        if phase in metrics.timings:
+            entries.append(f'{phase};dur={metrics.timings[phase] * 1000:.3f}')
+    if metrics.cache_hits or metrics.cache_misses:
+        entries.append(f'cache;desc="hits={metrics.cache_hits} misses={metrics.cache_misses}"')
+    entries.append(f'total;dur={total * 1000:.3f}')
+    return ', '.join(entries)
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in labels.items()) + '}'
+
+
+def render_metrics():
+    """
+    The counters and histograms of this process in the Prometheus text format
+    """
+    with _lock:
+        requests = sorted(_requests.items())
+        queries = sorted(_queries.items())
+        cache_lookups = sorted(_cache_lookups.items())
+        histograms = sorted((key, list(histogram.counts), histogram.total) for key, histogram in _histograms.items())
+
+    lines = [
+        '# HELP loans_requests_total Requests handled, by endpoint, method and status code',
+        '# TYPE loans_requests_total counter',
+    ]
+    lines += [
+        f'loans_requests_total{_labels(endpoint=endpoint, method=method, status=status_code)} {count}'
+        for (endpoint, method, status_code), count in requests
+    ]
+    lines += [
+        '# HELP loans_sql_queries_total SQL queries run while handling requests',
+        '# TYPE loans_sql_queries_total counter',
+    ]
+    lines += [f'loans_sql_queries_total{_labels(endpoint=endpoint)} {count}' for endpoint, count in queries]
+    lines += [
+        '# HELP loans_eligibility_cache_lookups_total Eligibility cache lookups, by result',
+        '# TYPE loans_eligibility_cache_lookups_total counter',
+    ]
+    lines += [
+        f'loans_eligibility_cache_lookups_total{_labels(endpoint=endpoint, result=result)} {count}'
+        for (endpoint, result), count in cache_lookups
+    ]
+
+    for phase, (name, description) in HISTOGRAMS.items():
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+        for (histogram_phase, endpoint), counts, total in histograms:
+            if histogram_phase != phase:
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(endpoint=endpoint, le=bound)} {cumulative}')
+            lines.append(f'{name}_sum{_labels(endpoint=endpoint)} {total}')
+            lines.append(f'{name}_count{_labels(endpoint=endpoint)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+class RequestMetricsMiddleware:
+    """
+    Measure each request, add a Server-Timing header and record it for /metrics.
+    Listed first in MIDDLEWARE so the total covers the other middleware too.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, metrics)
+
+    def process_template_response(self, request, response):
+        # REST framework responses are rendered after this, the last template response hook
+        metrics = _current.get()
+        if metrics is not None and not response.is_rendered:
+            started = time.perf_counter()
+
+            def rendered(content):
+                metrics.add('serialize', time.perf_counter() - started)
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def _finish(self, request, response, metrics):
+        total = time.perf_counter() - metrics.started
+        match = getattr(request, 'resolver_match', None)
+        endpoint = match.url_name if match is not None and match.url_name else 'unmatched'
+        record(endpoint, request.method, response.status_code, metrics, total)
+        if settings.SERVER_TIMING_ENABLED:
+            response['Server-Timing'] = server_timing(metrics, total)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0002_customer_credit_profile'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IngestFileState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(max_length=20, unique=True)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('row_count', models.IntegerField(default=0)),
+                ('ingested_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'ingest_file_states',
+            },
+        ),
+        migrations.CreateModel(
+            name='IngestRowState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(max_length=20)),
+                ('row_key', models.BigIntegerField()),
+                ('fingerprint', models.BigIntegerField()),
+            ],
+            options={
+                'db_table': 'ingest_row_states',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='ingestrowstate',
+            constraint=models.UniqueConstraint(fields=('dataset', 'row_key'), name='unique_ingest_row_state'),
+        ),
+    ]
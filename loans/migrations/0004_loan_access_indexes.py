@@ -0,0 +1,27 @@
+# Generated by Django 4.2.7 on 2026-10-18 00:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0003_ingest_state'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='loan',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='loans', to='loans.customer'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'is_active', 'loan_id'], include=('loan_amount', 'monthly_repayment'), name='loans_customer_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'start_date'], name='loans_customer_start_idx'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0005_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='loan',
+            name='loans_customer_active_idx',
+        ),
+        migrations.AddIndex(
+            model_name='loan',
+            index=models.Index(fields=['customer', 'is_active', 'loan_id'], include=('loan_amount', 'monthly_repayment', 'updated_at'), name='loans_customer_active_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:41
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0006_loan_list_index_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoanSchedule',
+            fields=[
+                ('loan', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='schedule', serialize=False, to='loans.loan')),
+                ('loan_amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('interest_rate', models.DecimalField(decimal_places=2, max_digits=5)),
+                ('tenure', models.IntegerField()),
+                ('emi', models.BigIntegerField(help_text='Monthly installment in paise')),
+                ('interest', models.BinaryField(help_text='Interest per month, int64 paise')),
+                ('principal', models.BinaryField(help_text='Principal repaid per month, int64 paise')),
+                ('balance', models.BinaryField(help_text='Outstanding balance after each month, int64 paise')),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'loan_schedules',
+            },
+        ),
+    ]
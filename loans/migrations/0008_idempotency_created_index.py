@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 01:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('loans', '0007_loan_schedule'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='idempotencyrecord',
+            index=models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ),
+    ]
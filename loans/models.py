@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
 
@@ -23,7 +25,8 @@ class Customer(models.Model):
 
 class Loan(models.Model):
     loan_id = models.AutoField(primary_key=True)
-    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loans')
+    # Indexed through the composite indexes below, which all lead with customer
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='loans', db_index=False)
     loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
     tenure = models.IntegerField(help_text="Loan tenure in months")
     interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
@@ -44,4 +47,141 @@ class Loan(models.Model):
         return max(0, self.tenure - self.emis_paid_on_time)
 
     class Meta:
-        db_table = 'loans'
\ No newline at end of file
+        db_table = 'loans'
+        indexes = [
+            # Active-loan sums and the per-customer loan list (keyset on loan_id);
+            # the included columns let PostgreSQL answer the sums and the list's
+            # MAX(updated_at) conditional GET probe from the index alone
+            models.Index(
+                fields=['customer', 'is_active', 'loan_id'],
+                include=['loan_amount', 'monthly_repayment', 'updated_at'],
+                name='loans_customer_active_idx'
+            ),
+            # Per-customer start date ranges (loans taken in a given year)
+            models.Index(fields=['customer', 'start_date'], name='loans_customer_start_idx'),
+        ]
+
+
+class CustomerCreditProfile(models.Model):
+    """
+    Running loan aggregates per customer, kept in step with the loans table
+    so eligibility checks never have to scan a customer's loan history
+    """
+    customer = models.OneToOneField(
+        Customer, on_delete=models.CASCADE, primary_key=True, related_name='credit_profile'
+    )
+    loan_count = models.IntegerField(default=0)
+    total_tenure = models.IntegerField(default=0, help_text="Sum of tenures (total EMIs) across all loans")
+    emis_paid_on_time = models.IntegerField(default=0)
+    active_principal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    active_emi_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    loans_per_year = models.JSONField(default=dict, help_text="Loan count keyed by start year")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Credit profile for customer {self.customer_id}"
+
+    def score_inputs(self, year):
+        """Score inputs in the shape returned by utils.get_credit_score_inputs"""
+        return {
+            'loan_count': self.loan_count,
+            'total_emis': self.total_tenure,
+            'emis_paid_on_time': self.emis_paid_on_time,
+            'current_year_loans': self.loans_per_year.get(str(year), 0),
+            'active_principal': self.active_principal,
+            'active_emis': self.active_emi_total,
+        }
+
+    def add_loan(self, loan):
+        """Fold a single loan into the running aggregates"""
+        self.loan_count += 1
+        self.total_tenure += loan.tenure
+        self.emis_paid_on_time += loan.emis_paid_on_time
+        if loan.is_active:
+            self.active_principal += Decimal(loan.loan_amount)
+            self.active_emi_total += Decimal(loan.monthly_repayment)
+        year = str(loan.start_date.year)
+        self.loans_per_year[year] = self.loans_per_year.get(year, 0) + 1
+
+    class Meta:
+        db_table = 'customer_credit_profiles'
+
+
+class LoanSchedule(models.Model):
+    """
+    Amortization schedule of a loan, stored the first time it is requested.
+    The monthly amounts are packed into little-endian int64 arrays of paise, one
+    row per loan. The loan terms it was computed from are kept to detect staleness.
+    """
+    loan = models.OneToOneField(Loan, on_delete=models.CASCADE, primary_key=True, related_name='schedule')
+    loan_amount = models.DecimalField(max_digits=12, decimal_places=2)
+    interest_rate = models.DecimalField(max_digits=5, decimal_places=2)
+    tenure = models.IntegerField()
+    emi = models.BigIntegerField(help_text="Monthly installment in paise")
+    interest = models.BinaryField(help_text="Interest per month, int64 paise")
+    principal = models.BinaryField(help_text="Principal repaid per month, int64 paise")
+    balance = models.BinaryField(help_text="Outstanding balance after each month, int64 paise")
+    computed_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Schedule for loan {self.loan_id}"
+
+    class Meta:
+        db_table = 'loan_schedules'
+
+
+class IngestFileState(models.Model):
+    """
+    Content hash of the source file last ingested for each dataset
+    """
+    dataset = models.CharField(max_length=20, unique=True)
+    content_hash = models.CharField(max_length=64)
+    row_count = models.IntegerField(default=0)
+    ingested_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.dataset} ({self.content_hash[:12]})"
+
+    class Meta:
+        db_table = 'ingest_file_states'
+
+
+class IngestRowState(models.Model):
+    """
+    Fingerprint of each source row last written by an incremental ingest,
+    keyed by dataset and the row's Customer ID / Loan ID
+    """
+    dataset = models.CharField(max_length=20)
+    row_key = models.BigIntegerField()
+    fingerprint = models.BigIntegerField()
+
+    class Meta:
+        db_table = 'ingest_row_states'
+        constraints = [
+            models.UniqueConstraint(fields=['dataset', 'row_key'], name='unique_ingest_row_state'),
+        ]
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Response stored for an Idempotency-Key, the durable copy of the Redis entry
+    """
+    scope = models.CharField(max_length=50, help_text="Endpoint the key was used with")
+    key = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True, help_text="Null while the first request is still running")
+    response_body = models.JSONField(null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.scope} {self.key}"
+
+    class Meta:
+        db_table = 'idempotency_records'
+        constraints = [
+            models.UniqueConstraint(fields=['scope', 'key'], name='unique_idempotency_key'),
+        ]
+        indexes = [
+            # For the nightly purge of expired records
+            models.Index(fields=['created_at'], name='idempotency_created_idx'),
+        ]
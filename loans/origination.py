@@ -0,0 +1,60 @@
+from datetime import date, timedelta
+from django.db import transaction
+from django.db.models import F
+
+from .models import Customer, Loan, CustomerCreditProfile
+from .utils import evaluate_loan_eligibility
+from .profiles import build_profile, record_loan
+from .cache import invalidate_eligibility
+
+
+def _lock_customer(customer_id):
+    """
+    Load and row-lock a customer together with their credit profile.
+    Originations for the same customer queue up here, so each one is scored
+    against the loans committed by the one before it.
+    """
+    try:
+        profile = CustomerCreditProfile.objects.select_for_update().select_related('customer').get(
+            customer_id=customer_id
+        )
+        return profile.customer
+    except CustomerCreditProfile.DoesNotExist:
+        pass
+
+    customer = Customer.objects.select_for_update().get(customer_id=customer_id)
+    build_profile(customer)
+    return customer
+
+
+def originate_loan(customer_id, loan_amount, interest_rate, tenure):
+    """
+    Score and, if approved, create a loan in one transaction.
+    Returns (eligibility_result, loan); loan is None when the application is rejected.
+    Raises Customer.DoesNotExist for unknown customers.
+    """
+    with transaction.atomic():
+        customer = _lock_customer(customer_id)
+        eligibility_result = evaluate_loan_eligibility(customer, loan_amount, interest_rate, tenure)
+        if not eligibility_result['approval']:
+            return eligibility_result, None
+
+        start_date = date.today()
+        end_date = start_date + timedelta(days=tenure * 30)  # Approximate
+        loan = Loan.objects.create(
+            customer=customer,
+            loan_amount=loan_amount,
+            tenure=tenure,
+            interest_rate=eligibility_result['corrected_interest_rate'],
+            monthly_repayment=eligibility_result['monthly_installment'],
+            start_date=start_date,
+            end_date=end_date
+        )
+        record_loan(loan, customer.credit_profile)
+
+        # Increment in the database rather than writing back the value read above
+        customer.current_debt = F('current_debt') + loan_amount
+        customer.save(update_fields=['current_debt', 'updated_at'])
+
+        transaction.on_commit(lambda: invalidate_eligibility([customer_id]))
+    return eligibility_result, loan
@@ -0,0 +1,140 @@
+"""
+Keyset (cursor) pagination for a customer's loan list.
+
+Pages are ordered by one sort column with loan_id as the tie-breaker, and the
+cursor carries the sort value and loan_id of the last row served, so every page
+is a range scan that starts where the previous one ended instead of an OFFSET.
+"""
+import base64
+import binascii
+import json
+from decimal import Decimal, InvalidOperation
+from django.db.models import F, Q, Value
+from django.db.models.functions import Greatest
+
+# Sortable fields as exposed in the API, mapped to the queryset column
+SORT_FIELDS = {
+    'loan_id': 'loan_id',
+    'loan_amount': 'loan_amount',
+    'interest_rate': 'interest_rate',
+    'repayments_left': 'remaining_repayments',
+}
+DECIMAL_SORT_FIELDS = {'loan_amount', 'interest_rate'}
+ORDERINGS = list(SORT_FIELDS) + [f'-{field}' for field in SORT_FIELDS]
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(ordering, value, loan_id):
+    payload = json.dumps([ordering, value, loan_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    (ordering, value, loan_id) from a cursor; raises InvalidCursor
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        ordering, value, loan_id = json.loads(payload)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if ordering not in ORDERINGS or not isinstance(loan_id, int) or not isinstance(value, str):
+        raise InvalidCursor('Invalid cursor')
+    parse = Decimal if ordering.lstrip('-') in DECIMAL_SORT_FIELDS else int
+    try:
+        value = parse(value)
+    except (InvalidOperation, ValueError):
+        raise InvalidCursor('Invalid cursor')
+    return ordering, value, loan_id
+
+
+def with_remaining_repayments(queryset):
+    """
+    Annotate repayments_left (Loan.repayments_left) as a database expression
+    so it can be filtered and sorted on
+    """
+    return queryset.annotate(
+        remaining_repayments=Greatest(F('tenure') - F('emis_paid_on_time'), Value(0))
+    )
+
+
+def filter_loans(queryset, params):
+    """
+    Apply the min_/max_ filters from validated LoanListQuerySerializer data
+    """
+    bounds = {
+        'min_amount': 'loan_amount__gte',
+        'max_amount': 'loan_amount__lte',
+        'min_rate': 'interest_rate__gte',
+        'max_rate': 'interest_rate__lte',
+        'min_repayments_left': 'remaining_repayments__gte',
+        'max_repayments_left': 'remaining_repayments__lte',
+    }
+    lookups = {lookup: params[name] for name, lookup in bounds.items() if params.get(name) is not None}
+    return queryset.filter(**lookups)
+
+
+def page_queryset(queryset, params, columns):
+    """
+    Filtered, ordered .values(*columns) queryset for the requested page, with one
+    extra row fetched to tell whether there is a next page
+    """
+    ordering = params['ordering']
+    descending = ordering.startswith('-')
+    column = SORT_FIELDS[ordering.lstrip('-')]
+    direction = 'lt' if descending else 'gt'
+    sign = '-' if descending else ''
+
+    queryset = filter_loans(with_remaining_repayments(queryset), params)
+    after = params.get('after')
+    if after is not None:
+        value, loan_id = after
+        if column == 'loan_id':
+            queryset = queryset.filter(**{f'loan_id__{direction}': loan_id})
+        else:
+            queryset = queryset.filter(
+                Q(**{f'{column}__{direction}': value}) | Q(**{column: value, f'loan_id__{direction}': loan_id})
+            )
+
+    if column == 'loan_id':
+        queryset = queryset.order_by(f'{sign}loan_id')
+    else:
+        queryset = queryset.order_by(f'{sign}{column}', f'{sign}loan_id')
+    # The cursor is built from the sort column and loan_id of the last row
+    columns = list(columns) + [name for name in (column, 'loan_id') if name not in columns]
+    return queryset.values(*columns)[:params['page_size'] + 1]
+
+
+def split_page(rows, params):
+    """
+    (rows of this page, cursor for the next page or None) from the rows fetched by page_queryset
+    """
+    rows = list(rows)
+    page_size = params['page_size']
+    if len(rows) <= page_size:
+        return rows, None
+
+    rows = rows[:page_size]
+    last = rows[-1]
+    ordering = params['ordering']
+    value = last[SORT_FIELDS[ordering.lstrip('-')]]
+    cursor = encode_cursor(ordering, str(value), last['loan_id'])
+    return rows, cursor
+
+
+def next_page_headers(request, cursor):
+    """
+    Link and X-Next-Cursor headers pointing at the next page
+    """
+    if cursor is None:
+        return {}
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    url = request.build_absolute_uri(f'{request.path}?{query.urlencode()}')
+    return {
+        'Link': f'<{url}>; rel="next"',
+        'X-Next-Cursor': cursor,
+    }
@@ -0,0 +1,105 @@
+"""
+Process-wide connection pools.
+
+Every Redis user in a process (the Django cache behind the eligibility cache and
+Idempotency-Key support, the health check, and Celery tasks through the cache)
+borrows connections from one BlockingConnectionPool per Redis URL instead of
+opening its own. Database connections are kept open between requests through
+CONN_MAX_AGE (DB_CONN_MAX_AGE); connections_opened counts how often a new one
+still had to be made.
+"""
+import threading
+from collections import Counter
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+import redis
+
+_redis_pools = {}
+_redis_pools_lock = threading.Lock()
+_connections_opened = Counter()
+
+
+def redis_pool(url=None):
+    """
+    The shared connection pool for a Redis URL (REDIS_URL by default)
+    """
+    url = url or settings.REDIS_URL
+    pool = _redis_pools.get(url)
+    if pool is None:
+        with _redis_pools_lock:
+            pool = _redis_pools.get(url)
+            if pool is None:
+                pool = redis.BlockingConnectionPool.from_url(
+                    url,
+                    max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                    timeout=settings.REDIS_POOL_TIMEOUT,
+                    health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+                    socket_connect_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                    socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+                )
+                _redis_pools[url] = pool
+    return pool
+
+
+def redis_client(url=None):
+    """
+    Redis client on the shared pool for the URL
+    """
+    return redis.Redis(connection_pool=redis_pool(url))
+
+
+class SharedConnectionPool:
+    """
+    pool_class for django.core.cache.backends.redis.RedisCache.
+    The cache backend builds a pool per thread; this hands every thread the shared
+    pool for the cache URL instead.
+    """
+    @staticmethod
+    def from_url(url, parser_class=None, **options):
+        # parser_class is always passed by RedisCache and defaults to redis-py's own parser
+        if options:
+            raise ImproperlyConfigured(
+                'Connection options of the shared Redis pool are set through the REDIS_* settings, '
+                f'not CACHES OPTIONS: {", ".join(sorted(options))}'
+            )
+        return redis_pool(url)
+
+
+@receiver(connection_created)
+def _count_connection(sender, connection, **kwargs):
+    _connections_opened[connection.alias] += 1
+
+
+def _redis_pool_stats(pool):
+    kwargs = pool.connection_kwargs
+    created = len(pool._connections)
+    idle = sum(1 for connection in list(pool.pool.queue) if connection is not None)
+    return {
+        'server': f"{kwargs.get('host', kwargs.get('path'))}:{kwargs.get('port', '')}/{kwargs.get('db', 0)}",
+        'max_connections': pool.max_connections,
+        'created': created,
+        'in_use': created - idle,
+        'idle': idle,
+    }
+
+
+def pool_stats():
+    """
+    Usage of this process's Redis pools and database connections
+    """
+    with _redis_pools_lock:
+        pools = list(_redis_pools.values())
+    return {
+        'redis': [_redis_pool_stats(pool) for pool in pools],
+        'database': {
+            alias: {
+                'conn_max_age': connections[alias].settings_dict['CONN_MAX_AGE'],
+                'health_checks': connections[alias].settings_dict['CONN_HEALTH_CHECKS'],
+                'connections_opened': _connections_opened[alias],
+            }
+            for alias in connections
+        },
+    }
@@ -0,0 +1,122 @@
+from decimal import Decimal
+from django.db.models import Count, Sum, Q
+from django.db.models.functions import ExtractYear
+
+from .models import Customer, Loan, CustomerCreditProfile
+
+
+PROFILE_UPDATE_FIELDS = [
+    'loan_count',
+    'total_tenure',
+    'emis_paid_on_time',
+    'active_principal',
+    'active_emi_total',
+    'loans_per_year',
+    'updated_at',
+]
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _rebuild_chunk(customer_ids, overwrite=True):
+    """
+    Recompute the profiles of a bounded set of customers with two GROUP BY queries.
+    With overwrite=False existing profile rows are left as they are.
+    """
+    loans = Loan.objects.filter(customer_id__in=customer_ids).order_by()
+    totals = {
+        row['customer_id']: row
+        for row in loans.values('customer_id').annotate(
+            loan_count=Count('loan_id'),
+            total_tenure=Sum('tenure'),
+            emis_paid_on_time=Sum('emis_paid_on_time'),
+            active_principal=Sum('loan_amount', filter=Q(is_active=True)),
+            active_emi_total=Sum('monthly_repayment', filter=Q(is_active=True)),
+        )
+    }
+    loans_per_year = {}
+    for row in loans.annotate(year=ExtractYear('start_date')).values('customer_id', 'year').annotate(
+        count=Count('loan_id')
+    ):
+        loans_per_year.setdefault(row['customer_id'], {})[str(row['year'])] = row['count']
+
+    profiles = []
+    for customer_id in customer_ids:
+        row = totals.get(customer_id, {})
+        profiles.append(CustomerCreditProfile(
+            customer_id=customer_id,
+            loan_count=row.get('loan_count') or 0,
+            total_tenure=row.get('total_tenure') or 0,
+            emis_paid_on_time=row.get('emis_paid_on_time') or 0,
+            active_principal=row.get('active_principal') or Decimal('0'),
+            active_emi_total=row.get('active_emi_total') or Decimal('0'),
+            loans_per_year=loans_per_year.get(customer_id, {}),
+        ))
+
+    if overwrite:
+        CustomerCreditProfile.objects.bulk_create(
+            profiles,
+            update_conflicts=True,
+            unique_fields=['customer'],
+            update_fields=PROFILE_UPDATE_FIELDS,
+        )
+    else:
+        CustomerCreditProfile.objects.bulk_create(profiles, ignore_conflicts=True)
+    return profiles
+
+
+def rebuild_profiles(customer_ids=None, batch_size=1000):
+    """
+    Recompute credit profiles from the loans table.
+    Rebuilds every customer when customer_ids is None. Returns the number of profiles written.
+    """
+    if customer_ids is None:
+        customer_ids = Customer.objects.order_by('customer_id').values_list('customer_id', flat=True)
+
+    rebuilt = 0
+    for chunk in _chunks(customer_ids, batch_size):
+        rebuilt += len(_rebuild_chunk(chunk))
+    return rebuilt
+
+
+def build_profiles(customers, batch_size=1000):
+    """
+    Create and attach profiles for customers that do not have one yet.
+    This runs on read paths without the customer lock that loan origination takes,
+    so a profile row written in the meantime, which may already include a loan this
+    build's totals miss, is never overwritten.
+    """
+    by_id = {customer.pk: customer for customer in customers}
+    for chunk in _chunks(by_id, batch_size):
+        for profile in _rebuild_chunk(chunk, overwrite=False):
+            by_id[profile.customer_id].credit_profile = profile
+
+
+def build_profile(customer):
+    """
+    Create the profile of a customer that does not have one yet
+    """
+    build_profiles([customer])
+    return customer.credit_profile
+
+
+def record_loan(loan, profile=None):
+    """
+    Fold a newly inserted loan into its customer's profile.
+    Must run inside the transaction that inserted the loan; pass the profile
+    when the caller already holds a lock on it.
+    """
+    if profile is None:
+        try:
+            profile = CustomerCreditProfile.objects.select_for_update().get(customer_id=loan.customer_id)
+        except CustomerCreditProfile.DoesNotExist:
+            # The rebuild reads the loans table, which already contains this loan
+            _rebuild_chunk([loan.customer_id])
+            return
+
+    profile.add_loan(loan)
+    profile.save(update_fields=PROFILE_UPDATE_FIELDS)
@@ -0,0 +1,92 @@
+"""
+orjson-backed JSON renderer and parser for REST framework.
+
+Enabled with FAST_JSON_ENABLED. orjson is an optional dependency
+(pip install orjson); the renderer and parser raise ImproperlyConfigured when it
+is missing. Output matches rest_framework.renderers.JSONRenderer byte for byte,
+except that Decimal values reaching the renderer unformatted are written as exact
+strings (the way serializer DecimalFields already present them) instead of being
+converted to floats.
+"""
+import decimal
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Dates and times go through DRF's encoder so they are formatted exactly as before
+ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME if orjson is not None else 0
+
+_drf_encoder = JSONEncoder()
+
+
+def _default(obj):
+    if isinstance(obj, decimal.Decimal):
+        return '{:f}'.format(obj)
+    return _drf_encoder.default(obj)
+
+
+def _require_orjson():
+    if orjson is None:
+        raise ImproperlyConfigured('FAST_JSON_ENABLED requires the orjson package')
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson.
+    Indented output, non-compact or ASCII-only settings, and data orjson cannot
+    encode (such as non-string keys) fall back to the stock renderer.
+    """
+    def __init__(self):
+        _require_orjson()
+        super().__init__()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=_default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping of U+2028 / U+2029 as JSONRenderer, so the output stays a JavaScript subset
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """
+    JSONParser that decodes with orjson
+    """
+    renderer_class = ORJSONRenderer
+
+    def __init__(self):
+        _require_orjson()
+        super().__init__()
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if not self.strict or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            # orjson rejects NaN and Infinity, as JSONParser does in strict mode
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
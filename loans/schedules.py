@@ -0,0 +1,120 @@
+"""
+Amortization schedules for /loan-schedule/<loan_id>/.
+
+A loan's schedule is computed with emi.amortization_schedules the first time it
+is requested and stored as its LoanSchedule row. Later reads fetch the loan and
+its stored schedule in one query. The row keeps the loan amount, rate and tenure
+it was computed from: a loan whose terms have changed since (an ingest or an
+edit) gets its schedule recomputed and replaced on the next read, and deleting
+a loan deletes its schedule.
+
+The response's monthly_installment is the loan's recorded monthly_repayment, the
+figure /view-loan/ shows. The installments of the schedule are the amortization of
+the loan's terms and can differ from it by a few paise for loans whose EMI came
+from an ingested file rather than from /create-loan/.
+
+Reads that find no current schedule write one. Concurrent first reads of a loan
+each compute the same schedule, and the upsert keeps whichever lands last.
+"""
+import numpy as np
+
+from .emi import add_months, amortization_schedules
+from .models import Loan, LoanSchedule
+
+PACKED_DTYPE = np.dtype('<i8')
+TERMS = ['loan_amount', 'interest_rate', 'tenure']
+SCHEDULE_UPDATE_FIELDS = TERMS + ['emi', 'interest', 'principal', 'balance', 'computed_at']
+
+
+def pack(values):
+    return np.ascontiguousarray(values, dtype=PACKED_DTYPE).tobytes()
+
+
+def unpack(data):
+    return np.frombuffer(data, dtype=PACKED_DTYPE)
+
+
+def compute_schedule(loan_id, loan_amount, interest_rate, tenure):
+    """
+    Unsaved LoanSchedule for a loan's terms
+    """
+    schedules = amortization_schedules([loan_amount], [interest_rate], [tenure])
+    return LoanSchedule(
+        loan_id=loan_id,
+        loan_amount=loan_amount,
+        interest_rate=interest_rate,
+        tenure=tenure,
+        emi=int(schedules.emi[0]),
+        interest=pack(schedules.interest[0, :tenure]),
+        principal=pack(schedules.principal[0, :tenure]),
+        balance=pack(schedules.balance[0, :tenure]),
+    )
+
+
+def _rupees(paise):
+    return f'{paise // 100}.{paise % 100:02d}'
+
+
+def _schedule_response(loan, interest, principal, balance):
+    due_dates = add_months(
+        np.full(len(interest), np.datetime64(loan['start_date'], 'D')), np.arange(1, len(interest) + 1)
+    )
+    return {
+        'loan_id': loan['loan_id'],
+        'loan_amount': f"{loan['loan_amount']:.2f}",
+        'interest_rate': f"{loan['interest_rate']:.2f}",
+        'tenure': loan['tenure'],
+        'monthly_installment': f"{loan['monthly_repayment']:.2f}",
+        'total_interest': _rupees(int(interest.sum())),
+        'emis_paid_on_time': loan['emis_paid_on_time'],
+        'schedule': [
+            {
+                'installment': number,
+                'due_date': due_date,
+                'emi': _rupees(principal_part + interest_part),
+                'principal': _rupees(principal_part),
+                'interest': _rupees(interest_part),
+                'balance': _rupees(remaining),
+            }
+            for number, due_date, principal_part, interest_part, remaining in zip(
+                range(1, len(interest) + 1),
+                np.datetime_as_string(due_dates, unit='D').tolist(),
+                principal.tolist(),
+                interest.tolist(),
+                balance.tolist(),
+            )
+        ],
+    }
+
+
+def get_schedule(loan_id):
+    """
+    Response data for /loan-schedule/<loan_id>/, or None when the loan does not exist.
+    Serves the stored schedule while it matches the loan's terms, otherwise computes
+    and stores it first.
+    """
+    loan = Loan.objects.filter(loan_id=loan_id).values(
+        'loan_id', 'start_date', 'emis_paid_on_time', 'monthly_repayment', *TERMS,
+        *(f'schedule__{field}' for field in TERMS + ['interest', 'principal', 'balance']),
+    ).first()
+    if loan is None:
+        return None
+
+    if all(loan[f'schedule__{field}'] == loan[field] for field in TERMS):
+        return _schedule_response(
+            loan,
+            unpack(loan['schedule__interest']),
+            unpack(loan['schedule__principal']),
+            unpack(loan['schedule__balance']),
+        )
+
+    schedule = compute_schedule(loan_id, *(loan[field] for field in TERMS))
+    LoanSchedule.objects.bulk_create(
+        [schedule],
+        update_conflicts=True,
+        unique_fields=['loan'],
+        update_fields=SCHEDULE_UPDATE_FIELDS,
+    )
+    return _schedule_response(
+        loan, unpack(schedule.interest), unpack(schedule.principal), unpack(schedule.balance)
+    )
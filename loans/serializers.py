@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Customer, Loan
+from .pagination import ORDERINGS, InvalidCursor, decode_cursor
 
 
 class CustomerRegistrationSerializer(serializers.ModelSerializer):
@@ -85,4 +87,35 @@ class LoanListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Loan
-        fields = ['loan_id', 'loan_amount', 'interest_rate', 'monthly_repayment', 'repayments_left']
\ No newline at end of file
+        fields = ['loan_id', 'loan_amount', 'interest_rate', 'monthly_repayment', 'repayments_left']
+
+
+class LoanListQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of /view-loans/<customer_id>/
+    """
+    cursor = serializers.CharField(required=False)
+    page_size = serializers.IntegerField(required=False, min_value=1)
+    ordering = serializers.ChoiceField(choices=ORDERINGS, default='loan_id')
+    min_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    max_amount = serializers.DecimalField(max_digits=12, decimal_places=2, required=False)
+    min_rate = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    max_rate = serializers.DecimalField(max_digits=5, decimal_places=2, required=False)
+    min_repayments_left = serializers.IntegerField(required=False, min_value=0)
+    max_repayments_left = serializers.IntegerField(required=False, min_value=0)
+
+    def validate(self, attrs):
+        cursor = attrs.pop('cursor', None)
+        if cursor:
+            try:
+                ordering, value, loan_id = decode_cursor(cursor)
+            except InvalidCursor as e:
+                raise serializers.ValidationError({'cursor': [str(e)]})
+            if ordering != attrs['ordering']:
+                raise serializers.ValidationError({'cursor': ['Cursor was issued for a different ordering']})
+            attrs['after'] = (value, loan_id)
+        # Oversized pages are capped rather than rejected
+        attrs['page_size'] = min(
+            attrs.get('page_size', settings.VIEW_LOANS_PAGE_SIZE), settings.VIEW_LOANS_MAX_PAGE_SIZE
+        )
+        return attrs
@@ -0,0 +1,245 @@
+"""
+Source files for the ingest tasks: xlsx, CSV and Parquet.
+
+Only the columns the ingest uses are read, and every format produces the same
+dtypes, so the upserts and the incremental fingerprints do not depend on the
+format. Workbooks are streamed read-only and CSV and Parquet are read in chunks.
+When pyarrow is installed, an xlsx source is converted to Parquet on first use
+and later reads use the converted copy until the workbook's size or mtime changes.
+"""
+import glob
+import hashlib
+import logging
+import os
+
+import pandas as pd
+from django.conf import settings
+from openpyxl import load_workbook
+
+from .delta import CUSTOMERS, LOANS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # optional dependency
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+# Columns the ingest reads from each source, with the dtype every format is read into
+SOURCE_COLUMNS = {
+    CUSTOMERS: {
+        'Customer ID': 'Int64',
+        'First Name': 'object',
+        'Last Name': 'object',
+        'Age': 'Int64',
+        'Phone Number': 'Int64',
+        'Monthly Salary': 'float64',
+        'Approved Limit': 'float64',
+    },
+    LOANS: {
+        'Customer ID': 'Int64',
+        'Loan ID': 'Int64',
+        'Loan Amount': 'float64',
+        'Tenure': 'Int64',
+        'Interest Rate': 'float64',
+        'Monthly payment': 'float64',
+        'EMIs paid on Time': 'Int64',
+        'Date of Approval': 'datetime64[ns]',
+        'End Date': 'datetime64[ns]',
+    },
+}
+
+FORMATS = {'.xlsx': 'xlsx', '.csv': 'csv', '.parquet': 'parquet'}
+READ_CHUNK_SIZE = 100000
+
+
+def source_format(file_path):
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in FORMATS:
+        raise ValueError(f'Unsupported source format {extension!r}; use xlsx, csv or parquet')
+    if FORMATS[extension] == 'parquet' and pyarrow is None:
+        raise ValueError('Parquet sources require pyarrow (pip install pyarrow)')
+    return FORMATS[extension]
+
+
+def _typed(df, columns):
+    """
+    Cast the known columns to their dtypes. Values that do not fit become missing,
+    for prepare_loan_frame to reject.
+    """
+    for column, dtype in columns.items():
+        if column not in df.columns:
+            continue
+        values = df[column]
+        if dtype == 'object':
+            df[column] = values.where(values.isna(), values.astype(str)).astype(object)
+        elif dtype.startswith('datetime'):
+            df[column] = pd.to_datetime(values, errors='coerce').astype(dtype)
+        else:
+            values = pd.to_numeric(values, errors='coerce')
+            if dtype == 'Int64':
+                values = values.where(values % 1 == 0)
+            df[column] = values.astype(dtype)
+    return df
+
+
+def _xlsx_frames(file_path, columns, start, stop, chunk_size):
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        header = next(sheet.iter_rows(max_row=1, values_only=True), ())
+        positions = [index for index, name in enumerate(header) if name in columns]
+        names = [header[index] for index in positions]
+
+        rows = sheet.iter_rows(min_row=start + 2, max_row=None if stop is None else stop + 1, values_only=True)
+        batch, blank = [], 0
+        position = start
+        for row in rows:
+            values = [row[index] if index < len(row) else None for index in positions]
+            if all(value is None for value in values):
+                # Blank rows are data rows unless they trail the sheet, as with pd.read_excel
+                blank += 1
+                continue
+            batch.extend([[None] * len(names)] * blank)
+            blank = 0
+            batch.append(values)
+            if len(batch) >= chunk_size:
+                yield pd.DataFrame(batch, columns=names, index=pd.RangeIndex(position, position + len(batch)))
+                position, batch = position + len(batch), []
+        if batch:
+            yield pd.DataFrame(batch, columns=names, index=pd.RangeIndex(position, position + len(batch)))
+    finally:
+        workbook.close()
+
+
+def _csv_frames(file_path, columns, start, stop, chunk_size):
+    text_columns = {column: str for column, dtype in columns.items() if dtype == 'object'}
+    reader = pd.read_csv(
+        file_path,
+        usecols=lambda column: column in columns,
+        dtype=text_columns,
+        skiprows=range(1, start + 1),
+        nrows=None if stop is None else stop - start,
+        chunksize=chunk_size,
+    )
+    position = start
+    for frame in reader:
+        frame.index = pd.RangeIndex(position, position + len(frame))
+        position += len(frame)
+        yield frame
+
+
+def _parquet_frames(file_path, columns, start, stop, chunk_size):
+    parquet_file = pyarrow.parquet.ParquetFile(file_path)
+    names = [name for name in parquet_file.schema_arrow.names if name in columns]
+    position = 0
+    for batch in parquet_file.iter_batches(batch_size=chunk_size, columns=names):
+        first, last = position, position + batch.num_rows
+        position = last
+        if last <= start:
+            continue
+        if stop is not None and first >= stop:
+            break
+        offset = max(start - first, 0)
+        length = (last if stop is None else min(last, stop)) - first - offset
+        frame = batch.slice(offset, length).to_pandas()
+        frame.index = pd.RangeIndex(first + offset, first + offset + len(frame))
+        yield frame
+
+
+def iter_source(file_path, dataset, start=0, stop=None, chunk_size=None):
+    """
+    Yield data rows [start, stop) of a source file as DataFrames of at most chunk_size
+    rows, indexed by their position in the file and typed per SOURCE_COLUMNS
+    """
+    columns = SOURCE_COLUMNS[dataset]
+    reader = {'xlsx': _xlsx_frames, 'csv': _csv_frames, 'parquet': _parquet_frames}[source_format(file_path)]
+    for frame in reader(file_path, columns, start, stop, chunk_size or READ_CHUNK_SIZE):
+        yield _typed(frame, columns)
+
+
+def read_source(file_path, dataset, start=0, stop=None):
+    """
+    Read data rows [start, stop) of a source file, indexed by their position in the file
+    """
+    frames = list(iter_source(file_path, dataset, start, stop))
+    if not frames:
+        columns = SOURCE_COLUMNS[dataset]
+        return _typed(pd.DataFrame(columns=list(columns), index=pd.RangeIndex(start, start)), columns)
+    return pd.concat(frames) if len(frames) > 1 else frames[0]
+
+
+def count_source_rows(file_path):
+    file_format = source_format(file_path)
+    if file_format == 'parquet':
+        return pyarrow.parquet.ParquetFile(file_path).metadata.num_rows
+    if file_format == 'csv':
+        return sum(len(chunk) for chunk in pd.read_csv(file_path, usecols=[0], chunksize=READ_CHUNK_SIZE))
+    workbook = load_workbook(file_path, read_only=True)
+    try:
+        return max(workbook.worksheets[0].max_row - 1, 0)
+    finally:
+        workbook.close()
+
+
+def _arrow_schema(frame):
+    types = {'Int64': pyarrow.int64(), 'float64': pyarrow.float64(), 'object': pyarrow.string()}
+    return pyarrow.schema([
+        (column, types.get(str(dtype), pyarrow.timestamp('ns'))) for column, dtype in frame.dtypes.items()
+    ])
+
+
+def _convert(file_path, dataset, cache_dir, cache_path):
+    os.makedirs(cache_dir, exist_ok=True)
+    partial_path = f'{cache_path}.{os.getpid()}.partial'
+    writer = None
+    try:
+        for frame in iter_source(file_path, dataset):
+            if writer is None:
+                writer = pyarrow.parquet.ParquetWriter(partial_path, _arrow_schema(frame))
+            writer.write_table(pyarrow.Table.from_pandas(frame, schema=writer.schema, preserve_index=False))
+        if writer is None:
+            return False
+        writer.close()
+        writer = None
+        # Atomic, so concurrent readers see either no file or a complete one
+        os.replace(partial_path, cache_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+    return True
+
+
+def cached_source(file_path, dataset):
+    """
+    Path to read an ingest source from: a cached Parquet conversion of an xlsx source,
+    made on first use and kept while the workbook's size and mtime stay the same,
+    or the source itself (other formats, without pyarrow or INGEST_PARQUET_CACHE, or
+    when the conversion cannot be written).
+    """
+    if source_format(file_path) != 'xlsx' or pyarrow is None or not settings.INGEST_PARQUET_CACHE:
+        return file_path
+
+    stat = os.stat(file_path)
+    stem = f'{os.path.splitext(os.path.basename(file_path))[0]}-{dataset}'
+    key = hashlib.sha256(f'{os.path.abspath(file_path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode()).hexdigest()[:16]
+    cache_dir = settings.INGEST_CACHE_DIR or os.path.join(os.path.dirname(os.path.abspath(file_path)), '.ingest_cache')
+    cache_path = os.path.join(cache_dir, f'{stem}-{key}.parquet')
+    if os.path.exists(cache_path):
+        return cache_path
+
+    try:
+        if not _convert(file_path, dataset, cache_dir, cache_path):
+            return file_path
+        for stale_path in glob.glob(os.path.join(glob.escape(cache_dir), f'{glob.escape(stem)}-*.parquet')):
+            if stale_path != cache_path:
+                os.remove(stale_path)
+    except (OSError, pyarrow.ArrowException) as e:
+        # A read-only directory or full disk only costs the speed-up
+        logger.warning('Reading %s without a Parquet cache: %s', file_path, e)
+        if not os.path.exists(cache_path):
+            return file_path
+    return cache_path
@@ -0,0 +1,166 @@
+"""
+Synthetic customers and loans at production scale.
+
+generate_batches yields (customers, loans) DataFrames one chunk of customers at a
+time, in the column layout of customer_data.xlsx and loan_data.xlsx, so a chunk
+can be appended to files for the ingest path or inserted into the database.
+Memory is bounded by the chunk size, not by the number of rows. credit_profiles
+aggregates a chunk's loans into its customers' CustomerCreditProfile rows.
+"""
+import json
+from datetime import date
+import numpy as np
+import pandas as pd
+
+from .emi import add_months, monthly_installments
+
+CUSTOMER_COLUMNS = [
+    'Customer ID', 'First Name', 'Last Name', 'Age', 'Phone Number', 'Monthly Salary', 'Approved Limit',
+]
+LOAN_COLUMNS = [
+    'Customer ID', 'Loan ID', 'Loan Amount', 'Tenure', 'Interest Rate', 'Monthly payment',
+    'EMIs paid on Time', 'Date of Approval', 'End Date',
+]
+
+FIRST_NAMES = np.array([
+    'Aarav', 'Aditi', 'Akash', 'Ananya', 'Arjun', 'Diya', 'Ishaan', 'Kavya', 'Meera', 'Neha',
+    'Nikhil', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Saanvi', 'Sahil', 'Sneha', 'Tanvi', 'Vikram',
+    'Aaron', 'Abbey', 'Carlos', 'Elena', 'Grace', 'Hannah', 'James', 'Maria', 'Omar', 'Sofia',
+])
+LAST_NAMES = np.array([
+    'Agarwal', 'Bhat', 'Chopra', 'Desai', 'Gupta', 'Iyer', 'Joshi', 'Kapoor', 'Khan', 'Kumar',
+    'Mehta', 'Nair', 'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma', 'Yadav',
+    'Garcia', 'Gonzalez', 'Rodrigues', 'Smith', 'Fernandes',
+])
+
+# Standard tenures in months and how often each is taken
+TENURES = np.array([6, 12, 18, 24, 36, 48, 60, 72, 84, 96, 120, 144, 180])
+TENURE_WEIGHTS = np.array([2, 8, 4, 10, 12, 8, 12, 6, 8, 5, 10, 5, 10], dtype=np.float64)
+TENURE_WEIGHTS /= TENURE_WEIGHTS.sum()
+
+FIRST_APPROVAL_DATE = np.datetime64('2010-01-01')
+# Phone numbers are a bijection of the customer ID onto 6000000000-8999999999,
+# so they are unique and never collide with the 9xxxxxxxxx numbers of the sample data
+PHONE_BASE = 6_000_000_000
+PHONE_RANGE = 3_000_000_000
+PHONE_MULTIPLIER = 2_654_435_761
+
+
+def _months_elapsed(start_dates, today):
+    months = (np.datetime64(today, 'M') - start_dates.astype('datetime64[M]')).astype(np.int64)
+    start_days = (start_dates - start_dates.astype('datetime64[M]').astype('datetime64[D]')).astype(np.int64)
+    return months - (start_days > today.day - 1)
+
+
+def generate_batch(rng, first_customer_id, customer_count, first_loan_id, loans_per_customer, today=None):
+    """
+    (customers, loans) DataFrames for customer_count customers with loans_per_customer loans each.
+
+    Salaries are log-normal around 60k a month, approved limits follow the registration
+    rule (36 x salary to the nearest lakh), loan amounts are a log-normal multiple of
+    salary, and EMIs come from emi.monthly_installments. Each customer has an on-time
+    ratio, and their EMIs paid on time count the instalments due so far at that ratio.
+    """
+    today = today or date.today()
+    customer_ids = np.arange(first_customer_id, first_customer_id + customer_count, dtype=np.int64)
+    salaries = np.clip(np.round(rng.lognormal(np.log(60000), 0.6, customer_count) / 1000) * 1000, 15000, 1_000_000)
+    customers = pd.DataFrame({
+        'Customer ID': customer_ids,
+        'First Name': rng.choice(FIRST_NAMES, customer_count),
+        'Last Name': rng.choice(LAST_NAMES, customer_count),
+        'Age': rng.integers(21, 71, customer_count),
+        'Phone Number': PHONE_BASE + customer_ids * PHONE_MULTIPLIER % PHONE_RANGE,
+        'Monthly Salary': salaries.astype(np.int64),
+        'Approved Limit': (np.round(36 * salaries / 100000) * 100000).astype(np.int64),
+    }, columns=CUSTOMER_COLUMNS)
+
+    loan_count = customer_count * loans_per_customer
+    loan_salaries = np.repeat(salaries, loans_per_customer)
+    amounts = np.clip(np.round(loan_salaries * rng.lognormal(np.log(6), 0.5, loan_count) / 10000) * 10000, 50000, 10_000_000)
+    tenures = rng.choice(TENURES, loan_count, p=TENURE_WEIGHTS)
+    rates = np.round(np.clip(rng.normal(12.5, 2.5, loan_count), 8, 18), 2)
+
+    days = (np.datetime64(today, 'D') - FIRST_APPROVAL_DATE).astype(np.int64)
+    start_dates = FIRST_APPROVAL_DATE + rng.integers(0, days, loan_count)
+    end_dates = add_months(start_dates, tenures)
+    due = np.clip(_months_elapsed(start_dates, today), 0, tenures)
+    on_time_ratio = np.repeat(rng.beta(9, 1.2, customer_count), loans_per_customer)
+
+    loans = pd.DataFrame({
+        'Customer ID': np.repeat(customer_ids, loans_per_customer),
+        'Loan ID': np.arange(first_loan_id, first_loan_id + loan_count, dtype=np.int64),
+        'Loan Amount': amounts.astype(np.int64),
+        'Tenure': tenures,
+        'Interest Rate': rates,
+        'Monthly payment': monthly_installments(amounts, rates, tenures),
+        'EMIs paid on Time': np.floor(due * on_time_ratio).astype(np.int64),
+        'Date of Approval': start_dates.astype('datetime64[ns]'),
+        'End Date': end_dates.astype('datetime64[ns]'),
+    }, columns=LOAN_COLUMNS)
+    return customers, loans
+
+
+def generate_batches(customers, loans_per_customer, chunk_size, seed=0,
+                     first_customer_id=1, first_loan_id=1, today=None):
+    """
+    Yield (customers, loans) DataFrames for `customers` customers, chunk_size customers at a time.
+    The same arguments always generate the same rows.
+    """
+    rng = np.random.default_rng(seed)
+    for start in range(0, customers, chunk_size):
+        count = min(chunk_size, customers - start)
+        yield generate_batch(
+            rng,
+            first_customer_id + start,
+            count,
+            first_loan_id + start * loans_per_customer,
+            loans_per_customer,
+            today,
+        )
+
+
+def active_loans(loans, today=None):
+    """
+    Boolean Series of the loans still running, by the ingest task's rule (End Date after today)
+    """
+    return loans['End Date'] > pd.Timestamp(today or date.today())
+
+
+def _paise_to_string(paise):
+    return [f'{value // 100}.{value % 100:02d}' for value in paise.tolist()]
+
+
+def credit_profiles(customers, loans, today=None):
+    """
+    CustomerCreditProfile columns for the customers of a chunk, computed from the chunk's
+    loans the way profiles.rebuild_profiles computes them from the loans table.
+    Amounts are exact decimal strings.
+    """
+    active = active_loans(loans, today)
+    loans = loans.assign(
+        active_principal=np.where(active, loans['Loan Amount'].to_numpy() * 100, 0),
+        active_emi=np.where(active, np.rint(loans['Monthly payment'].to_numpy() * 100).astype(np.int64), 0),
+        year=loans['Date of Approval'].dt.year,
+    )
+    totals = loans.groupby('Customer ID').agg(
+        loan_count=('Loan ID', 'size'),
+        total_tenure=('Tenure', 'sum'),
+        emis_paid_on_time=('EMIs paid on Time', 'sum'),
+        active_principal=('active_principal', 'sum'),
+        active_emi_total=('active_emi', 'sum'),
+    ).reindex(customers['Customer ID'], fill_value=0)
+
+    loans_per_year = {customer_id: {} for customer_id in totals.index.tolist()}
+    per_year = loans.groupby(['Customer ID', 'year']).size()
+    for (customer_id, year), count in zip(per_year.index.tolist(), per_year.tolist()):
+        loans_per_year[customer_id][str(year)] = count
+
+    return pd.DataFrame({
+        'customer_id': totals.index.to_numpy(),
+        'loan_count': totals['loan_count'].to_numpy(),
+        'total_tenure': totals['total_tenure'].to_numpy(),
+        'emis_paid_on_time': totals['emis_paid_on_time'].to_numpy(),
+        'active_principal': _paise_to_string(totals['active_principal'].to_numpy()),
+        'active_emi_total': _paise_to_string(totals['active_emi_total'].to_numpy()),
+        'loans_per_year': [json.dumps(years) for years in loans_per_year.values()],
+    })
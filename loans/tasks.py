@@ -1,53 +1,175 @@
 import pandas as pd
-from celery import shared_task
+from celery import shared_task, group, chord
 from django.conf import settings
+from django.db import transaction
 from datetime import datetime
 from decimal import Decimal
+import logging
+import math
 import os
 
 from .models import Customer, Loan
+from .profiles import rebuild_profiles
+from .cache import invalidate_eligibility
+from .idempotency import purge_expired_records
+from . import delta, maintenance, sources
+
+logger = logging.getLogger(__name__)
+
+
+CUSTOMER_UPDATE_FIELDS = [
+    'first_name',
+    'last_name',
+    'phone_number',
+    'monthly_salary',
+    'approved_limit',
+    'current_debt',
+    'age',
+    'updated_at',
+]
+
+
+def _default_source(file_name):
+    return os.path.join(settings.BASE_DIR, file_name)
+
+
+def _read_source(file_path, dataset, start=0, stop=None):
+    """
+    Read data rows [start, stop) of a source file, indexed by their position in the file.
+    xlsx sources are read through their cached Parquet conversion when there is one.
+    """
+    return sources.read_source(sources.cached_source(file_path, dataset), dataset, start, stop)
+
+
+def _iter_source(file_path, dataset):
+    return sources.iter_source(sources.cached_source(file_path, dataset), dataset)
+
+
+def _decimal_column(series):
+    return [Decimal(value) for value in series.astype(str)]
+
+
+def upsert_customers(df, batch_size=None):
+    """
+    Insert or update the customers in a customer_data DataFrame with batched
+    INSERT ... ON CONFLICT statements inside one transaction.
+    Rows sharing a Customer ID behave like sequential update_or_create calls:
+    the last row wins and the repeats count as updates.
+    Returns (created, updated).
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    total_rows = len(df)
+    # Sorted so concurrent chunk upserts lock rows in the same order
+    df = df.drop_duplicates(subset='Customer ID', keep='last').sort_values('Customer ID')
+    
+    customer_ids = df['Customer ID'].astype('int64').tolist()
+    first_names = df['First Name'].astype(str).tolist()
+    last_names = df['Last Name'].astype(str).tolist()
+    phone_numbers = df['Phone Number'].astype(str).tolist()
+    monthly_salaries = _decimal_column(df['Monthly Salary'])
+    approved_limits = _decimal_column(df['Approved Limit'])
+    if 'Age' in df.columns:
+        ages = df['Age'].fillna(25).astype('int64').tolist()
+    else:
+        ages = [25] * len(df)
+    
+    created = 0
+    with transaction.atomic():
+        for start in range(0, len(customer_ids), batch_size):
+            stop = start + batch_size
+            batch_ids = customer_ids[start:stop]
+            existing = Customer.objects.filter(customer_id__in=batch_ids).count()
+            created += len(batch_ids) - existing
+            
+            Customer.objects.bulk_create(
+                [
+                    Customer(
+                        customer_id=customer_id,
+                        first_name=first_name,
+                        last_name=last_name,
+                        phone_number=phone_number,
+                        monthly_salary=monthly_salary,
+                        approved_limit=approved_limit,
+                        current_debt=Decimal('0'),  # Default since not in Excel
+                        age=age
+                    )
+                    for customer_id, first_name, last_name, phone_number, monthly_salary, approved_limit, age in zip(
+                        batch_ids,
+                        first_names[start:stop],
+                        last_names[start:stop],
+                        phone_numbers[start:stop],
+                        monthly_salaries[start:stop],
+                        approved_limits[start:stop],
+                        ages[start:stop]
+                    )
+                ],
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['customer_id'],
+                update_fields=CUSTOMER_UPDATE_FIELDS
+            )
+        transaction.on_commit(lambda: invalidate_eligibility(customer_ids))
+    
+    return created, total_rows - created
+
+
+def _ingest_customers_incremental(file_path, batch_size=None):
+    content_hash = delta.file_hash(file_path)
+    if delta.source_unchanged(delta.CUSTOMERS, content_hash):
+        return {
+            'status': 'success',
+            'source_unchanged': True,
+            'customers_created': 0,
+            'customers_updated': 0,
+            'customers_unchanged': 0,
+            'total_processed': 0
+        }
+    
+    df = _read_source(file_path, delta.CUSTOMERS)
+    rows = df.drop_duplicates(subset='Customer ID', keep='last')
+    changed, fingerprints = delta.changed_rows(delta.CUSTOMERS, rows, 'Customer ID', batch_size)
+    with transaction.atomic():
+        customers_created, customers_updated = upsert_customers(changed, batch_size)
+        delta.record_rows(delta.CUSTOMERS, changed['Customer ID'], fingerprints, batch_size)
+        delta.record_file(delta.CUSTOMERS, content_hash, len(df))
+    
+    return {
+        'status': 'success',
+        'source_unchanged': False,
+        'customers_created': customers_created,
+        'customers_updated': customers_updated,
+        'customers_unchanged': len(rows) - len(changed),
+        'total_processed': len(df)
+    }
 
 
 @shared_task
-def ingest_customer_data():
+def ingest_customer_data(file_path=None, batch_size=None, incremental=False):
     """
-    Ingest customer data from Excel file
+    Ingest customer data from an xlsx, CSV or Parquet file, read in chunks.
+    With incremental=True an unchanged file is skipped without being parsed, and
+    only rows whose fingerprint changed since the last incremental run are written.
     """
     try:
         # Read customer data
-        customer_file_path = os.path.join(settings.BASE_DIR, 'customer_data.xlsx')
-        df = pd.read_excel(customer_file_path)
-        
-        customers_created = 0
-        customers_updated = 0
+        customer_file_path = file_path or _default_source('customer_data.xlsx')
+        if incremental:
+            return _ingest_customers_incremental(customer_file_path, batch_size)
         
-        for _, row in df.iterrows():
-            customer_data = {
-                'customer_id': int(row['Customer ID']),
-                'first_name': str(row['First Name']),
-                'last_name': str(row['Last Name']),
-                'phone_number': str(row['Phone Number']),
-                'monthly_salary': Decimal(str(row['Monthly Salary'])),
-                'approved_limit': Decimal(str(row['Approved Limit'])),
-                'current_debt': Decimal('0'),  # Default since not in Excel
-                'age': int(row['Age']) if 'Age' in row and pd.notna(row['Age']) else 25
-            }
-            
-            customer, created = Customer.objects.update_or_create(
-                customer_id=customer_data['customer_id'],
-                defaults=customer_data
-            )
-            
-            if created:
-                customers_created += 1
-            else:
-                customers_updated += 1
+        customers_created = customers_updated = total_processed = 0
+        with transaction.atomic():
+            for df in _iter_source(customer_file_path, delta.CUSTOMERS):
+                created, updated = upsert_customers(df, batch_size)
+                customers_created += created
+                customers_updated += updated
+                total_processed += len(df)
+        delta.forget(delta.CUSTOMERS)
         
         return {
             'status': 'success',
             'customers_created': customers_created,
             'customers_updated': customers_updated,
-            'total_processed': len(df)
+            'total_processed': total_processed
         }
         
     except Exception as e:
@@ -57,62 +179,259 @@ def ingest_customer_data():
         }
 
 
+LOAN_UPDATE_FIELDS = [
+    'customer',
+    'loan_amount',
+    'tenure',
+    'interest_rate',
+    'monthly_repayment',
+    'emis_paid_on_time',
+    'start_date',
+    'end_date',
+    'is_active',
+    'updated_at',
+]
+
+LOAN_NUMERIC_COLUMNS = [
+    'Customer ID',
+    'Loan ID',
+    'Loan Amount',
+    'Tenure',
+    'Interest Rate',
+    'Monthly payment',
+    'EMIs paid on Time',
+]
+
+
+def _reject(rows, reason):
+    return [
+        {
+            'row': int(index) + 2,  # spreadsheet row, the header being row 1
+            'loan_id': None if pd.isna(loan_id) else int(loan_id),
+            'customer_id': None if pd.isna(customer_id) else int(customer_id),
+            'reason': reason,
+        }
+        for index, loan_id, customer_id in zip(rows.index, rows['Loan ID'], rows['Customer ID'])
+    ]
+
+
+def prepare_loan_frame(df):
+    """
+    Validate and type a loan_data DataFrame column-wise.
+    Returns (valid rows, rejects), where rejects is a list of
+    {'row', 'loan_id', 'customer_id', 'reason'} dicts.
+    """
+    df = df.copy()
+    for column in LOAN_NUMERIC_COLUMNS:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df['Date of Approval'] = pd.to_datetime(df['Date of Approval'], errors='coerce')
+    df['End Date'] = pd.to_datetime(df['End Date'], errors='coerce')
+    
+    invalid = df[LOAN_NUMERIC_COLUMNS + ['Date of Approval', 'End Date']].isna().any(axis=1)
+    rejects = _reject(df[invalid], 'missing or invalid value')
+    df = df[~invalid]
+    
+    customer_ids = df['Customer ID'].astype('int64')
+    referenced = customer_ids.unique().tolist()
+    known_customers = set()
+    for start in range(0, len(referenced), settings.INGEST_BATCH_SIZE):
+        known_customers.update(
+            Customer.objects.filter(
+                customer_id__in=referenced[start:start + settings.INGEST_BATCH_SIZE]
+            ).values_list('customer_id', flat=True)
+        )
+    unknown = ~customer_ids.isin(known_customers)
+    rejects += _reject(df[unknown], 'customer not found')
+    df = df[~unknown]
+    
+    return df, rejects
+
+
+def _upsert_loan_rows(df, batch_size=None):
+    """
+    Insert or update the loans of a prepared loan DataFrame with batched
+    INSERT ... ON CONFLICT statements, leaving the credit profiles alone.
+    Returns (created, updated, customers whose profiles change).
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    valid_rows = len(df)
+    # Sorted so concurrent chunk upserts lock rows in the same order
+    df = df.drop_duplicates(subset='Loan ID', keep='last').sort_values('Loan ID')
+    
+    loan_ids = df['Loan ID'].astype('int64').tolist()
+    customer_ids = df['Customer ID'].astype('int64').tolist()
+    loan_amounts = _decimal_column(df['Loan Amount'])
+    tenures = df['Tenure'].astype('int64').tolist()
+    interest_rates = _decimal_column(df['Interest Rate'])
+    monthly_repayments = _decimal_column(df['Monthly payment'])
+    emis_paid_on_time = df['EMIs paid on Time'].astype('int64').tolist()
+    start_dates = df['Date of Approval'].dt.date.tolist()
+    end_dates = df['End Date'].dt.date.tolist()
+    active = (df['End Date'].dt.normalize() > pd.Timestamp(datetime.now().date())).tolist()
+    
+    # Customers whose profiles change: every customer named in the file plus the
+    # current owners of any loans being overwritten
+    affected_customers = set(customer_ids)
+    created = 0
+    with transaction.atomic():
+        for start in range(0, len(loan_ids), batch_size):
+            stop = start + batch_size
+            batch_ids = loan_ids[start:stop]
+            previous_owners = list(
+                Loan.objects.filter(loan_id__in=batch_ids).values_list('customer_id', flat=True)
+            )
+            created += len(batch_ids) - len(previous_owners)
+            affected_customers.update(previous_owners)
+            
+            Loan.objects.bulk_create(
+                [
+                    Loan(
+                        loan_id=loan_id,
+                        customer_id=customer_id,
+                        loan_amount=loan_amount,
+                        tenure=tenure,
+                        interest_rate=interest_rate,
+                        monthly_repayment=monthly_repayment,
+                        emis_paid_on_time=paid_on_time,
+                        start_date=start_date,
+                        end_date=end_date,
+                        is_active=is_active
+                    )
+                    for (
+                        loan_id, customer_id, loan_amount, tenure, interest_rate,
+                        monthly_repayment, paid_on_time, start_date, end_date, is_active
+                    ) in zip(
+                        batch_ids,
+                        customer_ids[start:stop],
+                        loan_amounts[start:stop],
+                        tenures[start:stop],
+                        interest_rates[start:stop],
+                        monthly_repayments[start:stop],
+                        emis_paid_on_time[start:stop],
+                        start_dates[start:stop],
+                        end_dates[start:stop],
+                        active[start:stop]
+                    )
+                ],
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=['loan_id'],
+                update_fields=LOAN_UPDATE_FIELDS
+            )
+    
+    return created, valid_rows - created, affected_customers
+
+
+def _lock_customers(customer_ids, batch_size=None):
+    """
+    Row-lock customers in ID order. A concurrent loan upsert for the same customers
+    then waits for this transaction to commit before rebuilding their profiles, so
+    the rebuild that commits last counts the loans of both.
+    """
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+    for start in range(0, len(customer_ids), batch_size):
+        # NO KEY UPDATE so loan inserts referencing these customers are not blocked
+        list(
+            Customer.objects.select_for_update(no_key=True)
+            .filter(customer_id__in=customer_ids[start:start + batch_size])
+            .order_by('customer_id')
+            .values_list('customer_id', flat=True)
+        )
+
+
+def upsert_loans(df, batch_size=None):
+    """
+    Insert or update the loans of a prepared loan DataFrame (see prepare_loan_frame)
+    with batched INSERT ... ON CONFLICT statements inside one transaction, and rebuild
+    the credit profiles of every affected customer in the same transaction.
+    Rows sharing a Loan ID behave like sequential update_or_create calls.
+    Returns (created, updated).
+    """
+    with transaction.atomic():
+        created, updated, affected_customers = _upsert_loan_rows(df, batch_size)
+        affected_customers = sorted(affected_customers)
+        _lock_customers(affected_customers, batch_size)
+        rebuild_profiles(affected_customers)
+        transaction.on_commit(lambda: invalidate_eligibility(affected_customers))
+    return created, updated
+
+
+def _ingest_loans_incremental(file_path, batch_size=None):
+    content_hash = delta.file_hash(file_path)
+    if delta.source_unchanged(delta.LOANS, content_hash):
+        return {
+            'status': 'success',
+            'source_unchanged': True,
+            'loans_created': 0,
+            'loans_updated': 0,
+            'loans_unchanged': 0,
+            'loans_rejected': 0,
+            'total_processed': 0,
+            'rejects': []
+        }
+    
+    df = _read_source(file_path, delta.LOANS)
+    loans, rejects = prepare_loan_frame(df)
+    loans = loans.drop_duplicates(subset='Loan ID', keep='last')
+    changed, fingerprints = delta.changed_rows(delta.LOANS, loans, 'Loan ID', batch_size)
+    with transaction.atomic():
+        loans_created, loans_updated = upsert_loans(changed, batch_size)
+        delta.record_rows(delta.LOANS, changed['Loan ID'], fingerprints, batch_size)
+        if not rejects:
+            # Rejected rows (e.g. for customers not ingested yet) must be retried next run
+            delta.record_file(delta.LOANS, content_hash, len(df))
+    
+    if rejects:
+        logger.warning('Skipped %d of %d loan rows from %s', len(rejects), len(df), file_path)
+    
+    return {
+        'status': 'success',
+        'source_unchanged': False,
+        'loans_created': loans_created,
+        'loans_updated': loans_updated,
+        'loans_unchanged': len(loans) - len(changed),
+        'loans_rejected': len(rejects),
+        'total_processed': len(df),
+        'rejects': rejects
+    }
+
+
 @shared_task
-def ingest_loan_data():
+def ingest_loan_data(file_path=None, batch_size=None, incremental=False):
     """
-    Ingest loan data from Excel file
+    Ingest loan data from an xlsx, CSV or Parquet file, read in chunks.
+    Rows with missing values or unknown customers are skipped and listed in the
+    result's 'rejects' report. With incremental=True an unchanged file is skipped
+    and only rows whose fingerprint changed since the last incremental run are written.
     """
     try:
         # Read loan data
-        loan_file_path = os.path.join(settings.BASE_DIR, 'loan_data.xlsx')
-        df = pd.read_excel(loan_file_path)
+        loan_file_path = file_path or _default_source('loan_data.xlsx')
+        if incremental:
+            return _ingest_loans_incremental(loan_file_path, batch_size)
         
-        loans_created = 0
-        loans_updated = 0
+        loans_created = loans_updated = total_processed = 0
+        rejects = []
+        with transaction.atomic():
+            for df in _iter_source(loan_file_path, delta.LOANS):
+                loans, chunk_rejects = prepare_loan_frame(df)
+                created, updated = upsert_loans(loans, batch_size)
+                loans_created += created
+                loans_updated += updated
+                total_processed += len(df)
+                rejects += chunk_rejects
+        delta.forget(delta.LOANS)
         
-        for _, row in df.iterrows():
-            try:
-                customer = Customer.objects.get(customer_id=int(row['Customer ID']))
-                
-                # Parse dates
-                start_date = pd.to_datetime(row['Date of Approval']).date()
-                end_date = pd.to_datetime(row['End Date']).date()
-                
-                loan_data = {
-                    'loan_id': int(row['Loan ID']),
-                    'customer': customer,
-                    'loan_amount': Decimal(str(row['Loan Amount'])),
-                    'tenure': int(row['Tenure']),
-                    'interest_rate': Decimal(str(row['Interest Rate'])),
-                    'monthly_repayment': Decimal(str(row['Monthly payment'])),
-                    'emis_paid_on_time': int(row['EMIs paid on Time']),
-                    'start_date': start_date,
-                    'end_date': end_date,
-                    'is_active': end_date > datetime.now().date()
-                }
-                
-                loan, created = Loan.objects.update_or_create(
-                    loan_id=loan_data['loan_id'],
-                    defaults=loan_data
-                )
-                
-                if created:
-                    loans_created += 1
-                else:
-                    loans_updated += 1
-                    
-            except Customer.DoesNotExist:
-                print(f"Customer with ID {row['Customer ID']} not found for loan {row['Loan ID']}")
-                continue
-            except Exception as e:
-                print(f"Error processing loan {row['Loan ID']}: {str(e)}")
-                continue
+        if rejects:
+            logger.warning('Skipped %d of %d loan rows from %s', len(rejects), total_processed, loan_file_path)
         
         return {
             'status': 'success',
             'loans_created': loans_created,
             'loans_updated': loans_updated,
-            'total_processed': len(df)
+            'loans_rejected': len(rejects),
+            'total_processed': total_processed,
+            'rejects': rejects
         }
         
     except Exception as e:
@@ -123,14 +442,148 @@ def ingest_loan_data():
 
 
 @shared_task
-def ingest_all_data():
+def ingest_all_data(incremental=False, customer_file=None, loan_file=None):
     """
     Ingest both customer and loan data
     """
-    customer_result = ingest_customer_data()
-    loan_result = ingest_loan_data()
+    customer_result = ingest_customer_data(customer_file, incremental=incremental)
+    loan_result = ingest_loan_data(loan_file, incremental=incremental)
     
     return {
         'customer_ingestion': customer_result,
         'loan_ingestion': loan_result
-    }
\ No newline at end of file
+    }
+
+
+@shared_task
+def ingest_customer_chunk(file_path, start, stop, batch_size=None):
+    """
+    Ingest customer rows [start, stop) of a customer file
+    """
+    try:
+        df = _read_source(file_path, delta.CUSTOMERS, start, stop)
+        customers_created, customers_updated = upsert_customers(df, batch_size)
+        return {
+            'status': 'success',
+            'customers_created': customers_created,
+            'customers_updated': customers_updated,
+            'total_processed': len(df)
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': f'rows {start}-{stop}: {e}'
+        }
+
+
+@shared_task
+def ingest_loan_chunk(file_path, start, stop, batch_size=None):
+    """
+    Ingest loan rows [start, stop) of a loan file, rebuilding the credit profiles
+    of the customers they touch in the same transaction
+    """
+    try:
+        df = _read_source(file_path, delta.LOANS, start, stop)
+        loans, rejects = prepare_loan_frame(df)
+        loans_created, loans_updated = upsert_loans(loans, batch_size)
+        return {
+            'status': 'success',
+            'loans_created': loans_created,
+            'loans_updated': loans_updated,
+            'loans_rejected': len(rejects),
+            'total_processed': len(df),
+            'rejects': rejects
+        }
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': f'rows {start}-{stop}: {e}'
+        }
+
+
+def _merge_chunk_results(results, count_keys):
+    """
+    Combine per-chunk task results into the single-task result format
+    """
+    merged = {'status': 'success'}
+    for key in count_keys:
+        merged[key] = sum(result.get(key, 0) for result in results)
+    errors = [result['message'] for result in results if result['status'] != 'success']
+    if errors:
+        merged['status'] = 'error'
+        merged['message'] = '; '.join(errors)
+    return merged
+
+
+@shared_task
+def merge_loan_chunks(results):
+    """
+    Chord callback for the loan chunks: merge their counts and rejects
+    """
+    merged = _merge_chunk_results(
+        results, ['loans_created', 'loans_updated', 'loans_rejected', 'total_processed']
+    )
+    merged['rejects'] = [reject for result in results for reject in result.get('rejects', [])]
+    return merged
+
+
+def _row_ranges(total_rows, workers=None, chunk_size=None):
+    if not chunk_size:
+        chunk_size = math.ceil(total_rows / max(workers or 1, 1)) or 1
+    return [(start, min(start + chunk_size, total_rows)) for start in range(0, total_rows, chunk_size)]
+
+
+def ingest_all_data_parallel(workers=None, chunk_size=None, batch_size=None,
+                             customer_file=None, loan_file=None, timeout=None):
+    """
+    Ingest both files on the Celery workers.
+    Each file is split into row ranges (chunk_size rows each, or one range per worker).
+    Customer chunks run as a group; once they have all finished, loan chunks run as a
+    chord whose callback merges the counts. Each loan chunk rebuilds the credit
+    profiles of its customers in the transaction that writes its loans.
+    Blocks until done and returns the same shape as ingest_all_data.
+    Loan IDs repeated across chunks are resolved in chunk completion order.
+    """
+    # Converted once here rather than by every chunk
+    customer_file = sources.cached_source(customer_file or _default_source('customer_data.xlsx'), delta.CUSTOMERS)
+    loan_file = sources.cached_source(loan_file or _default_source('loan_data.xlsx'), delta.LOANS)
+    delta.forget(delta.CUSTOMERS)
+    delta.forget(delta.LOANS)
+    
+    customer_chunks = group(
+        ingest_customer_chunk.s(customer_file, start, stop, batch_size)
+        for start, stop in _row_ranges(sources.count_source_rows(customer_file), workers, chunk_size)
+    )
+    customer_results = customer_chunks.apply_async().get(timeout=timeout)
+    customer_result = _merge_chunk_results(
+        customer_results, ['customers_created', 'customers_updated', 'total_processed']
+    )
+    
+    loan_chunks = [
+        ingest_loan_chunk.s(loan_file, start, stop, batch_size)
+        for start, stop in _row_ranges(sources.count_source_rows(loan_file), workers, chunk_size)
+    ]
+    loan_result = chord(loan_chunks)(merge_loan_chunks.s()).get(timeout=timeout)
+    
+    return {
+        'customer_ingestion': customer_result,
+        'loan_ingestion': loan_result
+    }
+
+
+@shared_task
+def refresh_loan_state(batch_size=None):
+    """
+    Expire finished loans and recompute current debt and credit profile totals.
+    Scheduled nightly through Celery beat (CELERY_BEAT_SCHEDULE).
+    """
+    return maintenance.refresh_loan_state(batch_size=batch_size)
+
+
+@shared_task
+def purge_idempotency_records():
+    """
+    Delete Idempotency-Key records past IDEMPOTENCY_TTL, which are otherwise only
+    cleared when their key is reused. Scheduled nightly through Celery beat.
+    """
+    return {'idempotency_records_purged': purge_expired_records()}
@@ -1,12 +1,75 @@
-from django.test import TestCase
-from django.urls import reverse
+from django.test import TestCase, AsyncRequestFactory, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
+from django.db.models import F
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.http import http_date
+from django.urls import path, reverse
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import ParseError
 from decimal import Decimal
+from io import BytesIO, StringIO
+import json
+import os
+import unittest
+import unittest.mock
+import tempfile
+import threading
+import time
 from datetime import date, timedelta
+import pandas as pd
+from asgiref.sync import async_to_sync, sync_to_async
 
-from .models import Customer, Loan
-from .utils import calculate_credit_score, calculate_monthly_installment
+from .models import (
+    Customer, Loan, CustomerCreditProfile, IdempotencyRecord, IngestFileState, IngestRowState, LoanSchedule
+)
+from .utils import (
+    calculate_credit_score,
+    calculate_monthly_installment,
+    acheck_loan_eligibility,
+    check_loan_eligibility,
+    get_credit_score_inputs,
+)
+from .profiles import build_profile, rebuild_profiles
+from .origination import originate_loan
+from .pools import SharedConnectionPool, redis_client, redis_pool
+from .serializers import (
+    LoanDetailSerializer,
+    LoanListSerializer,
+    LoanEligibilitySerializer,
+    LoanEligibilityResponseSerializer,
+)
+from .fast_serializers import LOAN_DETAIL_COLUMNS, LOAN_LIST_COLUMNS, build_loan_detail, build_loan_list_item
+from .pagination import with_remaining_repayments
+from .emi import monthly_installments, total_interest, amortization_schedules
+from .synthetic import generate_batches
+from .copy_load import copy_load, fix_sequences
+from .sources import iter_source, read_source
+from .schedules import compute_schedule, get_schedule
+from .maintenance import refresh_loan_state
+from .tasks import (
+    ingest_all_data,
+    ingest_all_data_parallel,
+    ingest_customer_data,
+    ingest_loan_chunk,
+    ingest_loan_data,
+    prepare_loan_frame,
+    purge_idempotency_records,
+    upsert_customers,
+    upsert_loans,
+)
+from . import async_views
+from . import renderers
+from . import cache as eligibility_cache
+from . import sources
+from . import metrics
 
 
 class CustomerModelTest(TestCase):
@@ -85,6 +148,1614 @@ class UtilsTest(TestCase):
         self.assertEqual(score, 50)  # Default score for new customers
 
 
+class CreditScoreAggregateTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="History",
+            last_name="User",
+            age=40,
+            phone_number="6666666666",
+            monthly_salary=Decimal('100000'),
+            approved_limit=Decimal('3600000'),
+            current_debt=Decimal('0')
+        )
+        today = date.today()
+        for i in range(5):
+            Loan.objects.create(
+                customer=self.customer,
+                loan_amount=Decimal('100000'),
+                tenure=12,
+                interest_rate=Decimal('10'),
+                monthly_repayment=Decimal('8792.59'),
+                emis_paid_on_time=10,
+                start_date=date(today.year - i, 1, 1),
+                end_date=today + timedelta(days=365),
+                is_active=i < 2
+            )
+
+    def test_inputs_fetched_in_one_query(self):
+        with self.assertNumQueries(1):
+            inputs = get_credit_score_inputs(self.customer)
+        self.assertEqual(inputs['loan_count'], 5)
+        self.assertEqual(inputs['total_emis'], 60)
+        self.assertEqual(inputs['emis_paid_on_time'], 50)
+        self.assertEqual(inputs['current_year_loans'], 1)
+        self.assertEqual(inputs['active_principal'], Decimal('200000'))
+        self.assertEqual(inputs['active_emis'], Decimal('17585.18'))
+
+    def test_score_matches_component_formula(self):
+        # 40 * 50/60 + (20 - 10) + (20 - 5) + (20 - 20 * 200000/3600000)
+        expected = 40 * 50 / 60 + 10 + 15 + (20 - 20 * 200000 / 3600000)
+        self.assertAlmostEqual(calculate_credit_score(self.customer), expected, places=6)
+
+    def test_score_is_zero_when_active_loans_exceed_limit(self):
+        self.customer.approved_limit = Decimal('150000')
+        self.assertEqual(calculate_credit_score(self.customer), 0)
+
+
+class CreditProfileTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Profile",
+            last_name="User",
+            age=35,
+            phone_number="7777777777",
+            monthly_salary=Decimal('200000'),
+            approved_limit=Decimal('7200000'),
+            current_debt=Decimal('0')
+        )
+        Loan.objects.create(
+            customer=self.customer,
+            loan_amount=Decimal('50000'),
+            tenure=6,
+            interest_rate=Decimal('9'),
+            monthly_repayment=Decimal('8552.67'),
+            emis_paid_on_time=6,
+            start_date=date(2015, 1, 1),
+            end_date=date(2015, 7, 1),
+            is_active=False
+        )
+
+    def assertProfileMatchesLoans(self):
+        profile = CustomerCreditProfile.objects.get(customer=self.customer)
+        inputs = get_credit_score_inputs(self.customer)
+        self.assertEqual(profile.score_inputs(date.today().year), inputs)
+        self.assertEqual(sum(profile.loans_per_year.values()), inputs['loan_count'])
+
+    def test_profile_built_on_first_score(self):
+        self.assertFalse(CustomerCreditProfile.objects.filter(customer=self.customer).exists())
+        calculate_credit_score(self.customer)
+        self.assertProfileMatchesLoans()
+
+    def test_lazy_build_never_overwrites_a_profile(self):
+        stale = Customer.objects.get(customer_id=self.customer.customer_id)
+        # Written by a concurrent origination after this read's loan totals were taken
+        CustomerCreditProfile.objects.create(customer=self.customer, loan_count=2)
+        build_profile(stale)
+        self.assertEqual(CustomerCreditProfile.objects.get(customer=self.customer).loan_count, 2)
+
+    def test_create_loan_updates_profile(self):
+        rebuild_profiles([self.customer.customer_id])
+        data = {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 10,
+            'tenure': 12
+        }
+        for _ in range(2):
+            response = self.client.post(reverse('create_loan'), data, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertProfileMatchesLoans()
+
+    def test_eligibility_is_single_query_with_profile(self):
+        rebuild_profiles([self.customer.customer_id])
+        with self.assertNumQueries(1):
+            result = check_loan_eligibility(
+                self.customer.customer_id, Decimal('100000'), Decimal('10'), 12
+            )
+        self.assertTrue(result['approval'])
+
+    def test_rebuild_command_repairs_drift(self):
+        rebuild_profiles([self.customer.customer_id])
+        CustomerCreditProfile.objects.filter(customer=self.customer).update(
+            loan_count=99, active_principal=Decimal('1'), loans_per_year={}
+        )
+        call_command('rebuild_credit_profiles', stdout=StringIO())
+        self.assertProfileMatchesLoans()
+
+
+class LoanOriginationTest(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Origination",
+            last_name="User",
+            age=29,
+            phone_number="7878787878",
+            monthly_salary=Decimal('100000'),
+            approved_limit=Decimal('3600000'),
+            current_debt=Decimal('5000')
+        )
+        rebuild_profiles([self.customer.customer_id])
+
+    def test_origination_reuses_locked_customer(self):
+        # savepoint, lock customer + profile, insert loan, update profile, update debt, release
+        with self.assertNumQueries(6):
+            result, loan = originate_loan(self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        self.assertTrue(result['approval'])
+        self.assertEqual(loan.monthly_repayment, result['monthly_installment'])
+
+    def test_debt_is_incremented_in_database(self):
+        originate_loan(self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        # A concurrent writer changing the row must not be overwritten by the next origination
+        Customer.objects.filter(pk=self.customer.pk).update(current_debt=F('current_debt') + 1, monthly_salary=Decimal('90000'))
+        originate_loan(self.customer.customer_id, Decimal('50000'), Decimal('10'), 12)
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_debt, Decimal('155001'))
+        self.assertEqual(self.customer.monthly_salary, Decimal('90000'))
+        profile = CustomerCreditProfile.objects.get(customer=self.customer)
+        self.assertEqual(profile.score_inputs(date.today().year), get_credit_score_inputs(self.customer))
+
+    def test_unknown_customer_raises(self):
+        with self.assertRaises(Customer.DoesNotExist):
+            originate_loan(999999, Decimal('100000'), Decimal('10'), 12)
+
+
+LOCMEM_CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ELIGIBILITY_CACHE_ENABLED=True)
+class EligibilityCacheTest(APITestCase):
+    def setUp(self):
+        eligibility_cache._bypass_until = 0.0
+        self.customer = Customer.objects.create(
+            first_name="Cache",
+            last_name="User",
+            age=31,
+            phone_number="8888888888",
+            monthly_salary=Decimal('90000'),
+            approved_limit=Decimal('3200000'),
+            current_debt=Decimal('0')
+        )
+        self.quote = {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 10,
+            'tenure': 12
+        }
+
+    def tearDown(self):
+        eligibility_cache.cache.clear()
+
+    def test_repeated_quote_skips_database(self):
+        url = reverse('check_eligibility')
+        first = self.client.post(url, self.quote, format='json')
+        with self.assertNumQueries(0):
+            second = self.client.post(url, self.quote, format='json')
+        self.assertEqual(first.data, second.data)
+        self.assertEqual(eligibility_cache.eligibility_cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_create_loan_invalidates_cached_quote(self):
+        eligibility_cache.cached_check_loan_eligibility(self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create_loan'), self.quote, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(1):
+            eligibility_cache.cached_check_loan_eligibility(
+                self.customer.customer_id, Decimal('100000.00'), Decimal('10.0'), 12
+            )
+        self.assertEqual(eligibility_cache.eligibility_cache_stats(), {'hits': 0, 'misses': 2})
+
+    def test_not_found_is_not_cached(self):
+        url = reverse('check_eligibility')
+        quote = dict(self.quote, customer_id=self.customer.customer_id + 1)
+        self.assertFalse(self.client.post(url, quote, format='json').data['approval'])
+
+        response = self.client.post(reverse('register_customer'), {
+            'first_name': 'Late', 'last_name': 'Registrant', 'age': 30,
+            'monthly_income': 90000, 'phone_number': '8787878787'
+        }, format='json')
+        self.assertEqual(response.data['customer_id'], quote['customer_id'])
+        self.assertTrue(self.client.post(url, quote, format='json').data['approval'])
+
+    @override_settings(ELIGIBILITY_CACHE_TTL=0)
+    def test_expired_entries_are_recomputed(self):
+        eligibility_cache.cached_check_loan_eligibility(self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        eligibility_cache.cached_check_loan_eligibility(self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        self.assertEqual(eligibility_cache.eligibility_cache_stats()['hits'], 0)
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ELIGIBILITY_CACHE_ENABLED=True)
+class IdempotencyTest(APITestCase):
+    def setUp(self):
+        eligibility_cache._bypass_until = 0.0
+        self.customer = Customer.objects.create(
+            first_name="Retry",
+            last_name="User",
+            age=33,
+            phone_number="8181818181",
+            monthly_salary=Decimal('90000'),
+            approved_limit=Decimal('3200000'),
+            current_debt=Decimal('0')
+        )
+        self.url = reverse('create_loan')
+        self.data = {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 10,
+            'tenure': 12
+        }
+
+    def tearDown(self):
+        eligibility_cache._bypass_until = 0.0
+        eligibility_cache.cache.clear()
+
+    def post(self, data=None, key='retry-1'):
+        return self.client.post(self.url, data or self.data, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_is_served_from_cache(self):
+        first = self.post()
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        with self.assertNumQueries(0):
+            second = self.post()
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 1)
+
+    def test_requests_without_key_are_not_deduplicated(self):
+        self.client.post(self.url, self.data, format='json')
+        self.client.post(self.url, self.data, format='json')
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 2)
+
+    def test_key_reused_with_different_body(self):
+        self.post()
+        response = self.post(dict(self.data, loan_amount=200000))
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 1)
+
+    def test_database_fallback_after_cache_loss(self):
+        first = self.post()
+        eligibility_cache.cache.clear()
+        second = self.post()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 1)
+
+    def test_database_lock_when_cache_is_down(self):
+        eligibility_cache._bypass_until = float('inf')
+        first = self.post()
+        second = self.post()
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Loan.objects.filter(customer=self.customer).count(), 1)
+
+    @override_settings(IDEMPOTENCY_WAIT=0)
+    def test_in_flight_key_conflicts(self):
+        eligibility_cache.cache.add('idempotency:lock:create_loan:retry-1', 'other', 30)
+        response = self.post()
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertFalse(Loan.objects.filter(customer=self.customer).exists())
+
+    def test_expired_records_are_purged(self):
+        now = timezone.now()
+        ages = {
+            'fresh': (timedelta(hours=1), 201),
+            'expired': (timedelta(seconds=settings.IDEMPOTENCY_TTL + 60), 201),
+            'abandoned': (timedelta(seconds=settings.IDEMPOTENCY_LOCK_TIMEOUT + 60), None),
+            'running': (timedelta(seconds=1), None),
+        }
+        for key, (age, status_code) in ages.items():
+            record = IdempotencyRecord.objects.create(
+                scope='create_loan', key=key, request_hash='x', status_code=status_code
+            )
+            IdempotencyRecord.objects.filter(pk=record.pk).update(created_at=now - age)
+
+        result = purge_idempotency_records()
+        self.assertEqual(result, {'idempotency_records_purged': 2})
+        self.assertEqual(
+            sorted(IdempotencyRecord.objects.values_list('key', flat=True)), ['fresh', 'running']
+        )
+        self.assertIn('purge-idempotency-records', settings.CELERY_BEAT_SCHEDULE)
+
+
+class AsyncURLConf:
+    """
+    loans.urls as routed with ASYNC_VIEWS_ENABLED, for requests through the middleware
+    """
+    urlpatterns = [
+        path('check-eligibility/', async_views.check_eligibility, name='check_eligibility'),
+        path('view-loan/<int:loan_id>/', async_views.view_loan, name='view_loan'),
+        path('view-loans/<int:customer_id>/', async_views.view_loans_by_customer, name='view_loans_by_customer'),
+    ]
+
+
+@override_settings(ELIGIBILITY_CACHE_ENABLED=False)
+class AsyncViewsTest(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+        self.customer = Customer.objects.create(
+            first_name="Async",
+            last_name="User",
+            age=37,
+            phone_number="8282828282",
+            monthly_salary=Decimal('80000'),
+            approved_limit=Decimal('2900000'),
+            current_debt=Decimal('0')
+        )
+        self.loan = Loan.objects.create(
+            customer=self.customer,
+            loan_amount=Decimal('120000'),
+            tenure=24,
+            interest_rate=Decimal('11'),
+            monthly_repayment=Decimal('5592.91'),
+            emis_paid_on_time=20,
+            start_date=date(2021, 5, 1),
+            end_date=date(2023, 5, 1),
+            is_active=True
+        )
+        self.quote = {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 10,
+            'tenure': 12
+        }
+
+    def assertMatchesSyncView(self, sync_response, async_response):
+        self.assertEqual(async_response.status_code, sync_response.status_code)
+        self.assertEqual(async_response.content, sync_response.content)
+
+    async def test_check_eligibility_matches_sync_view(self):
+        for quote in (self.quote, dict(self.quote, customer_id=999999), dict(self.quote, tenure='x')):
+            body = json.dumps(quote)
+            sync_response = await sync_to_async(self.client.post)(
+                reverse('check_eligibility'), body, content_type='application/json'
+            )
+            request = self.factory.post('/check-eligibility/', body, content_type='application/json')
+            self.assertMatchesSyncView(sync_response, await async_views.check_eligibility(request))
+
+    @override_settings(ROOT_URLCONF=AsyncURLConf)
+    def test_views_are_csrf_exempt(self):
+        client = Client(enforce_csrf_checks=True)
+        response = client.post(reverse('check_eligibility'), self.quote, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(json.loads(response.content)['approval'])
+        for url in (
+            reverse('view_loan', kwargs={'loan_id': self.loan.loan_id}),
+            reverse('view_loans_by_customer', kwargs={'customer_id': self.customer.customer_id}),
+        ):
+            # Rejected by the view, not by CsrfViewMiddleware
+            self.assertEqual(client.post(url).status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_other_methods_match_sync_views(self):
+        cases = [
+            ('check_eligibility', async_views.check_eligibility, {}),
+            ('view_loan', async_views.view_loan, {'loan_id': self.loan.loan_id}),
+            ('view_loans_by_customer', async_views.view_loans_by_customer, {'customer_id': self.customer.customer_id}),
+        ]
+        for name, view, kwargs in cases:
+            url = reverse(name, kwargs=kwargs)
+            for method in ('options', 'put'):
+                sync_response = await sync_to_async(getattr(self.client, method))(url)
+                async_response = await view(getattr(self.factory, method)(url), **kwargs)
+                self.assertMatchesSyncView(sync_response, async_response)
+                self.assertEqual(async_response['Allow'], sync_response['Allow'])
+
+    async def test_loan_views_match_sync_views(self):
+        cases = [
+            ('view_loan', async_views.view_loan, {'loan_id': self.loan.loan_id}),
+            ('view_loan', async_views.view_loan, {'loan_id': 999999}),
+            ('view_loans_by_customer', async_views.view_loans_by_customer, {'customer_id': self.customer.customer_id}),
+            ('view_loans_by_customer', async_views.view_loans_by_customer, {'customer_id': 999999}),
+        ]
+        for name, view, kwargs in cases:
+            url = reverse(name, kwargs=kwargs)
+            sync_response = await sync_to_async(self.client.get)(url)
+            self.assertMatchesSyncView(sync_response, await view(self.factory.get(url), **kwargs))
+
+    async def test_loan_list_pages_match_sync_view(self):
+        await Loan.objects.acreate(
+            customer=self.customer, loan_amount=Decimal('50000'), tenure=12, interest_rate=Decimal('9'),
+            monthly_repayment=Decimal('4372.63'), emis_paid_on_time=3, start_date=date(2022, 1, 1),
+            end_date=date(2023, 1, 1), is_active=True
+        )
+        url = reverse('view_loans_by_customer', kwargs={'customer_id': self.customer.customer_id})
+        for params in ({'page_size': 1, 'ordering': '-repayments_left'}, {'ordering': 'bogus'}):
+            sync_response = await sync_to_async(self.client.get)(url, params)
+            async_response = await async_views.view_loans_by_customer(
+                self.factory.get(url, params), customer_id=self.customer.customer_id
+            )
+            self.assertMatchesSyncView(sync_response, async_response)
+            self.assertEqual(async_response.get('Link'), sync_response.get('Link'))
+
+    def test_async_eligibility_fetches_profile_with_customer(self):
+        args = (self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        # The first call builds the missing profile
+        first = async_to_sync(acheck_loan_eligibility)(*args)
+        with self.assertNumQueries(1):
+            second = async_to_sync(acheck_loan_eligibility)(*args)
+        self.assertEqual(first, second)
+        self.assertEqual(second, check_loan_eligibility(*args))
+
+    @override_settings(CACHES=LOCMEM_CACHES, ELIGIBILITY_CACHE_ENABLED=True)
+    async def test_async_eligibility_uses_shared_cache(self):
+        eligibility_cache._bypass_until = 0.0
+        try:
+            args = (self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+            first = await eligibility_cache.acached_check_loan_eligibility(*args)
+            second = await sync_to_async(eligibility_cache.cached_check_loan_eligibility)(*args)
+            self.assertEqual(first, second)
+            self.assertEqual(eligibility_cache.eligibility_cache_stats(), {'hits': 1, 'misses': 1})
+        finally:
+            eligibility_cache.cache.clear()
+
+
+class LoanListPaginationTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Corporate",
+            last_name="User",
+            age=45,
+            phone_number="8383838383",
+            monthly_salary=Decimal('900000'),
+            approved_limit=Decimal('32400000'),
+            current_debt=Decimal('0')
+        )
+        for i in range(23):
+            Loan.objects.create(
+                customer=self.customer,
+                loan_amount=Decimal('10000') * (i % 5 + 1),
+                tenure=12 + i % 4 * 12,
+                interest_rate=Decimal('8.5') + i % 7,
+                monthly_repayment=Decimal('1000'),
+                emis_paid_on_time=i % 13,
+                start_date=date(2022, 1, 1),
+                end_date=date(2030, 1, 1),
+                is_active=i % 6 != 5
+            )
+        self.url = reverse('view_loans_by_customer', kwargs={'customer_id': self.customer.customer_id})
+        self.active = list(Loan.objects.filter(customer=self.customer, is_active=True))
+
+    def fetch_all(self, **params):
+        rows, cursor, pages = [], None, 0
+        while True:
+            query = dict(params, cursor=cursor) if cursor else params
+            response = self.client.get(self.url, query)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            rows.extend(response.data)
+            pages += 1
+            cursor = response.get('X-Next-Cursor')
+            if cursor is None:
+                return rows, pages
+            self.assertIn(f'cursor={cursor}', response['Link'])
+
+    def test_pages_cover_every_loan_in_order(self):
+        keys = {
+            'loan_id': lambda loan: loan.loan_id,
+            'loan_amount': lambda loan: loan.loan_amount,
+            'interest_rate': lambda loan: loan.interest_rate,
+            'repayments_left': lambda loan: loan.repayments_left,
+        }
+        for field, key in keys.items():
+            for descending in (False, True):
+                expected = sorted(self.active, key=lambda loan: (key(loan), loan.loan_id), reverse=descending)
+                rows, pages = self.fetch_all(ordering=f"{'-' if descending else ''}{field}", page_size=4)
+                self.assertEqual([row['loan_id'] for row in rows], [loan.loan_id for loan in expected])
+                self.assertEqual(pages, 5)
+
+    def test_filters(self):
+        rows, _ = self.fetch_all(min_amount='20000', max_amount='40000', min_repayments_left=10, max_rate='12.5')
+        expected = [
+            loan.loan_id for loan in self.active
+            if Decimal('20000') <= loan.loan_amount <= Decimal('40000')
+            and loan.repayments_left >= 10 and loan.interest_rate <= Decimal('12.5')
+        ]
+        self.assertTrue(expected)
+        self.assertEqual(sorted(row['loan_id'] for row in rows), sorted(expected))
+
+    @override_settings(VIEW_LOANS_PAGE_SIZE=5, VIEW_LOANS_MAX_PAGE_SIZE=10)
+    def test_page_size_default_and_cap(self):
+        self.assertEqual(len(self.client.get(self.url).data), 5)
+        self.assertEqual(len(self.client.get(self.url, {'page_size': 500}).data), 10)
+
+    def test_invalid_parameters(self):
+        cursor = self.client.get(self.url, {'page_size': 2})['X-Next-Cursor']
+        for params in ({'cursor': 'not-a-cursor'}, {'cursor': cursor, 'ordering': '-loan_amount'},
+                       {'ordering': 'tenure'}, {'page_size': 0}):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            first_name="Dashboard",
+            last_name="User",
+            age=39,
+            phone_number="8484848484",
+            monthly_salary=Decimal('70000'),
+            approved_limit=Decimal('2500000'),
+            current_debt=Decimal('0')
+        )
+        self.loan = Loan.objects.create(
+            customer=self.customer,
+            loan_amount=Decimal('90000'),
+            tenure=12,
+            interest_rate=Decimal('10'),
+            monthly_repayment=Decimal('7912.46'),
+            emis_paid_on_time=4,
+            start_date=date(2023, 1, 1),
+            end_date=date(2024, 1, 1),
+            is_active=True
+        )
+        self.loan_url = reverse('view_loan', kwargs={'loan_id': self.loan.loan_id})
+        self.list_url = reverse('view_loans_by_customer', kwargs={'customer_id': self.customer.customer_id})
+
+    def test_unchanged_resources_are_not_modified(self):
+        for url in (self.loan_url, self.list_url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn('no-cache', response['Cache-Control'])
+            with self.assertNumQueries(1):
+                not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+            self.assertEqual(not_modified.content, b'')
+            self.assertEqual(not_modified['ETag'], response['ETag'])
+
+        response = self.client.get(self.loan_url)
+        not_modified = self.client.get(self.loan_url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_is_validated_by_etag_only(self):
+        newer = Loan.objects.create(
+            customer=self.customer, loan_amount=Decimal('1000'), tenure=6, interest_rate=Decimal('9'),
+            monthly_repayment=Decimal('171'), start_date=date(2024, 1, 1), end_date=date(2024, 7, 1)
+        )
+        response = self.client.get(self.list_url)
+        self.assertFalse(response.has_header('Last-Modified'))
+
+        # Expiring the most recently updated loan moves MAX(updated_at) of the active loans back
+        Loan.objects.filter(pk=newer.pk).update(is_active=False, updated_at=timezone.now())
+        response = self.client.get(self.list_url, HTTP_IF_MODIFIED_SINCE=http_date(time.time() + 3600))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['loan_id'] for row in response.data], [self.loan.loan_id])
+
+    def test_changes_produce_new_etags(self):
+        loan_etag = self.client.get(self.loan_url)['ETag']
+        list_etag = self.client.get(self.list_url)['ETag']
+
+        # The detail response includes the customer's name, the list does not
+        self.customer.first_name = "Renamed"
+        self.customer.save()
+        response = self.client.get(self.loan_url, HTTP_IF_NONE_MATCH=loan_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['customer']['first_name'], "Renamed")
+        self.assertNotEqual(response['ETag'], loan_etag)
+        self.assertEqual(self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag).status_code, status.HTTP_304_NOT_MODIFIED)
+
+        # Another page or ordering is another representation
+        response = self.client.get(self.list_url, {'ordering': '-loan_id'}, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        Loan.objects.filter(pk=self.loan.pk).update(emis_paid_on_time=F('emis_paid_on_time') + 1, updated_at=timezone.now())
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]['repayments_left'], 7)
+
+        # A deleted loan changes the count even though MAX(updated_at) stays the same
+        newer = Loan.objects.create(
+            customer=self.customer, loan_amount=Decimal('1000'), tenure=6, interest_rate=Decimal('9'),
+            monthly_repayment=Decimal('171'), start_date=date(2024, 1, 1), end_date=date(2024, 7, 1)
+        )
+        list_etag = self.client.get(self.list_url)['ETag']
+        Loan.objects.filter(pk=self.loan.pk).delete()
+        response = self.client.get(self.list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['loan_id'] for row in response.data], [newer.loan_id])
+
+    def test_missing_resources_are_not_validated(self):
+        response = self.client.get(reverse('view_loan', kwargs={'loan_id': 999999}), HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(response.has_header('ETag'))
+
+    async def test_async_views(self):
+        factory = AsyncRequestFactory()
+        sync_response = await sync_to_async(self.client.get)(self.list_url)
+        response = await async_views.view_loans_by_customer(
+            factory.get(self.list_url), customer_id=self.customer.customer_id
+        )
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        response = await async_views.view_loan(
+            factory.get(self.loan_url, headers={'If-None-Match': response['ETag']}), loan_id=self.loan.loan_id
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = await async_views.view_loan(
+            factory.get(self.loan_url, headers={'If-None-Match': response['ETag']}), loan_id=self.loan.loan_id
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+
+class FastSerializerTest(TestCase):
+    def setUp(self):
+        customer = Customer.objects.create(
+            first_name="Fäst",
+            last_name="Path",
+            age=52,
+            phone_number="8484848484",
+            monthly_salary=Decimal('70000'),
+            approved_limit=Decimal('2500000'),
+            current_debt=Decimal('0')
+        )
+        for amount, rate, repayment, tenure, paid in [
+            ('100000', '10', '8791.59', 12, 3),
+            ('12345.6', '7.25', '1070.1', 12, 15),
+            ('9999999999.99', '999.99', '0.01', 360, 0),
+        ]:
+            Loan.objects.create(
+                customer=customer,
+                loan_amount=Decimal(amount),
+                tenure=tenure,
+                interest_rate=Decimal(rate),
+                monthly_repayment=Decimal(repayment),
+                emis_paid_on_time=paid,
+                start_date=date(2020, 1, 1),
+                end_date=date(2021, 1, 1)
+            )
+
+    def test_output_is_byte_identical_to_drf_serializers(self):
+        renderer = JSONRenderer()
+        for loan in Loan.objects.select_related('customer'):
+            row = with_remaining_repayments(Loan.objects.filter(pk=loan.pk)).values(*LOAN_DETAIL_COLUMNS).get()
+            self.assertEqual(
+                renderer.render(build_loan_detail(row)), renderer.render(LoanDetailSerializer(loan).data)
+            )
+
+        loans = Loan.objects.order_by('loan_id')
+        rows = with_remaining_repayments(loans).values(*LOAN_LIST_COLUMNS)
+        self.assertEqual(
+            renderer.render([build_loan_list_item(row) for row in rows]),
+            renderer.render(LoanListSerializer(loans, many=True).data)
+        )
+
+
+ORJSON_REST_FRAMEWORK = {
+    'DEFAULT_RENDERER_CLASSES': ['loans.renderers.ORJSONRenderer'],
+    'DEFAULT_PARSER_CLASSES': ['loans.renderers.ORJSONParser'],
+}
+
+
+@unittest.skipIf(renderers.orjson is None, 'orjson is not installed')
+class ORJSONRendererTest(APITestCase):
+    def test_matches_stock_renderer(self):
+        serializer = LoanEligibilitySerializer(data={'customer_id': 'x', 'tenure': 12})
+        serializer.is_valid()
+        samples = [
+            LoanEligibilityResponseSerializer({
+                'customer_id': 1, 'approval': True, 'interest_rate': Decimal('10.5'),
+                'corrected_interest_rate': Decimal('12'), 'tenure': 12,
+                'monthly_installment': Decimal('8884.878'),
+            }).data,
+            serializer.errors,
+            {'name': 'Fäst\u2028Path', 'when': timezone.now(), 'day': date(2024, 2, 29), 'ratio': 0.1, 'none': None},
+            [{'nested': [1, 2.5, True]}],
+        ]
+        for data in samples:
+            self.assertEqual(renderers.ORJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_decimals_are_rendered_exactly(self):
+        rendered = renderers.ORJSONRenderer().render({'amount': Decimal('12345678901234.57')})
+        self.assertEqual(rendered, b'{"amount":"12345678901234.57"}')
+
+    def test_parser(self):
+        parser = renderers.ORJSONParser()
+        self.assertEqual(parser.parse(BytesIO(b'{"loan_amount": 100000.5}')), {'loan_amount': 100000.5})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"loan_amount": NaN}'))
+
+    def test_endpoints_render_identically(self):
+        customer = Customer.objects.create(
+            first_name="Render", last_name="User", age=30, phone_number="8585858585",
+            monthly_salary=Decimal('60000'), approved_limit=Decimal('2200000'), current_debt=Decimal('0')
+        )
+        loan = Loan.objects.create(
+            customer=customer, loan_amount=Decimal('75000'), tenure=18, interest_rate=Decimal('11.25'),
+            monthly_repayment=Decimal('4560.31'), emis_paid_on_time=4, start_date=date(2023, 1, 1),
+            end_date=date(2024, 7, 1)
+        )
+        url = reverse('view_loan', kwargs={'loan_id': loan.loan_id})
+        stock = self.client.get(url).content
+        with override_settings(REST_FRAMEWORK=ORJSON_REST_FRAMEWORK):
+            fast = self.client.get(url).content
+            invalid = self.client.post(reverse('check_eligibility'), '{"customer_id":', content_type='application/json')
+        self.assertEqual(fast, stock)
+        self.assertEqual(invalid.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class EligibilityBatchTest(APITestCase):
+    def setUp(self):
+        self.customers = []
+        for i in range(6):
+            customer = Customer.objects.create(
+                first_name="Batch",
+                last_name=f"User{i}",
+                age=30,
+                phone_number=f"90000000{i:02d}",
+                monthly_salary=Decimal('20000') * (i + 1),
+                approved_limit=Decimal('700000') * (i + 1),
+                current_debt=Decimal('0')
+            )
+            for j in range(i):
+                Loan.objects.create(
+                    customer=customer,
+                    loan_amount=Decimal('150000'),
+                    tenure=24,
+                    interest_rate=Decimal('11'),
+                    monthly_repayment=Decimal('6991.00'),
+                    emis_paid_on_time=12 + j,
+                    start_date=date(2020 + j, 3, 1),
+                    end_date=date(2022 + j, 3, 1),
+                    is_active=j % 2 == 0
+                )
+            self.customers.append(customer)
+
+    def applications(self, count):
+        return [
+            {
+                'customer_id': self.customers[i % len(self.customers)].customer_id,
+                'loan_amount': 50000 * (i % 4 + 1),
+                'interest_rate': 8 + i % 9,
+                'tenure': 6 * (i % 5 + 1)
+            }
+            for i in range(count)
+        ]
+
+    def test_batch_matches_single_endpoint(self):
+        applications = self.applications(20) + [
+            {'customer_id': 999999, 'loan_amount': 1000, 'interest_rate': 10, 'tenure': 12}
+        ]
+        response = self.client.post(reverse('check_eligibility_batch'), applications, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), len(applications))
+        for application, item in zip(applications, response.data):
+            single = self.client.post(reverse('check_eligibility'), application, format='json')
+            self.assertEqual(dict(item), dict(single.data))
+
+    def test_query_count_is_independent_of_batch_size(self):
+        url = reverse('check_eligibility_batch')
+        self.client.post(url, self.applications(6), format='json')  # builds profiles
+        with self.assertNumQueries(1):
+            self.client.post(url, self.applications(5), format='json')
+        with self.assertNumQueries(1):
+            self.client.post(url, self.applications(200), format='json')
+
+    @override_settings(ELIGIBILITY_BATCH_MAX_SIZE=3)
+    def test_rejects_oversized_and_invalid_batches(self):
+        url = reverse('check_eligibility_batch')
+        response = self.client.post(url, self.applications(4), format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(url, [{'customer_id': 1}], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LoanScheduleTest(APITestCase):
+    def setUp(self):
+        customer = Customer.objects.create(
+            first_name="Schedule",
+            last_name="User",
+            age=41,
+            phone_number="8585858585",
+            monthly_salary=Decimal('90000'),
+            approved_limit=Decimal('3200000'),
+            current_debt=Decimal('0')
+        )
+        self.loan = Loan.objects.create(
+            customer=customer,
+            loan_amount=Decimal('100000'),
+            tenure=12,
+            interest_rate=Decimal('12'),
+            monthly_repayment=Decimal('8884.88'),
+            emis_paid_on_time=3,
+            start_date=date(2024, 1, 31),
+            end_date=date(2025, 1, 31),
+            is_active=True
+        )
+        self.url = reverse('loan_schedule', kwargs={'loan_id': self.loan.loan_id})
+
+    def test_schedule_is_computed_once_and_stored(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertEqual(data['monthly_installment'], '8884.88')
+        self.assertEqual(len(data['schedule']), 12)
+        self.assertEqual(data['schedule'][0], {
+            'installment': 1, 'due_date': '2024-02-29', 'emi': '8884.88',
+            'principal': '7884.88', 'interest': '1000.00', 'balance': '92115.12',
+        })
+        self.assertEqual(data['schedule'][-1]['balance'], '0.00')
+        self.assertEqual(sum(Decimal(row['principal']) for row in data['schedule']), Decimal('100000'))
+        self.assertEqual(data['total_interest'], str(sum(Decimal(row['interest']) for row in data['schedule'])))
+
+        stored = LoanSchedule.objects.get(loan=self.loan)
+        self.assertEqual(len(bytes(stored.balance)), 12 * 8)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_schedule(self.loan.loan_id), data)
+
+    def test_changed_terms_recompute_the_schedule(self):
+        self.client.get(self.url)
+        Loan.objects.filter(pk=self.loan.pk).update(tenure=24, updated_at=timezone.now())
+        data = self.client.get(self.url).json()
+        self.assertEqual(len(data['schedule']), 24)
+        self.assertEqual(LoanSchedule.objects.get(loan=self.loan).tenure, 24)
+
+        self.loan.delete()
+        self.assertFalse(LoanSchedule.objects.exists())
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_installment_matches_view_loan(self):
+        # An ingested loan whose file EMI is not the amortized one
+        Loan.objects.filter(pk=self.loan.pk).update(monthly_repayment=Decimal('8885.00'))
+        detail = self.client.get(reverse('view_loan', kwargs={'loan_id': self.loan.loan_id})).json()
+        data = self.client.get(self.url).json()
+        self.assertEqual(data['monthly_installment'], detail['monthly_repayment'])
+        self.assertEqual(data['monthly_installment'], '8885.00')
+        self.assertEqual(data['schedule'][0]['emi'], '8884.88')
+        self.assertEqual(get_schedule(self.loan.loan_id)['monthly_installment'], '8885.00')
+
+    def test_concurrent_first_reads_store_one_schedule(self):
+        computed = []
+
+        def compute_while_another_read_stores(*args):
+            # Another first read stores its copy between this read's lookup and its upsert
+            computed.append(compute_schedule(*args))
+            if len(computed) == 1:
+                self.assertEqual(get_schedule(self.loan.loan_id)['tenure'], 12)
+            return computed[-1]
+
+        with unittest.mock.patch('loans.schedules.compute_schedule', side_effect=compute_while_another_read_stores):
+            first = get_schedule(self.loan.loan_id)
+        self.assertEqual(len(computed), 2)
+        self.assertEqual(LoanSchedule.objects.filter(loan=self.loan).count(), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(get_schedule(self.loan.loan_id), first)
+
+
+class VectorizedEMITest(TestCase):
+    def test_matches_scalar_function_to_the_paisa(self):
+        amounts = [1000 + 7919 * i for i in range(500)]
+        rates = [round(0.25 + (i * 0.37) % 24, 2) for i in range(500)]
+        tenures = [1 + (i * 13) % 360 for i in range(500)]
+        emis = monthly_installments(amounts, rates, tenures)
+        for amount, rate, tenure, emi in zip(amounts, rates, tenures, emis):
+            expected = calculate_monthly_installment(Decimal(amount), Decimal(str(rate)), tenure)
+            self.assertEqual(Decimal(str(emi)), expected.quantize(Decimal('0.01')))
+
+    def test_scalar_inputs_broadcast(self):
+        self.assertAlmostEqual(float(monthly_installments(100000, 12, 12)), 8884.88, places=2)
+        self.assertEqual(list(monthly_installments([100000, 200000], 12, 12)), [8884.88, 17769.76])
+        self.assertAlmostEqual(float(total_interest(100000, 12, 12)), 6618.56, places=2)
+
+    def test_schedules_close_at_zero(self):
+        schedules = amortization_schedules([100000, 50000, 250000], [12, 0, 9.5], [12, 5, 36])
+        self.assertEqual(list(schedules.emi), [888488, 1000000, 800824])
+        self.assertEqual(list(schedules.principal.sum(axis=1)), [10000000, 5000000, 25000000])
+        for row, tenure in enumerate(schedules.tenure):
+            self.assertEqual(schedules.balance[row, tenure - 1], 0)
+            self.assertTrue((schedules.interest[row, tenure:] == 0).all())
+        self.assertEqual(schedules.interest[0, 0], 100000)  # 1% of the opening balance
+
+
+@override_settings(INGEST_PARQUET_CACHE=False)
+class CustomerIngestTest(TestCase):
+    def customer_frame(self, ids, salary=50000):
+        return pd.DataFrame({
+            'Customer ID': ids,
+            'First Name': [f'First{i}' for i in ids],
+            'Last Name': [f'Last{i}' for i in ids],
+            'Age': [30 for _ in ids],
+            'Phone Number': [9100000000 + i for i in ids],
+            'Monthly Salary': [salary for _ in ids],
+            'Approved Limit': [36 * salary for _ in ids],
+        })
+
+    def test_bulk_upsert_counts_and_values(self):
+        created, updated = upsert_customers(self.customer_frame([1, 2, 3]), batch_size=2)
+        self.assertEqual((created, updated), (3, 0))
+
+        created, updated = upsert_customers(self.customer_frame([2, 3, 4, 4], salary=80000), batch_size=2)
+        self.assertEqual((created, updated), (1, 3))
+        self.assertEqual(Customer.objects.count(), 4)
+        customer = Customer.objects.get(customer_id=3)
+        self.assertEqual(customer.monthly_salary, Decimal('80000'))
+        self.assertEqual(customer.phone_number, '9100000003')
+        self.assertEqual(Customer.objects.get(customer_id=1).monthly_salary, Decimal('50000'))
+
+    def test_missing_age_defaults(self):
+        upsert_customers(self.customer_frame([7]).drop(columns=['Age']))
+        self.assertEqual(Customer.objects.get(customer_id=7).age, 25)
+
+    def test_ingest_customer_file(self):
+        result = ingest_customer_data()
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['customers_created'], result['total_processed'])
+        self.assertEqual(Customer.objects.count(), result['total_processed'])
+
+
+@override_settings(INGEST_PARQUET_CACHE=False)
+class LoanIngestTest(TestCase):
+    def setUp(self):
+        for customer_id in (1, 2):
+            Customer.objects.create(
+                customer_id=customer_id,
+                first_name="Ingest",
+                last_name=f"User{customer_id}",
+                age=30,
+                phone_number=f"920000000{customer_id}",
+                monthly_salary=Decimal('50000'),
+                approved_limit=Decimal('1800000')
+            )
+
+    def loan_frame(self, rows):
+        return pd.DataFrame(rows, columns=[
+            'Customer ID', 'Loan ID', 'Loan Amount', 'Tenure', 'Interest Rate',
+            'Monthly payment', 'EMIs paid on Time', 'Date of Approval', 'End Date'
+        ])
+
+    def test_rejects_are_reported_not_written(self):
+        df = self.loan_frame([
+            [1, 10, 100000, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+            [3, 11, 100000, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+            [2, 12, None, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+            [2, 13, 100000, 12, 10.5, 8815, 12, 'not a date', '2020-01-05'],
+        ])
+        loans, rejects = prepare_loan_frame(df)
+        self.assertEqual(list(loans['Loan ID']), [10])
+        self.assertEqual(
+            sorted((reject['row'], reject['loan_id'], reject['reason']) for reject in rejects),
+            [
+                (3, 11, 'customer not found'),
+                (4, 12, 'missing or invalid value'),
+                (5, 13, 'missing or invalid value'),
+            ]
+        )
+
+    @override_settings(INGEST_BATCH_SIZE=1)
+    def test_customer_check_queries_only_referenced_ids(self):
+        df = self.loan_frame([
+            [1, 30, 100000, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+            [5000000, 31, 100000, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+            [1, 32, 100000, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+        ])
+        with CaptureQueriesContext(connection) as queries:
+            loans, rejects = prepare_loan_frame(df)
+        self.assertEqual(list(loans['Loan ID']), [30, 32])
+        self.assertEqual([reject['loan_id'] for reject in rejects], [31])
+        # One lookup per batch of distinct IDs, never a range scan between them
+        self.assertEqual(len(queries), 2)
+        self.assertTrue(all(' IN (' in query['sql'] for query in queries))
+
+    def test_upsert_values_counts_and_profiles(self):
+        future = (date.today() + timedelta(days=400)).isoformat()
+        df = self.loan_frame([
+            [1, 20, 100000, 12, 10.5, 8815, 12, '2019-01-05', '2020-01-05'],
+            [1, 21, 200000, 24, 12.25, 9415, 3, '2024-06-01', future],
+            [2, 21, 300000, 36, 9.0, 9540, 5, '2024-06-01', future],
+        ])
+        loans, rejects = prepare_loan_frame(df)
+        self.assertEqual(upsert_loans(loans, batch_size=1), (2, 1))
+
+        loan = Loan.objects.get(loan_id=21)
+        self.assertEqual(loan.customer_id, 2)  # last row wins
+        self.assertEqual(loan.interest_rate, Decimal('9.00'))
+        self.assertEqual(loan.start_date, date(2024, 6, 1))
+        self.assertTrue(loan.is_active)
+        self.assertFalse(Loan.objects.get(loan_id=20).is_active)
+
+        self.assertEqual(CustomerCreditProfile.objects.get(customer_id=1).loan_count, 1)
+        profile = CustomerCreditProfile.objects.get(customer_id=2)
+        self.assertEqual(profile.active_principal, Decimal('300000'))
+
+    def test_ingest_loan_file(self):
+        ingest_customer_data()
+        result = ingest_loan_data()
+        self.assertEqual(result['status'], 'success')
+        self.assertEqual(result['loans_rejected'], 0)
+        self.assertEqual(result['loans_created'] + result['loans_updated'], result['total_processed'])
+        self.assertEqual(Loan.objects.count(), result['loans_created'])
+
+
+@override_settings(CELERY_TASK_ALWAYS_EAGER=True, INGEST_PARQUET_CACHE=False)
+class ParallelIngestTest(TestCase):
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by('customer_id').values_list('customer_id', 'phone_number', 'approved_limit')),
+            list(Loan.objects.order_by('loan_id').values_list('loan_id', 'customer_id', 'loan_amount', 'is_active')),
+            list(CustomerCreditProfile.objects.filter(loan_count__gt=0).order_by('customer_id').values_list(
+                'customer_id', 'loan_count', 'active_principal', 'loans_per_year'
+            )),
+        )
+
+    def test_parallel_ingest_matches_serial_ingest(self):
+        serial = ingest_all_data()
+        serial_rows = self.snapshot()
+        Customer.objects.all().delete()
+
+        parallel = ingest_all_data_parallel(chunk_size=100)
+        self.assertEqual(self.snapshot(), serial_rows)
+        self.assertEqual(parallel['customer_ingestion'], serial['customer_ingestion'])
+        self.assertEqual(parallel['loan_ingestion'], serial['loan_ingestion'])
+
+    def test_loan_chunk_updates_profiles_with_its_loans(self):
+        ingest_customer_data()
+        result = ingest_loan_chunk(os.path.join(settings.BASE_DIR, 'loan_data.xlsx'), 0, 100)
+        self.assertEqual(result['status'], 'success')
+        profiles = self.snapshot()[2]
+        self.assertTrue(profiles)
+        # No chord callback ran, yet the profiles already count the chunk's loans
+        rebuild_profiles()
+        self.assertEqual(self.snapshot()[2], profiles)
+
+    def test_chunks_rebuild_only_touched_customers(self):
+        bystander = Customer.objects.create(
+            customer_id=10 ** 6, first_name="Not", last_name="InFile", age=40, phone_number="8181818181",
+            monthly_salary=Decimal('50000'), approved_limit=Decimal('1800000'), current_debt=Decimal('0')
+        )
+        CustomerCreditProfile.objects.create(customer=bystander, loan_count=7)
+
+        result = ingest_all_data_parallel(chunk_size=100)
+        self.assertEqual(result['loan_ingestion']['status'], 'success')
+        self.assertEqual(CustomerCreditProfile.objects.get(customer=bystander).loan_count, 7)
+        self.assertGreater(CustomerCreditProfile.objects.filter(loan_count__gt=0).count(), 1)
+
+    def test_ingest_command_accepts_workers(self):
+        out = StringIO()
+        call_command('ingest_data', workers=3, stdout=out)
+        self.assertIn("'customers_created': 300", out.getvalue())
+        self.assertIn("'loans_rejected': 0", out.getvalue())
+
+
+class SyntheticDataTest(TestCase):
+    def test_generated_loans_are_consistent(self):
+        batches = list(generate_batches(40, 3, 15, seed=7, today=date(2024, 6, 15)))
+        self.assertEqual([len(customers) for customers, _ in batches], [15, 15, 10])
+        customers = pd.concat([customers for customers, _ in batches])
+        loans = pd.concat([loans for _, loans in batches])
+        self.assertEqual(customers['Customer ID'].tolist(), list(range(1, 41)))
+        self.assertEqual(loans['Loan ID'].tolist(), list(range(1, 121)))
+        self.assertTrue(customers['Phone Number'].is_unique)
+        self.assertTrue((loans['EMIs paid on Time'] <= loans['Tenure']).all())
+
+        for loan in loans.head(20).itertuples(index=False):
+            emi = calculate_monthly_installment(Decimal(str(loan[2])), Decimal(str(loan[4])), loan[3])
+            self.assertEqual(Decimal(str(loan[5])), emi.quantize(Decimal('0.01')))
+            start = loan[7].date()
+            months = start.month - 1 + loan[3]
+            self.assertEqual(loan[8].date().replace(day=1), date(start.year + months // 12, months % 12 + 1, 1))
+
+        again = next(generate_batches(40, 3, 15, seed=7, today=date(2024, 6, 15)))
+        self.assertTrue(again[1].equals(batches[0][1]))
+
+    def test_database_output_matches_rebuilt_profiles(self):
+        Customer.objects.create(
+            first_name="Existing", last_name="User", age=30, phone_number="9000000001",
+            monthly_salary=Decimal('50000'), approved_limit=Decimal('1800000')
+        )
+        call_command('generate_synthetic_data', customers=30, loans_per_customer=4, chunk_size=8, stdout=StringIO())
+        self.assertEqual(Customer.objects.count(), 31)
+        self.assertEqual(Loan.objects.count(), 120)
+
+        generated = {
+            profile.customer_id: profile.score_inputs(date.today().year)
+            for profile in CustomerCreditProfile.objects.all()
+        }
+        self.assertEqual(len(generated), 30)
+        rebuild_profiles(list(generated))
+        for profile in CustomerCreditProfile.objects.all():
+            self.assertEqual(generated[profile.customer_id], profile.score_inputs(date.today().year))
+
+    def test_file_output_can_be_ingested(self):
+        with tempfile.TemporaryDirectory() as directory:
+            call_command(
+                'generate_synthetic_data', customers=12, loans_per_customer=2, format='xlsx',
+                output_dir=directory, stdout=StringIO()
+            )
+            customer_result = ingest_customer_data(os.path.join(directory, 'customer_data.xlsx'))
+            loan_result = ingest_loan_data(os.path.join(directory, 'loan_data.xlsx'))
+        self.assertEqual(customer_result['customers_created'], 12)
+        self.assertEqual((loan_result['loans_created'], loan_result['loans_rejected']), (24, 0))
+        monthly_repayments = set(Loan.objects.values_list('monthly_repayment', flat=True))
+        self.assertTrue(all(value == value.quantize(Decimal('0.01')) for value in monthly_repayments))
+
+    def test_unsupported_sizes(self):
+        with self.assertRaises(CommandError):
+            call_command('generate_synthetic_data', customers=2_000_000, format='xlsx', stdout=StringIO())
+
+
+class IncrementalIngestTest(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.customer_file = os.path.join(self.tempdir.name, 'customers.xlsx')
+        self.loan_file = os.path.join(self.tempdir.name, 'loans.xlsx')
+        self.customers = pd.read_excel(os.path.join(settings.BASE_DIR, 'customer_data.xlsx')).head(20)
+        self.loans = pd.read_excel(os.path.join(settings.BASE_DIR, 'loan_data.xlsx'))
+        self.loans = self.loans[self.loans['Customer ID'].isin(self.customers['Customer ID'])]
+        self.customers.to_excel(self.customer_file, index=False)
+        self.loans.to_excel(self.loan_file, index=False)
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_unchanged_files_are_skipped(self):
+        first = ingest_customer_data(self.customer_file, incremental=True)
+        self.assertEqual(first['customers_created'], 20)
+        loans_first = ingest_loan_data(self.loan_file, incremental=True)
+        self.assertEqual(loans_first['loans_created'], Loan.objects.count())
+
+        second = ingest_customer_data(self.customer_file, incremental=True)
+        loans_second = ingest_loan_data(self.loan_file, incremental=True)
+        self.assertTrue(second['source_unchanged'])
+        self.assertTrue(loans_second['source_unchanged'])
+
+    def test_only_changed_rows_are_written(self):
+        ingest_customer_data(self.customer_file, incremental=True)
+        ingest_loan_data(self.loan_file, incremental=True)
+
+        self.customers.loc[self.customers.index[3], 'Monthly Salary'] = 123000
+        self.customers.to_excel(self.customer_file, index=False)
+        result = ingest_customer_data(self.customer_file, incremental=True)
+        self.assertEqual(result['customers_updated'], 1)
+        self.assertEqual(result['customers_unchanged'], 19)
+        customer_id = int(self.customers['Customer ID'].iloc[3])
+        self.assertEqual(Customer.objects.get(customer_id=customer_id).monthly_salary, Decimal('123000'))
+
+        loan_id = int(self.loans['Loan ID'].iloc[0])
+        self.loans.loc[self.loans.index[0], 'EMIs paid on Time'] = 1
+        self.loans.to_excel(self.loan_file, index=False)
+        result = ingest_loan_data(self.loan_file, incremental=True)
+        self.assertEqual((result['loans_created'], result['loans_updated']), (0, 1))
+        self.assertEqual(Loan.objects.get(loan_id=loan_id).emis_paid_on_time, 1)
+
+    def test_full_ingest_clears_state(self):
+        ingest_customer_data(self.customer_file, incremental=True)
+        self.assertTrue(IngestFileState.objects.filter(dataset='customers').exists())
+        ingest_customer_data(self.customer_file)
+        self.assertFalse(IngestFileState.objects.filter(dataset='customers').exists())
+        self.assertFalse(IngestRowState.objects.filter(dataset='customers').exists())
+
+
+class CopyLoadTest(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        customers = pd.read_excel(os.path.join(settings.BASE_DIR, 'customer_data.xlsx')).head(30)
+        loans = pd.read_excel(os.path.join(settings.BASE_DIR, 'loan_data.xlsx'))
+        loans = loans[loans['Customer ID'].isin(customers['Customer ID'])]
+        # A repeated customer (last row wins) and a loan for an unknown customer
+        customers = pd.concat([customers, customers.tail(1).assign(**{'Monthly Salary': 99000})])
+        loans = pd.concat([loans, loans.head(1).assign(**{'Customer ID': 999999, 'Loan ID': 999999})])
+        self.customer_file = os.path.join(self.tempdir.name, 'customers.csv')
+        self.loan_file = os.path.join(self.tempdir.name, 'loans.xlsx')
+        customers.to_csv(self.customer_file, index=False)
+        loans.to_excel(self.loan_file, index=False)
+        self.last_customer_id = int(customers['Customer ID'].iloc[-1])
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def snapshot(self):
+        return (
+            list(Customer.objects.order_by('customer_id').values_list('customer_id', 'monthly_salary', 'current_debt')),
+            list(Loan.objects.order_by('loan_id').values_list('loan_id', 'customer_id', 'monthly_repayment', 'is_active')),
+            list(CustomerCreditProfile.objects.order_by('customer_id').values_list(
+                'customer_id', 'loan_count', 'active_principal', 'loans_per_year'
+            )),
+        )
+
+    def test_copy_load_matches_ingest_tasks(self):
+        result = copy_load(self.customer_file, self.loan_file, chunk_size=7)
+        self.assertEqual(result['customer_ingestion']['customers_created'], 30)
+        self.assertEqual(result['customer_ingestion']['customers_updated'], 1)
+        self.assertEqual(result['loan_ingestion']['loans_rejected'], 1)
+        self.assertEqual(result['loan_ingestion']['rejects'][0]['loan_id'], 999999)
+        self.assertEqual(Customer.objects.get(customer_id=self.last_customer_id).monthly_salary, Decimal('99000'))
+        loaded = self.snapshot()
+
+        Customer.objects.all().delete()
+        pd.read_csv(self.customer_file).to_excel(os.path.join(self.tempdir.name, 'customers.xlsx'), index=False)
+        expected = ingest_all_data(
+            customer_file=os.path.join(self.tempdir.name, 'customers.xlsx'), loan_file=self.loan_file
+        )
+        self.assertEqual(self.snapshot(), loaded)
+        self.assertEqual(result['loan_ingestion'], expected['loan_ingestion'])
+
+    def test_ingest_command_copy_mode(self):
+        out = StringIO()
+        call_command('ingest_data', copy=True, customer_file=self.customer_file, loan_file=self.loan_file, stdout=out)
+        self.assertIn("'customers_created': 30", out.getvalue())
+        self.assertIn('Rejected row', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('ingest_data', copy=True, workers=2, stdout=StringIO())
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'COPY and sequences are PostgreSQL only')
+    def test_copy_merge_counts_and_last_row_wins(self):
+        customers = pd.read_csv(self.customer_file)
+        existing_id = int(customers['Customer ID'].iloc[0])
+        Customer.objects.create(
+            customer_id=existing_id, first_name="Before", last_name="Copy", age=30, phone_number="9000000008",
+            monthly_salary=Decimal('1'), approved_limit=Decimal('1')
+        )
+        # The first loan repeated at the end of the file with a different EMI
+        loans = pd.read_excel(self.loan_file)
+        repeated_loan_id = int(loans['Loan ID'].iloc[0])
+        loans = pd.concat([loans, loans.head(1).assign(**{'Monthly payment': 12345.67})])
+        loan_file = os.path.join(self.tempdir.name, 'loans.csv')
+        loans.to_csv(loan_file, index=False)
+        valid_loans = loans[loans['Customer ID'] != 999999]
+
+        result = copy_load(self.customer_file, loan_file, chunk_size=7)
+        customer_result, loan_result = result['customer_ingestion'], result['loan_ingestion']
+        # 31 rows for 30 customers, one of which already existed
+        self.assertEqual((customer_result['customers_created'], customer_result['customers_updated']), (29, 2))
+        self.assertEqual(loan_result['loans_created'], valid_loans['Loan ID'].nunique())
+        self.assertEqual(loan_result['loans_updated'], len(valid_loans) - valid_loans['Loan ID'].nunique())
+        self.assertEqual(loan_result['loans_rejected'], 1)
+        self.assertEqual(Customer.objects.get(customer_id=existing_id).first_name, customers['First Name'].iloc[0])
+        self.assertEqual(Customer.objects.get(customer_id=self.last_customer_id).monthly_salary, Decimal('99000'))
+        self.assertEqual(Loan.objects.get(loan_id=repeated_loan_id).monthly_repayment, Decimal('12345.67'))
+
+        again = copy_load(self.customer_file, loan_file, chunk_size=7)
+        self.assertEqual(again['customer_ingestion']['customers_created'], 0)
+        self.assertEqual(again['customer_ingestion']['customers_updated'], len(customers))
+        self.assertEqual(again['loan_ingestion']['loans_created'], 0)
+        self.assertEqual(again['loan_ingestion']['loans_updated'], len(valid_loans))
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'COPY and sequences are PostgreSQL only')
+    def test_sequences_follow_loaded_ids(self):
+        copy_load(self.customer_file, self.loan_file)
+        last_customer_id = Customer.objects.order_by('-customer_id').values_list('customer_id', flat=True)[0]
+        last_loan_id = Loan.objects.order_by('-loan_id').values_list('loan_id', flat=True)[0]
+        with connection.cursor() as cursor:
+            self.assertEqual(fix_sequences(cursor), (last_customer_id + 1, last_loan_id + 1))
+
+        customer = Customer.objects.create(
+            first_name="After", last_name="Copy", age=30, phone_number="9000000009",
+            monthly_salary=Decimal('50000'), approved_limit=Decimal('1800000')
+        )
+        self.assertEqual(customer.customer_id, last_customer_id + 1)
+        loan = Loan.objects.create(
+            customer=customer, loan_amount=Decimal('100000'), tenure=12, interest_rate=Decimal('10'),
+            monthly_repayment=Decimal('8791.59'), start_date=date(2024, 1, 1), end_date=date(2025, 1, 1)
+        )
+        self.assertEqual(loan.loan_id, last_loan_id + 1)
+
+
+class SourceFormatTest(TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.customers = pd.read_excel(os.path.join(settings.BASE_DIR, 'customer_data.xlsx')).head(40)
+        self.loans = pd.read_excel(os.path.join(settings.BASE_DIR, 'loan_data.xlsx'))
+        self.loans = self.loans[self.loans['Customer ID'].isin(self.customers['Customer ID'])].astype({'Tenure': object})
+        self.loans.loc[self.loans.index[1], 'Tenure'] = 'twelve'
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def write(self, frame, name):
+        path = os.path.join(self.tempdir.name, name)
+        if name.endswith('.csv'):
+            frame.to_csv(path, index=False)
+        elif name.endswith('.parquet'):
+            frame.astype({'Tenure': str}).to_parquet(path, index=False)
+        else:
+            frame.to_excel(path, index=False)
+        return path
+
+    def test_formats_read_alike(self):
+        expected = read_source(self.write(self.loans, 'loans.xlsx'), 'loans')
+        self.assertEqual(list(expected.columns), list(self.loans.columns[:9]))
+        self.assertEqual(str(expected['Loan ID'].dtype), 'Int64')
+        self.assertTrue(pd.isna(expected['Tenure'].iloc[1]))
+        pd.testing.assert_frame_equal(read_source(self.write(self.loans, 'loans.csv'), 'loans'), expected)
+        if sources.pyarrow is not None:
+            pd.testing.assert_frame_equal(read_source(self.write(self.loans, 'loans.parquet'), 'loans'), expected)
+
+        chunks = list(iter_source(self.write(self.loans, 'loans.csv'), 'loans', start=5, stop=30, chunk_size=10))
+        self.assertEqual([len(chunk) for chunk in chunks], [10, 10, 5])
+        pd.testing.assert_frame_equal(pd.concat(chunks), expected.iloc[5:30])
+        with self.assertRaises(ValueError):
+            read_source(os.path.join(self.tempdir.name, 'loans.json'), 'loans')
+
+    def test_csv_ingest_matches_xlsx_ingest(self):
+        ingest_customer_data(self.write(self.customers, 'customers.csv'))
+        csv_result = ingest_loan_data(self.write(self.loans, 'loans.csv'))
+        self.assertEqual(csv_result['loans_rejected'], 1)
+        loaded = list(Loan.objects.order_by('loan_id').values_list('loan_id', 'loan_amount', 'start_date', 'is_active'))
+
+        Customer.objects.all().delete()
+        ingest_customer_data(self.write(self.customers, 'customers.xlsx'))
+        xlsx_result = ingest_loan_data(self.write(self.loans, 'loans.xlsx'))
+        self.assertEqual(csv_result, xlsx_result)
+        self.assertEqual(
+            list(Loan.objects.order_by('loan_id').values_list('loan_id', 'loan_amount', 'start_date', 'is_active')),
+            loaded
+        )
+
+    @unittest.skipIf(sources.pyarrow is None, 'the Parquet cache needs pyarrow')
+    def test_xlsx_conversion_is_cached_until_the_source_changes(self):
+        source = self.write(self.customers, 'customers.xlsx')
+        cached = sources.cached_source(source, 'customers')
+        self.assertTrue(cached.endswith('.parquet'))
+        self.assertEqual(sources.cached_source(source, 'customers'), cached)
+        pd.testing.assert_frame_equal(read_source(cached, 'customers'), read_source(source, 'customers'))
+        self.assertEqual(ingest_customer_data(source)['customers_created'], 40)
+
+        os.utime(source, ns=(0, 0))
+        converted = sources.cached_source(source, 'customers')
+        self.assertNotEqual(converted, cached)
+        self.assertFalse(os.path.exists(cached))
+        with override_settings(INGEST_PARQUET_CACHE=False):
+            self.assertEqual(sources.cached_source(source, 'customers'), source)
+
+    @unittest.skipIf(sources.pyarrow is None, 'the Parquet cache needs pyarrow')
+    def test_failed_conversion_falls_back_to_the_source(self):
+        source = self.write(self.customers, 'customers.xlsx')
+        # A file where the cache directory should be, as with a read-only source directory
+        blocked = self.write(self.customers, 'blocked.csv')
+        with override_settings(INGEST_CACHE_DIR=blocked), self.assertLogs('loans.sources', 'WARNING'):
+            self.assertEqual(sources.cached_source(source, 'customers'), source)
+
+        with unittest.mock.patch.object(
+            sources.pyarrow.parquet, 'ParquetWriter', side_effect=sources.pyarrow.ArrowIOError('disk full')
+        ), self.assertLogs('loans.sources', 'WARNING'):
+            self.assertEqual(sources.cached_source(source, 'customers'), source)
+            self.assertEqual(ingest_customer_data(source)['customers_created'], 40)
+        self.assertEqual(os.listdir(os.path.join(self.tempdir.name, '.ingest_cache')), [])
+
+
+class LoanStateRefreshTest(TestCase):
+    def setUp(self):
+        self.customers = []
+        for index in range(3):
+            customer = Customer.objects.create(
+                first_name="Refresh",
+                last_name=f"User{index}",
+                age=30,
+                phone_number=f"930000000{index}",
+                monthly_salary=Decimal('60000'),
+                approved_limit=Decimal('2200000'),
+                current_debt=Decimal('999')
+            )
+            self.customers.append(customer)
+        today = date.today()
+        self.expired = Loan.objects.create(
+            customer=self.customers[0], loan_amount=Decimal('100000'), tenure=12, interest_rate=Decimal('10'),
+            monthly_repayment=Decimal('8791.59'), start_date=today - timedelta(days=400),
+            end_date=today - timedelta(days=35), is_active=True
+        )
+        self.running = Loan.objects.create(
+            customer=self.customers[0], loan_amount=Decimal('50000'), tenure=24, interest_rate=Decimal('12'),
+            monthly_repayment=Decimal('2353.67'), start_date=today - timedelta(days=30),
+            end_date=today + timedelta(days=700), is_active=True
+        )
+        Loan.objects.create(
+            customer=self.customers[2], loan_amount=Decimal('70000'), tenure=12, interest_rate=Decimal('11'),
+            monthly_repayment=Decimal('6186.80'), start_date=today - timedelta(days=370),
+            end_date=today, is_active=True
+        )
+        rebuild_profiles()
+
+    def test_expired_loans_and_debts_are_refreshed(self):
+        stale_updated_at = self.expired.updated_at
+        result = refresh_loan_state(batch_size=2)
+        self.assertEqual(result, {'loans_expired': 2, 'customers_updated': 3, 'profiles_updated': 2})
+
+        self.expired.refresh_from_db()
+        self.assertFalse(self.expired.is_active)
+        self.assertGreater(self.expired.updated_at, stale_updated_at)
+        self.assertTrue(Loan.objects.get(pk=self.running.pk).is_active)
+        self.assertEqual(
+            [customer.current_debt for customer in Customer.objects.order_by('customer_id')],
+            [Decimal('50000'), Decimal('0'), Decimal('0')]
+        )
+
+        refreshed = {
+            profile.customer_id: (profile.active_principal, profile.active_emi_total)
+            for profile in CustomerCreditProfile.objects.all()
+        }
+        rebuild_profiles()
+        self.assertEqual(refreshed, {
+            profile.customer_id: (profile.active_principal, profile.active_emi_total)
+            for profile in CustomerCreditProfile.objects.all()
+        })
+        self.assertEqual(refresh_loan_state(), {'loans_expired': 0, 'customers_updated': 0, 'profiles_updated': 0})
+
+    def test_command_and_schedule(self):
+        out = StringIO()
+        call_command('refresh_loan_state', date=(date.today() + timedelta(days=800)).isoformat(), stdout=out)
+        self.assertIn('Expired 3 loans', out.getvalue())
+        self.assertFalse(Loan.objects.filter(is_active=True).exists())
+        self.assertEqual(
+            settings.CELERY_BEAT_SCHEDULE['refresh-loan-state']['task'], 'loans.tasks.refresh_loan_state'
+        )
+
+
+@override_settings(CACHES=LOCMEM_CACHES, ELIGIBILITY_CACHE_ENABLED=True)
+class RequestMetricsTest(APITestCase):
+    def setUp(self):
+        eligibility_cache._bypass_until = 0.0
+        metrics.reset()
+        self.customer = Customer.objects.create(
+            first_name="Metrics",
+            last_name="User",
+            age=36,
+            phone_number="8383838383",
+            monthly_salary=Decimal('90000'),
+            approved_limit=Decimal('3200000'),
+            current_debt=Decimal('0')
+        )
+        self.quote = {
+            'customer_id': self.customer.customer_id,
+            'loan_amount': 100000,
+            'interest_rate': 10,
+            'tenure': 12
+        }
+
+    def tearDown(self):
+        eligibility_cache.cache.clear()
+        metrics.reset()
+
+    def server_timing(self, response):
+        return dict(
+            (entry.split(';')[0], entry) for entry in response['Server-Timing'].split(', ')
+        )
+
+    def test_server_timing_header(self):
+        url = reverse('check_eligibility')
+        with CaptureQueriesContext(connection) as queries:
+            first = self.server_timing(self.client.post(url, self.quote, format='json'))
+        self.assertIn(f'desc="{len(queries)} queries"', first['db'])
+        self.assertIn('score;dur=', first['score'])
+        self.assertIn('serialize;dur=', first['serialize'])
+        self.assertEqual(first['cache'], 'cache;desc="hits=0 misses=1"')
+        self.assertIn('total;dur=', first['total'])
+
+        second = self.server_timing(self.client.post(url, self.quote, format='json'))
+        self.assertIn('desc="0 queries"', second['db'])
+        self.assertNotIn('score', second)
+        self.assertEqual(second['cache'], 'cache;desc="hits=1 misses=0"')
+
+    def test_metrics_endpoint(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(reverse('check_eligibility'), self.quote, format='json')
+        # Read now: every request resets the connection's query log
+        query_count = len(queries)
+        self.client.post(reverse('check_eligibility'), self.quote, format='json')
+        self.client.post(reverse('create_loan'), self.quote, format='json')
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        lines = response.content.decode().splitlines()
+        self.assertIn('loans_requests_total{endpoint="check_eligibility",method="POST",status="200"} 2', lines)
+        self.assertIn('loans_requests_total{endpoint="create_loan",method="POST",status="201"} 1', lines)
+        self.assertIn(f'loans_sql_queries_total{{endpoint="check_eligibility"}} {query_count}', lines)
+        self.assertIn('loans_eligibility_cache_lookups_total{endpoint="check_eligibility",result="hit"} 1', lines)
+        self.assertIn('loans_eligibility_cache_lookups_total{endpoint="check_eligibility",result="miss"} 1', lines)
+        self.assertIn('# TYPE loans_request_duration_seconds histogram', lines)
+        self.assertIn('loans_request_duration_seconds_bucket{endpoint="check_eligibility",le="+Inf"} 2', lines)
+        self.assertIn('loans_request_duration_seconds_count{endpoint="check_eligibility"} 2', lines)
+        self.assertIn('loans_scoring_duration_seconds_count{endpoint="check_eligibility"} 1', lines)
+        self.assertIn('loans_scoring_duration_seconds_count{endpoint="create_loan"} 1', lines)
+
+    def test_histogram_buckets_are_cumulative(self):
+        request_metrics = metrics.RequestMetrics()
+        for total in (0.0005, 0.003, 0.003, 20):
+            metrics.record('view_loan', 'GET', 200, request_metrics, total)
+        lines = metrics.render_metrics().splitlines()
+        self.assertIn('loans_request_duration_seconds_bucket{endpoint="view_loan",le="0.001"} 1', lines)
+        self.assertIn('loans_request_duration_seconds_bucket{endpoint="view_loan",le="0.0025"} 1', lines)
+        self.assertIn('loans_request_duration_seconds_bucket{endpoint="view_loan",le="0.005"} 3', lines)
+        self.assertIn('loans_request_duration_seconds_bucket{endpoint="view_loan",le="10.0"} 3', lines)
+        self.assertIn('loans_request_duration_seconds_bucket{endpoint="view_loan",le="+Inf"} 4', lines)
+        self.assertIn('loans_request_duration_seconds_sum{endpoint="view_loan"} 20.0065', lines)
+
+    def test_queries_outside_requests_are_not_counted(self):
+        check_loan_eligibility(self.customer.customer_id, Decimal('100000'), Decimal('10'), 12)
+        self.assertNotIn('loans_sql_queries_total{', metrics.render_metrics())
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.post(reverse('check_eligibility'), self.quote, format='json')
+        self.assertNotIn('Server-Timing', response)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertNotIn('loans_requests_total{', metrics.render_metrics())
+
+
+class ConnectionPoolTest(APITestCase):
+    def test_cache_threads_share_one_pool(self):
+        found = []
+
+        def cache_pool():
+            found.append(caches['default']._cache._get_connection_pool(True))
+
+        threads = [threading.Thread(target=cache_pool) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        shared = redis_pool(settings.CACHES['default']['LOCATION'])
+        self.assertEqual(len(found), 4)
+        self.assertTrue(all(pool is shared for pool in found))
+        self.assertIs(redis_client().connection_pool, redis_pool(settings.REDIS_URL))
+
+    def test_cache_options_are_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SharedConnectionPool.from_url('redis://localhost:6379/0', socket_timeout=5)
+
+    def test_health_check_reports_pool_usage(self):
+        response = self.client.get(reverse('health_check'))
+        pools = response.json()['pools']
+        self.assertEqual(pools['database']['default']['conn_max_age'], settings.DATABASES['default']['CONN_MAX_AGE'])
+        self.assertIn('connections_opened', pools['database']['default'])
+        broker = redis_pool(settings.CELERY_BROKER_URL)
+        self.assertIn(broker.max_connections, [pool['max_connections'] for pool in pools['redis']])
+        # The ping's connection went back to the pool whether or not Redis answered
+        self.assertTrue(all(pool['in_use'] == 0 for pool in pools['redis']))
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'query plans are checked against PostgreSQL')
+class LoanIndexPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO customers (first_name, last_name, age, phone_number, monthly_salary,
+                                       approved_limit, current_debt, created_at, updated_at)
+                SELECT 'Plan', 'User', 30, (9000000000 + g)::text, 50000, 1800000, 0, now(), now()
+                FROM generate_series(1, 2000) g
+            """)
+            cursor.execute("""
+                INSERT INTO loans (customer_id, loan_amount, tenure, interest_rate, monthly_repayment,
+                                   emis_paid_on_time, start_date, end_date, is_active, created_at, updated_at)
+                SELECT c.customer_id, 100000, 12, 10, 8792.59, 6,
+                       DATE '2015-01-01' + (g * 37 % 3650), DATE '2016-01-01' + (g * 37 % 3650),
+                       g % 4 = 0, now(), now()
+                FROM customers c CROSS JOIN generate_series(1, 50) g
+            """)
+            cursor.execute('ANALYZE customers')
+            cursor.execute('ANALYZE loans')
+        cls.customer = Customer.objects.order_by('customer_id').last()
+
+    def loan_query_plans(self, func, *args):
+        """
+        EXPLAIN output of every SELECT on loans that func(*args) runs
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func(*args)
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                if query['sql'].startswith('SELECT') and '"loans"' in query['sql']:
+                    cursor.execute('EXPLAIN ' + query['sql'])
+                    plans.append('\n'.join(row[0] for row in cursor.fetchall()))
+        self.assertTrue(plans)
+        return plans
+
+    def test_active_sums_use_covering_index(self):
+        plan = Loan.objects.filter(customer=self.customer, is_active=True).values(
+            'loan_amount', 'monthly_repayment'
+        ).explain()
+        self.assertIn('loans_customer_active_idx', plan)
+
+    def test_credit_score_inputs_use_customer_index(self):
+        for plan in self.loan_query_plans(get_credit_score_inputs, self.customer):
+            self.assertIn('loans_customer_', plan)
+            self.assertNotIn('Seq Scan on loans', plan)
+
+    def test_profile_rebuild_uses_customer_index(self):
+        customer_ids = list(Customer.objects.order_by('customer_id').values_list('customer_id', flat=True)[:10])
+        for plan in self.loan_query_plans(rebuild_profiles, customer_ids):
+            self.assertIn('loans_customer_', plan)
+            self.assertNotIn('Seq Scan on loans', plan)
+
+
 class APITest(APITestCase):
     def test_register_customer(self):
         url = reverse('register_customer')
@@ -1,12 +1,20 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
+
+# Native async versions of the read endpoints, for deployments served through ASGI
+read_views = async_views if settings.ASYNC_VIEWS_ENABLED else views
 
 urlpatterns = [
     path('', views.health_check, name='health_check'),
     path('health/', views.health_check, name='health_check_alt'),
     path('register/', views.register_customer, name='register_customer'),
-    path('check-eligibility/', views.check_eligibility, name='check_eligibility'),
+    path('check-eligibility/', read_views.check_eligibility, name='check_eligibility'),
+    path('check-eligibility/batch/', views.check_eligibility_batch, name='check_eligibility_batch'),
     path('create-loan/', views.create_loan, name='create_loan'),
-    path('view-loan/<int:loan_id>/', views.view_loan, name='view_loan'),
-    path('view-loans/<int:customer_id>/', views.view_loans_by_customer, name='view_loans_by_customer'),
-]
\ No newline at end of file
+    path('view-loan/<int:loan_id>/', read_views.view_loan, name='view_loan'),
+    path('loan-schedule/<int:loan_id>/', views.loan_schedule, name='loan_schedule'),
+    path('view-loans/<int:customer_id>/', read_views.view_loans_by_customer, name='view_loans_by_customer'),
+    # No trailing slash: the default metrics_path of a Prometheus scrape config
+    path('metrics', views.metrics, name='metrics'),
+]
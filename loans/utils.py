@@ -1,13 +1,44 @@
 import math
 from decimal import Decimal
 from datetime import datetime, date
-from django.db.models import Sum, Q
-from .models import Customer, Loan
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Sum, Q
+from .models import Customer, Loan, CustomerCreditProfile
+from .profiles import build_profile, build_profiles
+from .metrics import timed
 
 
-def calculate_credit_score(customer):
+def get_credit_score_inputs(customer):
     """
-    Calculate credit score based on historical loan data
+    Fetch every credit score input for a customer in one aggregate query
+    """
+    current_year = datetime.now().year
+    inputs = Loan.objects.filter(customer=customer).aggregate(
+        loan_count=Count('loan_id'),
+        total_emis=Sum('tenure'),
+        emis_paid_on_time=Sum('emis_paid_on_time'),
+        current_year_loans=Count('loan_id', filter=Q(start_date__year=current_year)),
+        active_principal=Sum('loan_amount', filter=Q(is_active=True)),
+        active_emis=Sum('monthly_repayment', filter=Q(is_active=True)),
+    )
+    return {key: value or 0 for key, value in inputs.items()}
+
+
+def load_credit_score_inputs(customer):
+    """
+    Read credit score inputs from the customer's credit profile (a primary key lookup),
+    building the profile from the loans table on first use
+    """
+    try:
+        profile = customer.credit_profile
+    except CustomerCreditProfile.DoesNotExist:
+        profile = build_profile(customer)
+    return profile.score_inputs(datetime.now().year)
+
+
+def score_from_inputs(inputs, approved_limit):
+    """
+    Turn aggregated loan history into a credit score
     Components:
     1. Past Loans paid on time
     2. Number of loans taken in past
@@ -15,31 +46,18 @@ def calculate_credit_score(customer):
     4. Loan approved volume
     5. If sum of current loans > approved limit, credit score = 0
     """
-    loans = Loan.objects.filter(customer=customer)
-    
-    if not loans.exists():
+    total_loans = inputs['loan_count']
+    if total_loans == 0:
         return 50  # Default score for new customers
     
     # Check if current loans exceed approved limit
-    current_loans_sum = loans.filter(is_active=True).aggregate(
-        total=Sum('loan_amount')
-    )['total'] or 0
-    
-    if current_loans_sum > customer.approved_limit:
+    current_loans_sum = inputs['active_principal']
+    if current_loans_sum > approved_limit:
         return 0
     
-    # Calculate components
-    total_loans = loans.count()
-    if total_loans == 0:
-        return 50
-    
     # 1. Past loans paid on time (40% weight)
-    on_time_payments = 0
-    total_payments = 0
-    for loan in loans:
-        total_payments += loan.tenure
-        on_time_payments += loan.emis_paid_on_time
-    
+    total_payments = inputs['total_emis']
+    on_time_payments = inputs['emis_paid_on_time']
     on_time_ratio = on_time_payments / total_payments if total_payments > 0 else 0
     on_time_score = on_time_ratio * 40
     
@@ -47,18 +65,25 @@ def calculate_credit_score(customer):
     loan_count_score = max(0, 20 - (total_loans * 2))
     
     # 3. Loan activity in current year (20% weight)
-    current_year = datetime.now().year
-    current_year_loans = loans.filter(start_date__year=current_year).count()
-    activity_score = max(0, 20 - (current_year_loans * 5))
+    activity_score = max(0, 20 - (inputs['current_year_loans'] * 5))
     
     # 4. Loan approved volume vs limit (20% weight)
-    volume_ratio = current_loans_sum / customer.approved_limit if customer.approved_limit > 0 else 0
+    volume_ratio = current_loans_sum / approved_limit if approved_limit > 0 else 0
     volume_score = max(0, 20 - (volume_ratio * 20))
     
     total_score = float(on_time_score) + float(loan_count_score) + float(activity_score) + float(volume_score)
     return min(100, max(0, total_score))
 
 
+def calculate_credit_score(customer, inputs=None):
+    """
+    Calculate credit score based on historical loan data
+    """
+    if inputs is None:
+        inputs = load_credit_score_inputs(customer)
+    return score_from_inputs(inputs, customer.approved_limit)
+
+
 def calculate_monthly_installment(loan_amount, interest_rate, tenure):
     """
     Calculate monthly installment using compound interest formula
@@ -88,22 +113,96 @@ def get_corrected_interest_rate(credit_score, requested_rate):
         return None  # Loan not approved
 
 
+CUSTOMER_NOT_FOUND = 'Customer not found'
+
+
+def _customer_not_found(interest_rate):
+    return {
+        'approval': False,
+        'message': CUSTOMER_NOT_FOUND,
+        'interest_rate': interest_rate,
+        'corrected_interest_rate': interest_rate,
+        'monthly_installment': 0
+    }
+
+
 def check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
     """
     Check loan eligibility based on credit score and other criteria
     """
     try:
-        customer = Customer.objects.get(customer_id=customer_id)
+        customer = Customer.objects.select_related('credit_profile').get(customer_id=customer_id)
     except Customer.DoesNotExist:
-        return {
-            'approval': False,
-            'message': 'Customer not found',
-            'interest_rate': interest_rate,
-            'corrected_interest_rate': interest_rate,
-            'monthly_installment': 0
-        }
+        return _customer_not_found(interest_rate)
+    
+    return evaluate_loan_eligibility(customer, loan_amount, interest_rate, tenure)
+
+
+async def acheck_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
+    """
+    Async check_loan_eligibility.
+    The customer is fetched with its credit profile in one joined query, like the sync path.
+    """
+    customer = await Customer.objects.select_related('credit_profile').filter(customer_id=customer_id).afirst()
+    if customer is None:
+        return _customer_not_found(interest_rate)
+    try:
+        profile = customer.credit_profile
+    except CustomerCreditProfile.DoesNotExist:
+        profile = await sync_to_async(build_profile)(customer)
+    
+    score_inputs = profile.score_inputs(datetime.now().year)
+    return evaluate_loan_eligibility(customer, loan_amount, interest_rate, tenure, score_inputs=score_inputs)
+
+
+def check_loan_eligibility_batch(applications):
+    """
+    Check eligibility for many applications at once.
+    Customers and their credit profiles are loaded with one query, and missing
+    profiles are built with set-based GROUP BY queries, so the number of
+    queries does not depend on the batch size.
+    Each application is a dict with customer_id, loan_amount, interest_rate and tenure.
+    """
+    customer_ids = {application['customer_id'] for application in applications}
+    customers = Customer.objects.select_related('credit_profile').in_bulk(customer_ids)
     
-    credit_score = calculate_credit_score(customer)
+    without_profile = [
+        customer for customer in customers.values()
+        if not hasattr(customer, 'credit_profile')
+    ]
+    if without_profile:
+        build_profiles(without_profile)
+    
+    current_year = datetime.now().year
+    score_inputs = {
+        customer_id: customer.credit_profile.score_inputs(current_year)
+        for customer_id, customer in customers.items()
+    }
+    
+    results = []
+    for application in applications:
+        customer = customers.get(application['customer_id'])
+        if customer is None:
+            results.append(_customer_not_found(application['interest_rate']))
+            continue
+        results.append(evaluate_loan_eligibility(
+            customer,
+            application['loan_amount'],
+            application['interest_rate'],
+            application['tenure'],
+            score_inputs=score_inputs[customer.customer_id]
+        ))
+    return results
+
+
+@timed('score')
+def evaluate_loan_eligibility(customer, loan_amount, interest_rate, tenure, score_inputs=None):
+    """
+    Apply the eligibility rules to an already loaded customer
+    """
+    if score_inputs is None:
+        score_inputs = load_credit_score_inputs(customer)
+    credit_score = calculate_credit_score(customer, score_inputs)
     
     # Check if credit score allows loan approval
     if credit_score <= 10:
@@ -130,10 +229,7 @@ def check_loan_eligibility(customer_id, loan_amount, interest_rate, tenure):
     monthly_installment = calculate_monthly_installment(loan_amount, corrected_rate, tenure)
     
     # Check if sum of all current EMIs > 50% of monthly salary
-    current_emis = Loan.objects.filter(
-        customer=customer, 
-        is_active=True
-    ).aggregate(total=Sum('monthly_repayment'))['total'] or 0
+    current_emis = score_inputs['active_emis']
     
     total_emis = current_emis + monthly_installment
     if total_emis > (customer.monthly_salary * Decimal('0.5')):
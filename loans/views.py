@@ -2,11 +2,11 @@ from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
-from django.http import JsonResponse
+from django.http import HttpResponse, Http404, JsonResponse
+from django.views.decorators.http import require_GET
 from django.db import connection
-from datetime import date, timedelta
+from datetime import date
 from decimal import Decimal
-import redis
 from django.conf import settings
 
 from .models import Customer, Loan
@@ -17,16 +17,25 @@ from .serializers import (
     LoanEligibilityResponseSerializer,
     LoanCreateSerializer,
     LoanCreateResponseSerializer,
-    LoanDetailSerializer,
-    LoanListSerializer
+    LoanListQuerySerializer
 )
-from .utils import check_loan_eligibility, calculate_monthly_installment
+from .utils import check_loan_eligibility_batch, calculate_monthly_installment
+from .cache import cached_check_loan_eligibility
+from .origination import originate_loan
+from .idempotency import idempotent
+from .pools import redis_client, pool_stats
+from .conditional import conditional, loan_validators, loan_list_validators
+from .pagination import page_queryset, split_page, next_page_headers, with_remaining_repayments
+from .schedules import get_schedule
+from .fast_serializers import LOAN_DETAIL_COLUMNS, LOAN_LIST_COLUMNS, build_loan_detail, build_loan_list_item
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
 
 
 @api_view(['GET'])
 def health_check(request):
     """
     Health check endpoint with database and Redis connectivity checks
+    and the connection pool usage of this process
     """
     health_status = {
         'status': 'healthy',
@@ -46,13 +55,14 @@ def health_check(request):
     
     # Check Redis connectivity
     try:
-        redis_client = redis.from_url(settings.CELERY_BROKER_URL)
-        redis_client.ping()
+        redis_client(settings.CELERY_BROKER_URL).ping()
         health_status['services']['redis'] = 'healthy'
     except Exception as e:
         health_status['services']['redis'] = f'unhealthy: {str(e)}'
         health_status['status'] = 'degraded'
     
+    health_status['pools'] = pool_stats()
+    
     # Return appropriate status code
     status_code = 200 if health_status['status'] == 'healthy' else 503
     return JsonResponse(health_status, status=status_code)
@@ -81,7 +91,7 @@ def check_eligibility(request):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     data = serializer.validated_data
-    eligibility_result = check_loan_eligibility(
+    eligibility_result = cached_check_loan_eligibility(
         data['customer_id'],
         data['loan_amount'],
         data['interest_rate'],
@@ -102,9 +112,44 @@ def check_eligibility(request):
 
 
 @api_view(['POST'])
+def check_eligibility_batch(request):
+    """
+    Check loan eligibility for a list of applications in one request
+    """
+    serializer = LoanEligibilitySerializer(
+        data=request.data,
+        many=True,
+        allow_empty=False,
+        max_length=settings.ELIGIBILITY_BATCH_MAX_SIZE
+    )
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    applications = serializer.validated_data
+    eligibility_results = check_loan_eligibility_batch(applications)
+    
+    response_data = [
+        {
+            'customer_id': application['customer_id'],
+            'approval': result['approval'],
+            'interest_rate': result['interest_rate'],
+            'corrected_interest_rate': result['corrected_interest_rate'],
+            'tenure': application['tenure'],
+            'monthly_installment': result['monthly_installment']
+        }
+        for application, result in zip(applications, eligibility_results)
+    ]
+    
+    response_serializer = LoanEligibilityResponseSerializer(response_data, many=True)
+    return Response(response_serializer.data, status=status.HTTP_200_OK)
+
+
+@api_view(['POST'])
+@idempotent('create_loan')
 def create_loan(request):
     """
-    Create a new loan if eligible
+    Create a new loan if eligible.
+    Clients may send an Idempotency-Key header to make retries safe.
     """
     serializer = LoanCreateSerializer(data=request.data)
     if not serializer.is_valid():
@@ -112,79 +157,56 @@ def create_loan(request):
     
     data = serializer.validated_data
     
-    # Check eligibility first
-    eligibility_result = check_loan_eligibility(
-        data['customer_id'],
-        data['loan_amount'],
-        data['interest_rate'],
-        data['tenure']
-    )
-    
-    if not eligibility_result['approval']:
+    try:
+        eligibility_result, loan = originate_loan(
+            data['customer_id'],
+            data['loan_amount'],
+            data['interest_rate'],
+            data['tenure']
+        )
+    except Customer.DoesNotExist:
         response_data = {
             'loan_id': None,
             'customer_id': data['customer_id'],
             'loan_approved': False,
-            'message': eligibility_result['message'],
+            'message': 'Customer not found',
             'monthly_installment': None
         }
         response_serializer = LoanCreateResponseSerializer(response_data)
-        return Response(response_serializer.data, status=status.HTTP_200_OK)
+        return Response(response_serializer.data, status=status.HTTP_404_NOT_FOUND)
     
-    # Create the loan
-    try:
-        customer = Customer.objects.get(customer_id=data['customer_id'])
-        
-        # Calculate dates
-        start_date = date.today()
-        end_date = start_date + timedelta(days=data['tenure'] * 30)  # Approximate
-        
-        loan = Loan.objects.create(
-            customer=customer,
-            loan_amount=data['loan_amount'],
-            tenure=data['tenure'],
-            interest_rate=eligibility_result['corrected_interest_rate'],
-            monthly_repayment=eligibility_result['monthly_installment'],
-            start_date=start_date,
-            end_date=end_date
-        )
-        
-        # Update customer's current debt
-        customer.current_debt += data['loan_amount']
-        customer.save()
-        
-        response_data = {
-            'loan_id': loan.loan_id,
-            'customer_id': data['customer_id'],
-            'loan_approved': True,
-            'message': 'Loan approved successfully',
-            'monthly_installment': eligibility_result['monthly_installment']
-        }
-        
-        response_serializer = LoanCreateResponseSerializer(response_data)
-        return Response(response_serializer.data, status=status.HTTP_201_CREATED)
-        
-    except Customer.DoesNotExist:
+    if loan is None:
         response_data = {
             'loan_id': None,
             'customer_id': data['customer_id'],
             'loan_approved': False,
-            'message': 'Customer not found',
+            'message': eligibility_result['message'],
             'monthly_installment': None
         }
         response_serializer = LoanCreateResponseSerializer(response_data)
-        return Response(response_serializer.data, status=status.HTTP_404_NOT_FOUND)
+        return Response(response_serializer.data, status=status.HTTP_200_OK)
+    
+    response_data = {
+        'loan_id': loan.loan_id,
+        'customer_id': data['customer_id'],
+        'loan_approved': True,
+        'message': 'Loan approved successfully',
+        'monthly_installment': eligibility_result['monthly_installment']
+    }
+    
+    response_serializer = LoanCreateResponseSerializer(response_data)
+    return Response(response_serializer.data, status=status.HTTP_201_CREATED)
 
 
 @api_view(['GET'])
+@conditional(loan_validators)
 def view_loan(request, loan_id):
     """
     View loan details by loan ID
     """
     try:
-        loan = Loan.objects.select_related('customer').get(loan_id=loan_id)
-        serializer = LoanDetailSerializer(loan)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        loan = with_remaining_repayments(Loan.objects.filter(loan_id=loan_id)).values(*LOAN_DETAIL_COLUMNS).get()
+        return Response(build_loan_detail(loan), status=status.HTTP_200_OK)
     except Loan.DoesNotExist:
         return Response(
             {'error': 'Loan not found'}, 
@@ -193,17 +215,51 @@ def view_loan(request, loan_id):
 
 
 @api_view(['GET'])
+@conditional(loan_validators)
+def loan_schedule(request, loan_id):
+    """
+    Month-by-month amortization schedule of a loan, computed on first request and stored
+    """
+    schedule = get_schedule(loan_id)
+    if schedule is None:
+        return Response(
+            {'error': 'Loan not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    return Response(schedule, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@conditional(loan_list_validators)
 def view_loans_by_customer(request, customer_id):
     """
-    View all loans for a specific customer
+    View active loans for a specific customer, a page at a time.
+    The next page is linked through the Link and X-Next-Cursor headers.
     """
     try:
         customer = Customer.objects.get(customer_id=customer_id)
-        loans = Loan.objects.filter(customer=customer, is_active=True)
-        serializer = LoanListSerializer(loans, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
     except Customer.DoesNotExist:
         return Response(
             {'error': 'Customer not found'}, 
             status=status.HTTP_404_NOT_FOUND
-        )
\ No newline at end of file
+        )
+    
+    query = LoanListQuerySerializer(data=request.query_params)
+    if not query.is_valid():
+        return Response(query.errors, status=status.HTTP_400_BAD_REQUEST)
+    
+    loans = Loan.objects.filter(customer=customer, is_active=True)
+    page, next_cursor = split_page(page_queryset(loans, query.validated_data, LOAN_LIST_COLUMNS), query.validated_data)
+    data = [build_loan_list_item(loan) for loan in page]
+    return Response(data, status=status.HTTP_200_OK, headers=next_page_headers(request, next_cursor))
+
+
+@require_GET
+def metrics(request):
+    """
+    Request counts, query counts, cache lookups and latency histograms of this
+    process in the Prometheus text format
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404('Metrics are disabled')
+    return HttpResponse(render_metrics(), content_type=METRICS_CONTENT_TYPE)